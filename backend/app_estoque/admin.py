@@ -1,7 +1,11 @@
 from django.contrib import admin
-from .models import Categoria, Fornecedor, Produto, MovimentacaoEstoque
+from .models import Categoria, Fornecedor, Produto, MovimentacaoEstoque, MovimentacaoArquivada, EstoqueDiario, Tarefa, AlertaEstoque
 
 admin.site.register(Categoria)
 admin.site.register(Fornecedor)
 admin.site.register(Produto)
 admin.site.register(MovimentacaoEstoque)
+admin.site.register(MovimentacaoArquivada)
+admin.site.register(EstoqueDiario)
+admin.site.register(Tarefa)
+admin.site.register(AlertaEstoque)
@@ -0,0 +1,99 @@
+"""
+Alertas de estoque baixo e sugestões de reposição.
+
+Um produto cruza o estoque mínimo quando a marca em_estoque_baixo muda.
+Todo código que grava essa marca (o serviço de estoque, Produto.save, a
+importação, o reparo de saldos e reconstruir_estoque_baixo) já sabe quando
+isso acontece e envia o sinal estoque_minimo_cruzado; registrar() abre ou
+resolve o alerta do produto. O custo só existe nas escritas que cruzam o
+limite; nada varre a tabela de produtos.
+
+As quantidades sugeridas são calculadas na leitura, pela média diária de
+saídas dos últimos ESTOQUE_REPOSICAO_DIAS dias, agrupadas por fornecedor.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import AlertaEstoque, MovimentacaoEstoque, Produto
+
+
+def registrar(abaixo=(), acima=()):
+    """
+    Abre um alerta para cada (produto_id, saldo, estoque_minimo) de `abaixo`
+    e resolve os alertas abertos dos produtos de `acima`.
+    """
+    if abaixo:
+        # O mesmo cruzamento pode chegar duas vezes (ex.: save() de uma instância com a marca antiga)
+        abertos = set(
+            AlertaEstoque.objects.filter(
+                produto_id__in=[pk for pk, _, _ in abaixo], resolvido_em__isnull=True
+            ).values_list('produto_id', flat=True)
+        )
+        AlertaEstoque.objects.bulk_create(
+            AlertaEstoque(produto_id=pk, saldo=saldo, estoque_minimo=minimo)
+            for pk, saldo, minimo in abaixo
+            if pk not in abertos
+        )
+    if acima:
+        AlertaEstoque.objects.filter(produto_id__in=acima, resolvido_em__isnull=True).update(
+            resolvido_em=timezone.now()
+        )
+
+
+def sugestoes_reposicao(fornecedor=None, dias=None, cobertura=None):
+    """
+    Produtos ativos abaixo do mínimo, agrupados por fornecedor, com a
+    quantidade a pedir para voltar ao mínimo e cobrir `cobertura` dias de
+    saídas no ritmo dos últimos `dias` dias.
+    """
+    dias = dias or getattr(settings, 'ESTOQUE_REPOSICAO_DIAS', 30)
+    cobertura = cobertura or getattr(settings, 'ESTOQUE_REPOSICAO_COBERTURA_DIAS', 30)
+
+    produtos = Produto.objects.filter(em_estoque_baixo=True, ativo=True)
+    if fornecedor:
+        produtos = produtos.filter(fornecedor_id=fornecedor)
+
+    # Saídas do período por produto, em uma consulta (índice produto + data_hora)
+    saidas = dict(
+        MovimentacaoEstoque.objects.filter(
+            produto__in=produtos,
+            tipo=MovimentacaoEstoque.TipoMovimentacao.SAIDA,
+            data_hora__gte=timezone.now() - timedelta(days=dias),
+        ).order_by().values('produto_id').annotate(total=Sum('quantidade')).values_list('produto_id', 'total')
+    )
+
+    grupos = {}
+    linhas = produtos.order_by('fornecedor__nome', 'nome', 'id').values(
+        'id', 'nome', 'codigo_barras', 'quantidade_estoque', 'estoque_minimo', 'preco_custo',
+        'fornecedor_id', 'fornecedor__nome',
+    )
+    for linha in linhas:
+        saidas_periodo = saidas.get(linha['id'], 0)
+        # Arredonda a cobertura para cima em aritmética inteira
+        consumo_previsto = -(-saidas_periodo * cobertura // dias)
+        sugerida = max(linha['estoque_minimo'] + consumo_previsto - linha['quantidade_estoque'], 0)
+
+        grupo = grupos.setdefault(linha['fornecedor_id'], {
+            'fornecedor': linha['fornecedor_id'],
+            'fornecedor_nome': linha['fornecedor__nome'],
+            'quantidade_total': 0,
+            'custo_estimado': Decimal('0.00'),
+            'itens': [],
+        })
+        grupo['quantidade_total'] += sugerida
+        grupo['custo_estimado'] += sugerida * linha['preco_custo']
+        grupo['itens'].append({
+            'produto': linha['id'],
+            'nome': linha['nome'],
+            'codigo_barras': linha['codigo_barras'],
+            'saldo': linha['quantidade_estoque'],
+            'estoque_minimo': linha['estoque_minimo'],
+            'saidas_periodo': saidas_periodo,
+            'media_diaria': round(saidas_periodo / dias, 2),
+            'quantidade_sugerida': sugerida,
+        })
+    return list(grupos.values())
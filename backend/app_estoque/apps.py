@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AppEstoqueConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app_estoque'
+
+    def ready(self):
+        # Registra os receptores de sinais (invalidação de cache)
+        from . import signals  # noqa: F401
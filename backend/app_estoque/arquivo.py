@@ -0,0 +1,87 @@
+"""
+Arquivamento das movimentações antigas.
+
+A tabela de movimentações só cresce; com anos de histórico, índices e
+backups ficam grandes e toda consulta recente paga por isso. O comando
+arquivar_movimentacoes move, em lotes, as movimentações anteriores ao
+horizonte (ESTOQUE_ARQUIVO_MESES meses fechados) para MovimentacaoArquivada,
+mantendo os ids.
+
+A API de movimentações continua lendo só a tabela quente. Quem precisa do
+histórico inteiro lê as duas: a consolidação diária (historico.py), a
+verificação de saldos (consistencia.py) e a exportação de movimentações,
+que inclui o arquivo quando o período pedido alcança datas arquivadas.
+
+Partições por mês no MySQL não servem aqui: tabelas particionadas do InnoDB
+não aceitam chaves estrangeiras, e a movimentação referencia o produto e o
+usuário.
+"""
+from datetime import date
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .estatisticas import intervalo_do_dia
+from .models import MovimentacaoArquivada, MovimentacaoEstoque
+
+CAMPOS = (
+    'id', 'produto_id', 'tipo', 'quantidade', 'data_hora', 'usuario_id',
+    'motivo', 'numero_documento', 'observacao', 'saldo_anterior',
+)
+
+
+def horizonte(meses=None):
+    """Início do mês de `meses` meses atrás: tudo antes disso pode ser arquivado"""
+    if meses is None:
+        meses = getattr(settings, 'ESTOQUE_ARQUIVO_MESES', 12)
+    hoje = timezone.localdate()
+    indice = hoje.year * 12 + hoje.month - 1 - meses
+    inicio, _ = intervalo_do_dia(date(indice // 12, indice % 12 + 1, 1))
+    return inicio
+
+
+def ultima_arquivada():
+    """data_hora da movimentação arquivada mais recente (None se o arquivo está vazio)"""
+    return MovimentacaoArquivada.objects.aggregate(ultima=Max('data_hora'))['ultima']
+
+
+def _mover_faixa(primeiro, ultimo, antes):
+    """Copia e apaga as movimentações antigas com id em [primeiro, ultimo], no próprio banco"""
+    quente = MovimentacaoEstoque._meta.db_table
+    arquivada = MovimentacaoArquivada._meta.db_table
+    colunas = ', '.join(CAMPOS)
+    filtro = 'id BETWEEN %s AND %s AND data_hora < %s'
+    parametros = [primeiro, ultimo, connection.ops.adapt_datetimefield_value(antes)]
+    with connection.cursor() as cursor:
+        # NOT EXISTS: uma faixa já copiada por uma execução interrompida não é duplicada
+        cursor.execute(
+            f'INSERT INTO {arquivada} ({colunas}) SELECT {colunas} FROM {quente} q '
+            f'WHERE q.{filtro} AND NOT EXISTS (SELECT 1 FROM {arquivada} a WHERE a.id = q.id)',
+            parametros,
+        )
+        # DELETE direto: o delete() do ORM carregaria as linhas e dispararia os
+        # sinais de post_delete (invalidação do dashboard) uma vez por linha
+        cursor.execute(f'DELETE FROM {quente} WHERE {filtro}', parametros)
+        return cursor.rowcount
+
+
+def arquivar(antes=None, lote=None):
+    """
+    Move as movimentações com data_hora < `antes` (padrão: horizonte()) em
+    lotes de até ESTOQUE_ARQUIVO_LOTE linhas, um por transação. Pode ser
+    interrompido e rodado de novo. Retorna quantas foram arquivadas.
+    """
+    antes = antes or horizonte()
+    lote = lote or getattr(settings, 'ESTOQUE_ARQUIVO_LOTE', 5000)
+    antigas = MovimentacaoEstoque.objects.filter(data_hora__lt=antes).order_by('id').values_list('id', flat=True)
+    total = 0
+    while True:
+        # Cada lote é uma faixa de ids: o INSERT ... SELECT e o DELETE não
+        # passam listas de ids nem trazem as linhas para o Python
+        ids = list(antigas[:lote])
+        if not ids:
+            return total
+        with transaction.atomic():
+            total += _mover_faixa(ids[0], ids[-1], antes)
@@ -0,0 +1,94 @@
+"""
+Autenticação JWT com cache do usuário.
+
+O JWTAuthentication padrão busca o User no banco a cada requisição só para
+montar request.user. Aqui o usuário fica em cache por alguns segundos,
+indexado pelo id do token, e é descartado pelos sinais de User sempre que
+o cadastro muda (update_user_role, delete_user, troca de senha etc.).
+
+Com um cache por processo (LocMemCache) a invalidação não alcança os outros
+workers, que continuariam aceitando um usuário desativado ou rebaixado: o
+cache do usuário só é usado com um cache compartilhado (cache.compartilhado).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache import PREFIXO, compartilhado
+
+
+def chave_usuario(user_id):
+    return f'{PREFIXO}:usuario:{user_id}'
+
+
+def invalidar_usuario(user_id):
+    cache.delete(chave_usuario(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+
+    def get_user(self, validated_token):
+        user_id = self._user_id(validated_token)
+        usar_cache = compartilhado()
+        chave = chave_usuario(user_id)
+        user = cache.get(chave) if usar_cache else None
+        if user is None:
+            try:
+                user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            if usar_cache:
+                cache.set(chave, user, getattr(settings, 'ESTOQUE_USUARIO_CACHE_TIMEOUT', 60))
+        return self._verificar(user, validated_token)
+
+    async def aauthenticate(self, request):
+        """Versão assíncrona de authenticate(), usada pelas views de views_async.py"""
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user_id = self._user_id(validated_token)
+        usar_cache = compartilhado()
+        chave = chave_usuario(user_id)
+        user = await cache.aget(chave) if usar_cache else None
+        if user is None:
+            try:
+                user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            if usar_cache:
+                await cache.aset(chave, user, getattr(settings, 'ESTOQUE_USUARIO_CACHE_TIMEOUT', 60))
+        return self._verificar(user, validated_token)
+
+    def _user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    def _verificar(self, user, validated_token):
+        # Mesmas verificações do JWTAuthentication, agora também para o usuário em cache
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
@@ -0,0 +1,469 @@
+"""
+Cenários de benchmark executados por `python manage.py benchmark <cenario>`.
+
+Cada cenário popula o banco configurado dentro de uma transação que é
+desfeita no final, então pode ser rodado contra uma cópia do banco real
+sem deixar resíduos.
+"""
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from .filtros import normalizar
+from .models import Categoria, Fornecedor, Produto, MovimentacaoEstoque
+
+CENARIOS = {}
+
+
+def cenario(nome):
+    """Registra uma função como cenário de benchmark"""
+    def decorator(funcao):
+        CENARIOS[nome] = funcao
+        return funcao
+    return decorator
+
+
+def cronometrar(funcao, repeticoes=5):
+    """Executa a função N vezes e retorna a mediana em milissegundos"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tempos)
+
+
+@contextmanager
+def dados_temporarios():
+    """Abre uma transação que sempre é desfeita ao sair"""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def usuario_benchmark():
+    return User.objects.create(username='benchmark', is_superuser=True, is_staff=True)
+
+
+def popular_catalogo(total_produtos, movimentacoes_por_produto=0, dias_historico=1, lote=2000):
+    """
+    Cria categorias, fornecedores e produtos em massa para os testes de carga.
+
+    As movimentações são distribuídas pelos últimos `dias_historico` dias
+    (data_hora é auto_now_add, então as datas são reescritas por faixa de id).
+    """
+    categorias = Categoria.objects.bulk_create(
+        Categoria(nome=f'Categoria bench {i}') for i in range(20)
+    )
+    fornecedores = Fornecedor.objects.bulk_create(
+        Fornecedor(nome=f'Fornecedor bench {i}') for i in range(20)
+    )
+    produtos = [
+        Produto(
+            nome=f'Produto bench {i:07d}',
+            preco_custo=Decimal('10.00') + i % 50,
+            preco_venda=Decimal('15.00') + i % 50,
+            categoria=categorias[i % len(categorias)],
+            fornecedor=fornecedores[i % len(fornecedores)],
+            codigo_barras=f'BENCH{i:010d}',
+            quantidade_estoque=i % 100,
+            estoque_minimo=10,
+        )
+        for i in range(total_produtos)
+    ]
+    # bulk_create não passa pelo Produto.save(): preenche os campos derivados
+    for produto in produtos:
+        produto.em_estoque_baixo = produto.estoque_baixo
+        produto.nome_normalizado = normalizar(produto.nome)
+    produtos = Produto.objects.bulk_create(produtos, batch_size=lote)
+
+    if movimentacoes_por_produto:
+        movimentacoes = (
+            MovimentacaoEstoque(
+                produto=produto,
+                tipo=MovimentacaoEstoque.TipoMovimentacao.ENTRADA,
+                quantidade=1,
+            )
+            for produto in produtos
+            for _ in range(movimentacoes_por_produto)
+        )
+        MovimentacaoEstoque.objects.bulk_create(movimentacoes, batch_size=lote)
+
+        ids = MovimentacaoEstoque.objects.order_by('pk').values_list('pk', flat=True)
+        primeiro, ultimo = ids.first(), ids.last()
+        por_dia = max(1, (ultimo - primeiro + 1) // dias_historico)
+        agora = timezone.now()
+        for dia in range(dias_historico):
+            inicio = primeiro + dia * por_dia
+            MovimentacaoEstoque.objects.filter(pk__gte=inicio, pk__lt=inicio + por_dia).update(
+                data_hora=agora - timedelta(days=dias_historico - 1 - dia)
+            )
+    return produtos
+
+
+# ==============================================================================
+# CENÁRIOS
+# ==============================================================================
+
+def _estatisticas_legado():
+    """Cópia da implementação anterior, mantida só para comparação"""
+    produtos = Produto.objects.filter(ativo=True)
+    sum(p.quantidade_estoque * p.preco_custo for p in produtos)
+    Produto.objects.filter(ativo=True).count()
+    Categoria.objects.count()
+    Fornecedor.objects.filter(ativo=True).count()
+    Produto.objects.filter(quantidade_estoque__lt=F('estoque_minimo'), ativo=True).count()
+
+
+@cenario('estatisticas')
+def benchmark_estatisticas(saida, tamanhos, repeticoes, **opcoes):
+    """Latência do /estatisticas/ conforme o catálogo cresce"""
+    from .estatisticas import calcular_estatisticas
+    from .views import estatisticas_view
+
+    factory = APIRequestFactory()
+    saida(f"{'produtos':>10} {'legado (ms)':>12} {'agregado (ms)':>14} {'endpoint em cache (ms)':>24}")
+
+    for tamanho in tamanhos:
+        with dados_temporarios():
+            usuario = usuario_benchmark()
+            popular_catalogo(tamanho)
+
+            def chamar_endpoint():
+                request = factory.get('/api/v1/estatisticas/')
+                force_authenticate(request, user=usuario)
+                estatisticas_view(request)
+
+            legado = cronometrar(_estatisticas_legado, repeticoes)
+            agregado = cronometrar(calcular_estatisticas, repeticoes)
+            chamar_endpoint()  # aquece o cache
+            endpoint = cronometrar(chamar_endpoint, repeticoes)
+            saida(f'{tamanho:>10} {legado:>12.2f} {agregado:>14.2f} {endpoint:>24.2f}')
+
+
+@cenario('indices')
+def benchmark_indices(saida, tamanhos, repeticoes, **opcoes):
+    """Planos e tempos das consultas cobertas pelos índices compostos"""
+    # Para o "antes" dos índices, rode com `migrate app_estoque 0004` aplicado
+    from .estatisticas import intervalo_do_dia
+
+    for tamanho in tamanhos:
+        with dados_temporarios():
+            produtos = popular_catalogo(tamanho, movimentacoes_por_produto=10, dias_historico=90)
+            hoje = timezone.localdate()
+            inicio, fim = intervalo_do_dia(hoje)
+            consultas = {
+                'histórico de um produto': MovimentacaoEstoque.objects.filter(
+                    produto=produtos[len(produtos) // 2]
+                ).order_by('-data_hora', '-id')[:20],
+                'movimentações hoje (DATE(), antes)': MovimentacaoEstoque.objects.filter(
+                    data_hora__date=hoje
+                ).order_by(),
+                'movimentações hoje (faixa, depois)': MovimentacaoEstoque.objects.filter(
+                    data_hora__gte=inicio, data_hora__lt=fim
+                ).order_by(),
+                'produtos ativos por nome': Produto.objects.filter(ativo=True).order_by('nome')[:20],
+                'estoque baixo': Produto.objects.filter(
+                    ativo=True, quantidade_estoque__lt=F('estoque_minimo')
+                ).order_by(),
+            }
+
+            saida(f'\n=== {tamanho} produtos / {tamanho * 10} movimentações ===')
+            for nome, queryset in consultas.items():
+                if 'hoje' in nome or 'baixo' in nome:
+                    executar = queryset.count
+                else:
+                    executar = lambda queryset=queryset: list(queryset.all())
+                tempo = cronometrar(executar, repeticoes)
+                saida(f'\n-- {nome}: {tempo:.2f} ms')
+                saida(queryset.explain())
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+@cenario('carga')
+def benchmark_carga(saida, tamanhos, repeticoes, url, token, concorrencia, requisicoes, **opcoes):
+    """Requisições por segundo contra um servidor já em execução"""
+    # Não usa o banco local: para comparar conexões persistentes, suba o
+    # servidor com DB_CONN_MAX_AGE=0 e depois com DB_CONN_MAX_AGE=60 e
+    # rode este cenário contra cada um com os mesmos parâmetros.
+    cabecalhos = {'Authorization': f'Bearer {token}'} if token else {}
+
+    def requisitar(_):
+        inicio = time.perf_counter()
+        with urllib.request.urlopen(urllib.request.Request(url, headers=cabecalhos)) as resposta:
+            resposta.read()
+        return (time.perf_counter() - inicio) * 1000
+
+    requisitar(None)  # aquece o servidor (imports, cache, primeira conexão)
+    saida(f'{url} ({requisicoes} requisições por rodada)')
+    saida(f"{'concorrência':>12} {'req/s':>10} {'p50 (ms)':>10} {'p95 (ms)':>10} {'p99 (ms)':>10}")
+    for threads in concorrencia:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            inicio = time.perf_counter()
+            latencias = list(executor.map(requisitar, range(requisicoes)))
+            duracao = time.perf_counter() - inicio
+        saida(
+            f'{threads:>12} {requisicoes / duracao:>10.1f} {_percentil(latencias, 50):>10.2f} '
+            f'{_percentil(latencias, 95):>10.2f} {_percentil(latencias, 99):>10.2f}'
+        )
+
+
+@cenario('historico')
+def benchmark_historico(saida, tamanhos, repeticoes, **opcoes):
+    """Relatórios históricos: movimentações brutas x tabela EstoqueDiario"""
+    from django.db.models import Sum
+    from django.db.models.functions import TruncDate
+
+    from .historico import consolidar, saldos_em, totais_diarios
+
+    saida(f"{'produtos':>10} {'consulta':<28} {'movimentações (ms)':>20} {'consolidado (ms)':>18}")
+    for tamanho in tamanhos:
+        with dados_temporarios():
+            popular_catalogo(tamanho, movimentacoes_por_produto=10, dias_historico=365)
+            hoje = timezone.localdate()
+            inicio_ano = hoje - timedelta(days=364)
+            inicio = time.perf_counter()
+            consolidar()
+            saida(f'{tamanho:>10} consolidação inicial: {(time.perf_counter() - inicio) * 1000:.0f} ms')
+
+            def totais_brutos():
+                list(MovimentacaoEstoque.objects.filter(
+                    data_hora__gte=timezone.now() - timedelta(days=365)
+                ).annotate(dia=TruncDate('data_hora')).values('dia').annotate(
+                    total=Sum('quantidade')
+                ).order_by('dia'))
+
+            def saldos_brutos():
+                # Reconstrói o saldo de cada produto somando o histórico até a data
+                list(MovimentacaoEstoque.objects.filter(
+                    data_hora__lt=timezone.now() - timedelta(days=180)
+                ).values('produto').annotate(total=Sum('quantidade')).order_by())
+
+            comparacoes = {
+                'totais diários (1 ano)': (
+                    totais_brutos, lambda: list(totais_diarios(inicio_ano, hoje)),
+                ),
+                'saldo de todos em D': (
+                    saldos_brutos,
+                    lambda: list(saldos_em(hoje - timedelta(days=180)).values('pk', 'saldo')),
+                ),
+            }
+            for nome, (bruto, consolidado) in comparacoes.items():
+                saida(
+                    f'{tamanho:>10} {nome:<28} {cronometrar(bruto, repeticoes):>20.2f} '
+                    f'{cronometrar(consolidado, repeticoes):>18.2f}'
+                )
+
+
+@cenario('compressao')
+def benchmark_compressao(saida, tamanhos, repeticoes, **opcoes):
+    """Bytes trafegados e CPU de serialização das listagens de produtos"""
+    import gzip
+
+    from rest_framework.renderers import JSONRenderer
+
+    from .middleware import brotli
+    from .renderers import ORJSONRenderer, orjson
+    from .serializers import ProdutoSerializer
+
+    saida(f"{'linhas':>8} {'etapa':<32} {'tempo (ms)':>12} {'bytes':>12}")
+    for tamanho in tamanhos:
+        with dados_temporarios():
+            popular_catalogo(tamanho)
+            produtos = list(Produto.objects.select_related('categoria', 'fornecedor')[:tamanho])
+            dados = ProdutoSerializer(produtos, many=True).data
+            corpo = JSONRenderer().render(dados)
+
+            etapas = {
+                'serializer (to_representation)': lambda: ProdutoSerializer(produtos, many=True).data,
+                'JSONRenderer (json)': lambda: JSONRenderer().render(dados),
+                'gzip nível 6': lambda: gzip.compress(corpo, 6),
+            }
+            if orjson is not None:
+                etapas['ORJSONRenderer'] = lambda: ORJSONRenderer().render(dados)
+            if brotli is not None:
+                etapas['brotli qualidade 5'] = lambda: brotli.compress(corpo, quality=5)
+
+            for nome, funcao in etapas.items():
+                tempo = cronometrar(funcao, repeticoes)
+                resultado = funcao()
+                tamanho_bytes = len(resultado) if isinstance(resultado, bytes) else ''
+                saida(f'{tamanho:>8} {nome:<32} {tempo:>12.2f} {tamanho_bytes:>12}')
+
+
+@cenario('serializacao')
+def benchmark_serializacao(saida, tamanhos, repeticoes, **opcoes):
+    """ProdutoSerializer x leitura enxuta (.values()) na listagem de produtos"""
+    from .serializers import ProdutoSerializer, produtos_para_leitura, serializar_produtos
+
+    saida(f"{'linhas':>8} {'ProdutoSerializer (ms)':>24} {'enxuta (ms)':>14} {'ganho':>8}")
+    for tamanho in tamanhos:
+        with dados_temporarios():
+            popular_catalogo(tamanho)
+            base = Produto.objects.select_related('categoria', 'fornecedor').order_by('nome')[:tamanho]
+
+            padrao = cronometrar(lambda: ProdutoSerializer(base.all(), many=True).data, repeticoes)
+            enxuta = cronometrar(
+                lambda: serializar_produtos(produtos_para_leitura(base.all())), repeticoes
+            )
+            saida(f'{tamanho:>8} {padrao:>24.2f} {enxuta:>14.2f} {padrao / enxuta:>7.1f}x')
+
+
+@cenario('importacao')
+def benchmark_importacao(saida, tamanhos, repeticoes, **opcoes):
+    """Importação de produtos: POST /produtos/ linha a linha x importação em lotes (linhas/s)"""
+    import csv
+    import io
+
+    from .importacao import importar
+    from .serializers import ProdutoSerializer
+
+    def planilha(total, categorias, fornecedores):
+        texto = io.StringIO()
+        escritor = csv.writer(texto)
+        escritor.writerow([
+            'codigo_barras', 'nome', 'categoria', 'fornecedor',
+            'preco_custo', 'preco_venda', 'quantidade_estoque', 'estoque_minimo',
+        ])
+        for i in range(total):
+            escritor.writerow([
+                f'IMP{i:010d}', f'Produto importado {i:07d}',
+                categorias[i % len(categorias)], fornecedores[i % len(fornecedores)],
+                f'{10 + i % 50}.00', f'{15 + i % 50}.90', i % 100, 10,
+            ])
+        return texto.getvalue().encode()
+
+    saida(f"{'linhas':>8} {'etapa':<34} {'tempo (s)':>10} {'linhas/s':>10}")
+    for tamanho in tamanhos:
+        with dados_temporarios():
+            categorias = [
+                categoria.nome for categoria in
+                Categoria.objects.bulk_create(Categoria(nome=f'Categoria imp {i}') for i in range(20))
+            ]
+            fornecedores = [
+                fornecedor.nome for fornecedor in
+                Fornecedor.objects.bulk_create(Fornecedor(nome=f'Fornecedor imp {i}') for i in range(20))
+            ]
+            conteudo = planilha(tamanho, categorias, fornecedores)
+
+            # Referência: o caminho do POST /produtos/ (serializer + save) em uma amostra
+            amostra = min(tamanho, 1000)
+            categoria = Categoria.objects.get(nome=categorias[0])
+            inicio = time.perf_counter()
+            with dados_temporarios():
+                for i in range(amostra):
+                    serializer = ProdutoSerializer(data={
+                        'nome': f'Produto serializer {i}', 'codigo_barras': f'SER{i:010d}',
+                        'categoria': categoria.pk, 'preco_custo': '10.00', 'preco_venda': '15.90',
+                        'estoque_minimo': 10,
+                    })
+                    serializer.is_valid(raise_exception=True)
+                    serializer.save()
+            duracao = time.perf_counter() - inicio
+            saida(f'{amostra:>8} {"POST linha a linha (amostra)":<34} {duracao:>10.2f} {amostra / duracao:>10.0f}')
+
+            for etapa in ('importação (criação)', 'reimportação (atualização)'):
+                inicio = time.perf_counter()
+                resultado = importar(io.BytesIO(conteudo), 'produtos.csv')
+                duracao = time.perf_counter() - inicio
+                saida(f'{tamanho:>8} {etapa:<34} {duracao:>10.2f} {resultado["total"] / duracao:>10.0f}')
+
+
+@cenario('consistencia')
+def benchmark_consistencia(saida, tamanhos, repeticoes, **opcoes):
+    """Verificação de saldos: consulta única com janela x laço por produto (10 movimentações/produto)"""
+    from django.db.models import Max, Q, Sum
+
+    from .consistencia import reparar, verificar
+
+    def laco_por_produto(ids):
+        # Abordagem ingênua: último ajuste e soma posterior, duas consultas por produto
+        divergentes = 0
+        for pk, saldo in Produto.objects.filter(pk__in=ids).values_list('pk', 'quantidade_estoque'):
+            movimentacoes = MovimentacaoEstoque.objects.filter(produto_id=pk)
+            ultimo = movimentacoes.filter(tipo='A').aggregate(ultimo=Max('id'))['ultimo']
+            if ultimo:
+                movimentacoes = movimentacoes.filter(id__gte=ultimo)
+            totais = movimentacoes.aggregate(
+                entradas=Sum('quantidade', filter=~Q(tipo='S')), saidas=Sum('quantidade', filter=Q(tipo='S'))
+            )
+            if saldo != (totais['entradas'] or 0) - (totais['saidas'] or 0):
+                divergentes += 1
+        return divergentes
+
+    saida(f"{'produtos':>10} {'movimentações':>14} {'etapa':<34} {'tempo (ms)':>12}")
+    for tamanho in tamanhos:
+        with dados_temporarios():
+            produtos = popular_catalogo(tamanho, movimentacoes_por_produto=10)
+            ids = [produto.pk for produto in produtos]
+            # Saldo coerente com o histórico (10 entradas de 1) e alguns ajustes no meio
+            Produto.objects.filter(pk__gte=ids[0]).update(quantidade_estoque=10)
+            ajustes = (
+                MovimentacaoEstoque.objects.filter(produto_id__in=ids[::10])
+                .order_by().values('produto_id').annotate(meio=Max('id') - 5)
+            )
+            MovimentacaoEstoque.objects.filter(id__in=[a['meio'] for a in ajustes]).update(tipo='A', quantidade=7)
+            Produto.objects.filter(pk__in=ids[::10]).update(quantidade_estoque=12)
+            # 1% dos produtos divergentes
+            Produto.objects.filter(pk__in=ids[1::100]).update(quantidade_estoque=999)
+            total_movimentacoes = tamanho * 10
+
+            tempo = cronometrar(verificar, repeticoes)
+            discrepancias = verificar()
+            saida(f'{tamanho:>10} {total_movimentacoes:>14} {"consulta única (janela)":<34} {tempo:>12.2f}')
+
+            amostra = ids[:min(tamanho, 1000)]
+            inicio = time.perf_counter()
+            laco_por_produto(amostra)
+            estimado = (time.perf_counter() - inicio) * 1000 * tamanho / len(amostra)
+            saida(f'{tamanho:>10} {total_movimentacoes:>14} {"laço por produto (estimado)":<34} {estimado:>12.2f}')
+
+            inicio = time.perf_counter()
+            reparados = reparar(discrepancias)
+            saida(
+                f'{tamanho:>10} {total_movimentacoes:>14} {f"reparo de {reparados} produto(s)":<34} '
+                f'{(time.perf_counter() - inicio) * 1000:>12.2f}'
+            )
+
+
+@cenario('arquivo')
+def benchmark_arquivo(saida, tamanhos, repeticoes, **opcoes):
+    """Arquivamento: vazão e varredura da tabela quente antes/depois (10 movimentações/produto, 2 anos)"""
+    from django.db.models import Count, Sum
+
+    from .arquivo import arquivar, horizonte
+
+    def totais_por_tipo():
+        # Relatório que varre a tabela quente inteira
+        list(MovimentacaoEstoque.objects.order_by().values('tipo').annotate(total=Sum('quantidade'), n=Count('id')))
+
+    saida(f"{'movimentações':>14} {'etapa':<38} {'linhas quentes':>15} {'tempo (ms)':>12}")
+    for tamanho in tamanhos:
+        with dados_temporarios():
+            popular_catalogo(tamanho // 10, movimentacoes_por_produto=10, dias_historico=730)
+            quentes = MovimentacaoEstoque.objects.count()
+            tempo = cronometrar(totais_por_tipo, repeticoes)
+            saida(f'{tamanho:>14} {"totais por tipo (sem arquivo)":<38} {quentes:>15} {tempo:>12.2f}')
+
+            inicio = time.perf_counter()
+            arquivadas = arquivar(horizonte())
+            tempo = (time.perf_counter() - inicio) * 1000
+            saida(f'{tamanho:>14} {f"arquivar {arquivadas} linha(s)":<38} {"":>15} {tempo:>12.2f}')
+
+            quentes = MovimentacaoEstoque.objects.count()
+            tempo = cronometrar(totais_por_tipo, repeticoes)
+            saida(f'{tamanho:>14} {"totais por tipo (após arquivar)":<38} {quentes:>15} {tempo:>12.2f}')
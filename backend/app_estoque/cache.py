@@ -0,0 +1,100 @@
+"""
+Cache versionado do app de estoque.
+
+Cada "namespace" (ex.: 'estatisticas') tem um número de versão guardado no
+cache. As chaves de dados incluem essa versão, então invalidar um namespace é
+só incrementar o número: as entradas antigas deixam de ser lidas e expiram
+sozinhas pelo timeout.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+PREFIXO = 'estoque'
+
+
+def compartilhado():
+    """
+    True se o cache é o mesmo para todos os processos. O LocMemCache é de
+    cada processo: uma invalidação feita em um worker não chega aos outros.
+    """
+    if getattr(settings, 'ESTOQUE_CACHE_COMPARTILHADO', False):
+        return True
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def _chave_versao(namespace):
+    return f'{PREFIXO}:versao:{namespace}'
+
+
+def versao(namespace):
+    """Retorna a versão atual do namespace, criando-a se ainda não existir"""
+    chave = _chave_versao(namespace)
+    atual = cache.get(chave)
+    if atual is None:
+        # Usa o relógio como semente para não reaproveitar versões antigas
+        # caso o cache tenha sido reiniciado.
+        cache.add(chave, time.time_ns(), None)
+        atual = cache.get(chave)
+    return atual
+
+
+def versoes(*namespaces):
+    """Versões de vários namespaces com uma única leitura no cache"""
+    chaves = {_chave_versao(namespace): namespace for namespace in namespaces}
+    encontradas = cache.get_many(list(chaves))
+    return [
+        encontradas[chave] if chave in encontradas else versao(namespace)
+        for chave, namespace in chaves.items()
+    ]
+
+
+def invalidar(*namespaces):
+    """Invalida todas as entradas dos namespaces informados"""
+    for namespace in namespaces:
+        chave = _chave_versao(namespace)
+        try:
+            cache.incr(chave)
+        except ValueError:
+            cache.set(chave, time.time_ns(), None)
+
+
+def chave_na_versao(namespace, numero, *partes):
+    """
+    Monta a chave de dados para uma versão já lida. Em lotes, leia a versão
+    uma vez com versao() e monte todas as chaves com ela.
+    """
+    sufixo = ':'.join(str(p) for p in partes)
+    return f'{PREFIXO}:{namespace}:{numero}:{sufixo}'
+
+
+def chave(namespace, *partes):
+    """Monta a chave de dados para a versão atual do namespace"""
+    return chave_na_versao(namespace, versao(namespace), *partes)
+
+
+async def aversao(namespace):
+    """Versão assíncrona de versao(), para as views de views_async.py"""
+    chave = _chave_versao(namespace)
+    atual = await cache.aget(chave)
+    if atual is None:
+        await cache.aadd(chave, time.time_ns(), None)
+        atual = await cache.aget(chave)
+    return atual
+
+
+async def aversoes(*namespaces):
+    """Versão assíncrona de versoes()"""
+    chaves = {_chave_versao(namespace): namespace for namespace in namespaces}
+    encontradas = await cache.aget_many(list(chaves))
+    return [
+        encontradas[chave] if chave in encontradas else await aversao(namespace)
+        for chave, namespace in chaves.items()
+    ]
+
+
+async def achave(namespace, *partes):
+    """Versão assíncrona de chave()"""
+    return chave_na_versao(namespace, await aversao(namespace), *partes)
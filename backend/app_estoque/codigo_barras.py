@@ -0,0 +1,155 @@
+"""
+Resolução de códigos de barras para os leitores do caixa.
+
+A resposta é enxuta (só os campos que o ponto de venda usa) e passa por
+duas camadas de cache:
+
+1. um LRU em memória no próprio processo, limitado em tamanho e com TTL
+   curto, já que outros workers não conseguem invalidá-lo;
+2. opcionalmente, o cache compartilhado do Django (Redis/Memcached em
+   produção), ligado por ESTOQUE_CODIGO_BARRAS_CACHE_COMPARTILHADO.
+
+As duas camadas são invalidadas pelos sinais de Produto e de estoque.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from . import cache as cache_estoque
+from .models import Produto
+
+NAMESPACE = 'codigo_barras'
+CAMPOS = ('id', 'nome', 'codigo_barras', 'preco_venda', 'quantidade_estoque', 'ativo')
+
+
+class CacheLRU:
+    """Dicionário LRU limitado em tamanho, com expiração por entrada e seguro entre threads"""
+
+    def __init__(self, tamanho_maximo, ttl):
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        self._dados = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chave):
+        with self._lock:
+            item = self._dados.get(chave)
+            if item is None:
+                return None
+            valor, expira_em = item
+            if expira_em < time.monotonic():
+                del self._dados[chave]
+                return None
+            self._dados.move_to_end(chave)
+            return valor
+
+    def set(self, chave, valor):
+        with self._lock:
+            self._dados[chave] = (valor, time.monotonic() + self.ttl)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.tamanho_maximo:
+                self._dados.popitem(last=False)
+
+    def pop(self, chave):
+        with self._lock:
+            self._dados.pop(chave, None)
+
+    def clear(self):
+        with self._lock:
+            self._dados.clear()
+
+    def __len__(self):
+        return len(self._dados)
+
+
+_lru = CacheLRU(
+    tamanho_maximo=getattr(settings, 'ESTOQUE_CODIGO_BARRAS_LRU_TAMANHO', 4096),
+    ttl=getattr(settings, 'ESTOQUE_CODIGO_BARRAS_LRU_TTL', 5),
+)
+
+
+def _usar_cache_compartilhado():
+    return getattr(settings, 'ESTOQUE_CODIGO_BARRAS_CACHE_COMPARTILHADO', False)
+
+
+def _serializar(linha):
+    linha['preco_venda'] = str(linha['preco_venda'])
+    return linha
+
+
+def resolver(codigos):
+    """
+    Resolve uma lista de códigos de barras.
+
+    Retorna um dict {codigo: dados} só com os códigos encontrados.
+    """
+    encontrados = {}
+    faltando = []
+    for codigo in dict.fromkeys(codigos):
+        dados = _lru.get(codigo)
+        if dados is None:
+            faltando.append(codigo)
+        else:
+            encontrados[codigo] = dados
+
+    # Uma leitura da versão por lote, e não uma por código
+    numero = cache_estoque.versao(NAMESPACE) if faltando and _usar_cache_compartilhado() else None
+    if numero is not None:
+        chaves = {cache_estoque.chave_na_versao(NAMESPACE, numero, codigo): codigo for codigo in faltando}
+        for chave, dados in cache.get_many(list(chaves)).items():
+            codigo = chaves[chave]
+            encontrados[codigo] = dados
+            _lru.set(codigo, dados)
+        faltando = [codigo for codigo in faltando if codigo not in encontrados]
+
+    if faltando:
+        do_banco = {
+            linha['codigo_barras']: _serializar(linha)
+            for linha in Produto.objects.filter(codigo_barras__in=faltando).values(*CAMPOS)
+        }
+        for codigo, dados in do_banco.items():
+            _lru.set(codigo, dados)
+        if do_banco and numero is not None:
+            timeout = getattr(settings, 'ESTOQUE_CODIGO_BARRAS_CACHE_TIMEOUT', 300)
+            cache.set_many(
+                {cache_estoque.chave_na_versao(NAMESPACE, numero, codigo): dados for codigo, dados in do_banco.items()},
+                timeout,
+            )
+        encontrados.update(do_banco)
+
+    return encontrados
+
+
+async def aresolver(codigos):
+    """Versão assíncrona de resolver(): acertos no LRU não saem do event loop"""
+    encontrados = {}
+    faltando = []
+    for codigo in dict.fromkeys(codigos):
+        dados = _lru.get(codigo)
+        if dados is None:
+            faltando.append(codigo)
+        else:
+            encontrados[codigo] = dados
+
+    if faltando:
+        encontrados.update(await sync_to_async(resolver)(faltando))
+    return encontrados
+
+
+def invalidar(codigos=None):
+    """Descarta os códigos informados das duas camadas (None = todos)"""
+    if codigos is None:
+        _lru.clear()
+        cache_estoque.invalidar(NAMESPACE)
+        return
+
+    codigos = [codigo for codigo in codigos if codigo]
+    for codigo in codigos:
+        _lru.pop(codigo)
+    if codigos and _usar_cache_compartilhado():
+        numero = cache_estoque.versao(NAMESPACE)
+        cache.delete_many([cache_estoque.chave_na_versao(NAMESPACE, numero, codigo) for codigo in codigos])
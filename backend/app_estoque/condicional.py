@@ -0,0 +1,91 @@
+"""
+GET condicional (ETag) para as listagens e detalhes do catálogo.
+
+Cada tabela tem uma versão no cache versionado (cache.py), incrementada
+pelos sinais a cada alteração. O ETag de uma resposta é a combinação das
+versões das tabelas que ela exibe, então pode ser calculado antes de
+qualquer consulta: se o cliente já tem essa versão, a resposta é um 304
+sem tocar no banco nem serializar nada.
+
+As versões só valem num cache compartilhado: com um LocMemCache por
+processo, um worker que não viu a escrita responderia 304 com dados velhos.
+Nesse caso as respostas saem sem ETag (ver cache.compartilhado).
+"""
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import cache as cache_estoque
+from . import replica
+
+# Versão das movimentações de saldo (quantidade_estoque, em_estoque_baixo),
+# separada do cadastro de produtos para não invalidar categorias e fornecedores
+ESTOQUE = 'estoque'
+
+
+def _namespace(tabela):
+    return f'etag_{tabela}'
+
+
+def invalidar(*tabelas):
+    cache_estoque.invalidar(*(_namespace(tabela) for tabela in tabelas))
+
+
+def _formatar(versoes, extras):
+    return 'W/"%s"' % '-'.join(str(parte) for parte in (*versoes, *extras))
+
+
+def etag(tabelas, *extras):
+    return _formatar(cache_estoque.versoes(*(_namespace(tabela) for tabela in tabelas)), extras)
+
+
+async def aetag(tabelas, *extras):
+    """Versão assíncrona de etag(), para as views de views_async.py"""
+    return _formatar(await cache_estoque.aversoes(*(_namespace(tabela) for tabela in tabelas)), extras)
+
+
+def _sem_prefixo_fraco(valor):
+    return valor[2:] if valor.startswith('W/') else valor
+
+
+def cliente_atualizado(request, atual):
+    """True se o If-None-Match da requisição já traz a versão `atual`"""
+    enviados = {_sem_prefixo_fraco(e) for e in parse_etags(request.headers.get('If-None-Match', ''))}
+    return '*' in enviados or _sem_prefixo_fraco(atual) in enviados
+
+
+def marcar(resposta, atual):
+    """Põe o ETag numa resposta 200 lida do primário"""
+    # Uma réplica atrasada pode devolver dados anteriores à versão atual
+    if resposta.status_code == status.HTTP_200_OK and not replica.em_uso():
+        resposta['ETag'] = atual
+        resposta['Cache-Control'] = 'private, no-cache'
+    return resposta
+
+
+class ETagMixin:
+    """
+    Responde list e retrieve com ETag e devolve 304 quando o cliente já tem a versão.
+
+    `tabelas_etag` lista as tabelas (model_name ou ESTOQUE) cujos dados
+    aparecem na resposta.
+    """
+    tabelas_etag = ()
+
+    def list(self, request, *args, **kwargs):
+        return self._responder_condicional(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._responder_condicional(request, super().retrieve, *args, **kwargs)
+
+    def _responder_condicional(self, request, acao, *args, **kwargs):
+        if not cache_estoque.compartilhado():
+            return acao(request, *args, **kwargs)
+        # Lida antes da consulta: uma escrita no meio do caminho só faz o
+        # próximo GET vir completo, nunca um 304 com dados velhos
+        atual = etag(self.tabelas_etag, request.accepted_renderer.format)
+        if cliente_atualizado(request, atual):
+            resposta = Response(status=status.HTTP_304_NOT_MODIFIED)
+            resposta['ETag'] = atual
+            return resposta
+        return marcar(acao(request, *args, **kwargs), atual)
@@ -0,0 +1,190 @@
+"""
+Verificação do saldo dos produtos contra o histórico de movimentações.
+
+Produto.quantidade_estoque é um total em cache: movimentações editadas ou
+apagadas direto pela API, ou saldos gravados no cadastro, fazem o valor se
+afastar do histórico. O saldo esperado de cada produto é o último ajuste
+('A', que define o saldo absoluto) mais as entradas e menos as saídas
+registradas depois dele; sem ajuste, parte de zero.
+
+Tudo sai de uma única consulta: uma função de janela marca o último ajuste
+de cada produto e o GROUP BY soma só as movimentações a partir dele, em vez
+de um laço com duas consultas por produto. A ordem das movimentações de um
+produto é a do id, a mesma usada pelo histórico consolidado (historico.py).
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import BooleanField, Case, Value, When
+from django.utils import timezone
+
+from .models import MovimentacaoArquivada, MovimentacaoEstoque, Produto
+from .signals import estoque_alterado, estoque_minimo_cruzado
+
+MOTIVO_SALDO_SEM_HISTORICO = 'Saldo inicial (verificação de consistência)'
+MOTIVO_HISTORICO_NEGATIVO = 'Histórico com saldo negativo zerado (verificação de consistência)'
+
+# Divergências detalhadas nas respostas da API e das tarefas (o total vem sempre)
+RELATORIO_MAXIMO = 1000
+
+
+def _sql(total_ids):
+    produtos = Produto._meta.db_table
+    movimentacoes = MovimentacaoEstoque._meta.db_table
+    arquivadas = MovimentacaoArquivada._meta.db_table
+    # As colunas são UNSIGNED no MySQL: a saída só pode ser negada como inteiro com sinal
+    inteiro = 'SIGNED' if connection.vendor == 'mysql' else 'INTEGER'
+    marcadores = ', '.join(['%s'] * total_ids)
+    filtro_mov = f'WHERE produto_id IN ({marcadores})' if total_ids else ''
+    filtro_prod = f'AND p.id IN ({marcadores})' if total_ids else ''
+    # O histórico é a tabela quente mais o arquivo (arquivo.py); os ids não se repetem entre as duas
+    return f"""
+        SELECT p.id, p.nome, p.codigo_barras, p.quantidade_estoque,
+               COALESCE(e.saldo_esperado, 0), COALESCE(e.movimentacoes, 0)
+        FROM {produtos} p
+        LEFT JOIN (
+            SELECT m.produto_id,
+                   SUM(CASE WHEN m.tipo = 'S' THEN -CAST(m.quantidade AS {inteiro})
+                            ELSE CAST(m.quantidade AS {inteiro}) END) AS saldo_esperado,
+                   COUNT(*) AS movimentacoes
+            FROM (
+                SELECT produto_id, id, tipo, quantidade,
+                       MAX(CASE WHEN tipo = 'A' THEN id END)
+                           OVER (PARTITION BY produto_id) AS ultimo_ajuste
+                FROM (
+                    SELECT produto_id, id, tipo, quantidade FROM {movimentacoes} {filtro_mov}
+                    UNION ALL
+                    SELECT produto_id, id, tipo, quantidade FROM {arquivadas} {filtro_mov}
+                ) h
+            ) m
+            WHERE m.ultimo_ajuste IS NULL OR m.id >= m.ultimo_ajuste
+            GROUP BY m.produto_id
+        ) e ON e.produto_id = p.id
+        WHERE p.quantidade_estoque <> COALESCE(e.saldo_esperado, 0) {filtro_prod}
+        ORDER BY p.id
+    """
+
+
+def verificar(ids=None):
+    """
+    Lista os produtos cujo saldo difere do histórico (ids limita a verificação).
+
+    Cada item: produto, nome, codigo_barras, saldo_atual, saldo_esperado e
+    movimentacoes (0 = produto sem histórico algum).
+    """
+    if ids is not None and not ids:
+        return []
+    ids = list(ids or [])
+    with connection.cursor() as cursor:
+        cursor.execute(_sql(len(ids)), ids * 3)
+        linhas = cursor.fetchall()
+    return [
+        {
+            'produto': pk,
+            'nome': nome,
+            'codigo_barras': codigo,
+            'saldo_atual': saldo_atual,
+            # SUM devolve Decimal no MySQL
+            'saldo_esperado': int(saldo_esperado),
+            'movimentacoes': int(movimentacoes),
+        }
+        for pk, nome, codigo, saldo_atual, saldo_esperado, movimentacoes in linhas
+    ]
+
+
+def _reparar_lote(ids, usuario):
+    with transaction.atomic():
+        # O bloqueio das linhas segura novas movimentações desses produtos
+        # (o serviço de estoque atualiza o produto antes de gravar a movimentação),
+        # então a divergência recalculada aqui é definitiva
+        list(Produto.objects.select_for_update().filter(pk__in=ids).values_list('pk'))
+        divergentes = verificar(ids)
+        com_historico = [d for d in divergentes if d['movimentacoes']]
+        sem_historico = [d for d in divergentes if not d['movimentacoes']]
+
+        # Com histórico, o histórico vale: o saldo do produto é corrigido.
+        # Um histórico que dá saldo negativo (saídas editadas ou apagadas) não
+        # cabe no produto: o saldo vai a zero e um ajuste para zero entra no
+        # histórico, senão o produto seguiria divergente a cada verificação
+        negativos = [d for d in com_historico if d['saldo_esperado'] < 0]
+        if com_historico:
+            saldos = {d['produto']: max(d['saldo_esperado'], 0) for d in com_historico}
+            minimos = {}
+            marcados = {}
+            for pk, minimo, marcado in Produto.objects.filter(pk__in=saldos).values_list(
+                'pk', 'estoque_minimo', 'em_estoque_baixo'
+            ):
+                minimos[pk] = minimo
+                marcados[pk] = marcado
+            Produto.objects.filter(pk__in=saldos).update(
+                quantidade_estoque=Case(*[When(pk=pk, then=Value(saldo)) for pk, saldo in saldos.items()]),
+                em_estoque_baixo=Case(
+                    *[When(pk=pk, then=Value(saldo < minimos[pk])) for pk, saldo in saldos.items()],
+                    output_field=BooleanField(),
+                ),
+                atualizado_em=timezone.now(),
+            )
+            cruzados = [pk for pk, saldo in saldos.items() if (saldo < minimos[pk]) != marcados[pk]]
+            if cruzados:
+                estoque_minimo_cruzado.send(
+                    sender=Produto,
+                    abaixo=[(pk, saldos[pk], minimos[pk]) for pk in cruzados if saldos[pk] < minimos[pk]],
+                    acima=[pk for pk in cruzados if saldos[pk] >= minimos[pk]],
+                )
+
+        # Sem histórico (saldo informado no cadastro), o saldo vale: entra como ajuste inicial
+        MovimentacaoEstoque.objects.bulk_create([
+            *(
+                MovimentacaoEstoque(
+                    produto_id=d['produto'],
+                    tipo=MovimentacaoEstoque.TipoMovimentacao.AJUSTE,
+                    quantidade=d['saldo_atual'],
+                    saldo_anterior=0,
+                    usuario=usuario,
+                    motivo=MOTIVO_SALDO_SEM_HISTORICO,
+                )
+                for d in sem_historico
+            ),
+            *(
+                MovimentacaoEstoque(
+                    produto_id=d['produto'],
+                    tipo=MovimentacaoEstoque.TipoMovimentacao.AJUSTE,
+                    quantidade=0,
+                    saldo_anterior=d['saldo_atual'],
+                    usuario=usuario,
+                    motivo=MOTIVO_HISTORICO_NEGATIVO,
+                )
+                for d in negativos
+            ),
+        ])
+
+    if com_historico:
+        estoque_alterado.send(
+            sender=Produto,
+            produto_ids=[d['produto'] for d in com_historico],
+            codigos_barras=[d['codigo_barras'] for d in com_historico],
+        )
+    return len(divergentes)
+
+
+def reparar(discrepancias, usuario=None, lote=None):
+    """
+    Corrige as divergências em lotes de ESTOQUE_CONSISTENCIA_LOTE produtos.
+
+    Cada lote é verificado de novo sob bloqueio antes de ser corrigido, então
+    produtos movimentados desde a verificação não são sobrescritos com um
+    saldo velho. Retorna quantos produtos foram corrigidos.
+    """
+    lote = lote or getattr(settings, 'ESTOQUE_CONSISTENCIA_LOTE', 1000)
+    ids = [d['produto'] for d in discrepancias]
+    return sum(_reparar_lote(ids[i:i + lote], usuario) for i in range(0, len(ids), lote))
+
+
+def relatorio(reparar_divergencias=False, usuario=None):
+    """Resultado usado pela API e pela tarefa verificar_estoque"""
+    discrepancias = verificar()
+    reparados = reparar(discrepancias, usuario=usuario) if reparar_divergencias else 0
+    return {
+        'total': len(discrepancias),
+        'reparados': reparados,
+        'discrepancias': discrepancias[:RELATORIO_MAXIMO],
+    }
@@ -0,0 +1,65 @@
+"""
+Total de produtos por categoria e por fornecedor.
+
+Por padrão o total vem de um COUNT anotado na própria consulta da página.
+Com ESTOQUE_CONTADORES_PRODUTOS ligado, as views leem o contador
+desnormalizado `contador_produtos`, mantido pelos sinais de Produto, e não
+precisam recontar nada.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from . import condicional
+from .models import Categoria, Fornecedor, Produto
+
+
+def usar_contadores():
+    return getattr(settings, 'ESTOQUE_CONTADORES_PRODUTOS', False)
+
+
+def anotar_total_produtos(queryset):
+    """Anota `total_produtos` no queryset de Categoria ou Fornecedor"""
+    if usar_contadores():
+        return queryset.annotate(total_produtos=F('contador_produtos'))
+    # Consultas com GROUP BY ignoram Meta.ordering, então a ordem é explicitada
+    ordenacao = queryset.query.order_by or queryset.model._meta.ordering
+    return queryset.annotate(total_produtos=Count('produtos')).order_by(*ordenacao)
+
+
+def total_produtos(obj):
+    """Total de uma instância avulsa (sem anotação), ex.: resposta de um create"""
+    total = getattr(obj, 'total_produtos', None)
+    if total is not None:
+        return total
+    if usar_contadores():
+        return obj.contador_produtos
+    return obj.produtos.count()
+
+
+def ajustar(categoria_id, fornecedor_id, delta):
+    """Soma `delta` aos contadores da categoria e do fornecedor informados"""
+    # A coluna é UNSIGNED no MySQL: nunca deixa o decremento ficar negativo
+    filtro = {'contador_produtos__gte': -delta} if delta < 0 else {}
+    for modelo, pk in ((Categoria, categoria_id), (Fornecedor, fornecedor_id)):
+        if pk is not None:
+            modelo.objects.filter(pk=pk, **filtro).update(
+                contador_produtos=F('contador_produtos') + delta
+            )
+
+
+def recalcular():
+    """Reconstrói todos os contadores a partir da tabela de produtos"""
+    for modelo, campo in ((Categoria, 'categoria'), (Fornecedor, 'fornecedor')):
+        contagem = (
+            Produto.objects.filter(**{campo: OuterRef('pk')})
+            .order_by()
+            .values(campo)
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        modelo.objects.update(
+            contador_produtos=Coalesce(Subquery(contagem), Value(0))
+        )
+    transaction.on_commit(lambda: condicional.invalidar('categoria', 'fornecedor'))
@@ -0,0 +1,120 @@
+"""
+Motor de estatísticas do dashboard.
+
+Os seis indicadores são calculados em duas consultas agregadas (uma sobre
+Produto e uma com as contagens das demais tabelas) e o resultado fica em
+cache versionado, invalidado pelos sinais de alteração de estoque e cadastro.
+"""
+from datetime import datetime, time, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.utils import timezone
+
+from . import cache as cache_estoque
+from . import replica
+from .models import Categoria, Fornecedor, Produto, MovimentacaoEstoque
+
+NAMESPACE = 'estatisticas'
+
+
+def _contagem_escalar(queryset):
+    """Transforma um queryset em um SELECT COUNT(*) escalar (SQL, params)"""
+    query = queryset.order_by().values('pk').query
+    sql, params = query.get_compiler(connection=connections[queryset.db]).as_sql()
+    return f'(SELECT COUNT(*) FROM ({sql}) contagem)', params
+
+
+def intervalo_do_dia(data):
+    """Início e fim (exclusivo) do dia local, para filtrar data_hora por faixa"""
+    inicio = timezone.make_aware(datetime.combine(data, time.min))
+    return inicio, inicio + timedelta(days=1)
+
+
+def _contagens_cadastro(hoje):
+    """Conta categorias, fornecedores ativos e movimentações do dia em um único SELECT"""
+    # Faixa em vez de data_hora__date: DATE(data_hora) impediria o uso do índice
+    inicio, fim = intervalo_do_dia(hoje)
+    consultas = [
+        Categoria.objects.all(),
+        Fornecedor.objects.filter(ativo=True),
+        MovimentacaoEstoque.objects.filter(data_hora__gte=inicio, data_hora__lt=fim),
+    ]
+    partes, params = [], []
+    for queryset in consultas:
+        sql, sub_params = _contagem_escalar(queryset)
+        partes.append(sql)
+        params.extend(sub_params)
+
+    with connections[consultas[0].db].cursor() as cursor:
+        cursor.execute('SELECT ' + ', '.join(partes), params)
+        return cursor.fetchone()
+
+
+def calcular_estatisticas():
+    """Calcula as estatísticas direto no banco, sem carregar produtos em memória"""
+    hoje = timezone.localdate()
+    ativos = Q(ativo=True)
+
+    produtos = Produto.objects.aggregate(
+        total_produtos=Count('id', filter=ativos),
+        valor_total_estoque=Sum(
+            F('quantidade_estoque') * F('preco_custo'),
+            filter=ativos,
+            output_field=DecimalField(max_digits=15, decimal_places=2),
+        ),
+        produtos_estoque_baixo=Count('id', filter=ativos & Q(em_estoque_baixo=True)),
+    )
+    total_categorias, total_fornecedores, movimentacoes_hoje = _contagens_cadastro(hoje)
+
+    valor_total_estoque = produtos['valor_total_estoque']
+    if valor_total_estoque is None:
+        valor_total_estoque = 0
+
+    return {
+        'total_produtos': produtos['total_produtos'],
+        'total_categorias': total_categorias,
+        'total_fornecedores': total_fornecedores,
+        'valor_total_estoque': valor_total_estoque,
+        'produtos_estoque_baixo': produtos['produtos_estoque_baixo'],
+        'movimentacoes_hoje': movimentacoes_hoje,
+    }
+
+
+def obter_estatisticas():
+    """Retorna as estatísticas do cache, recalculando quando a versão muda"""
+    # A data entra na chave porque "movimentações hoje" vira à meia-noite
+    chave = cache_estoque.chave(NAMESPACE, timezone.localdate().isoformat())
+    dados = cache.get(chave)
+    if dados is None:
+        dados = calcular_estatisticas()
+        cache.set(chave, dados, _timeout())
+    return dados
+
+
+def _timeout():
+    timeout = getattr(settings, 'ESTOQUE_ESTATISTICAS_CACHE_TIMEOUT', 300)
+    if replica.em_uso():
+        # Calculado na réplica, pode não ter a última escrita (que já
+        # invalidou o cache): guarda só pelo atraso máximo tolerado
+        timeout = min(timeout, getattr(settings, 'ESTOQUE_REPLICA_ATRASO_MAXIMO', 5))
+    return timeout
+
+
+async def aobter_estatisticas():
+    """Versão assíncrona de obter_estatisticas (modo ASGI)"""
+    chave = await cache_estoque.achave(NAMESPACE, timezone.localdate().isoformat())
+    dados = await cache.aget(chave)
+    if dados is None:
+        # A contagem do cadastro usa cursor bruto, que não tem API assíncrona;
+        # o cálculo inteiro roda na thread de banco, fora do event loop.
+        dados = await sync_to_async(calcular_estatisticas)()
+        await cache.aset(chave, dados, _timeout())
+    return dados
+
+
+def invalidar_estatisticas():
+    cache_estoque.invalidar(NAMESPACE)
@@ -0,0 +1,245 @@
+"""
+Serviço de movimentação de estoque.
+
+Concentra as escritas em Produto.quantidade_estoque, para que toda
+movimentação siga o mesmo caminho: bloqueio da linha do produto, registro da
+MovimentacaoEstoque e atualização do saldo, seguidos do sinal
+`estoque_alterado`. Quando o saldo cruza o estoque mínimo, o sinal
+`estoque_minimo_cruzado` é enviado antes do commit (alertas.py).
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import BooleanField, Case, F, Q, When, Value
+from django.utils import timezone
+
+from .models import Produto, MovimentacaoEstoque
+from .signals import estoque_alterado, estoque_minimo_cruzado
+
+TipoMovimentacao = MovimentacaoEstoque.TipoMovimentacao
+
+
+class LoteInvalido(Exception):
+    """Uma ou mais linhas do lote não podem ser aplicadas; nada foi gravado"""
+
+    def __init__(self, erros):
+        super().__init__('Lote de movimentações inválido')
+        self.erros = erros
+
+
+def calcular_saldo(saldo_atual, tipo, quantidade):
+    """Retorna o novo saldo ou levanta ValueError se a saída não couber no estoque"""
+    if tipo == TipoMovimentacao.ENTRADA:
+        return saldo_atual + quantidade
+    if tipo == TipoMovimentacao.SAIDA:
+        if quantidade > saldo_atual:
+            raise ValueError(f'Estoque insuficiente. Disponível: {saldo_atual}')
+        return saldo_atual - quantidade
+    return quantidade  # Ajuste define o saldo absoluto
+
+
+def registrar_movimentacao(movimentacao, salvar):
+    """
+    Aplica uma movimentação nova ao saldo do produto e grava o registro.
+
+    `salvar` é a função que efetivamente insere a movimentação (o save() do
+    modelo). O saldo é alterado por um único UPDATE condicional: a saída só
+    decrementa se houver estoque suficiente na própria linha, então saídas
+    concorrentes nunca vendem além do disponível. Como o MySQL não tem
+    UPDATE ... RETURNING, o saldo é relido logo em seguida, ainda sob o
+    bloqueio de linha que o UPDATE mantém até o fim da transação, e o
+    saldo_anterior é derivado dele.
+    """
+    tipo = movimentacao.tipo
+    quantidade = movimentacao.quantidade
+    agora = timezone.now()
+
+    campos_saldo = ('quantidade_estoque', 'estoque_minimo', 'em_estoque_baixo', 'codigo_barras')
+
+    with transaction.atomic():
+        produto = Produto.objects.filter(pk=movimentacao.produto_id)
+
+        if tipo == TipoMovimentacao.ENTRADA:
+            atualizados = produto.update(
+                quantidade_estoque=F('quantidade_estoque') + quantidade, atualizado_em=agora
+            )
+        elif tipo == TipoMovimentacao.SAIDA:
+            atualizados = produto.filter(quantidade_estoque__gte=quantidade).update(
+                quantidade_estoque=F('quantidade_estoque') - quantidade, atualizado_em=agora
+            )
+        else:
+            atual = produto.select_for_update().values_list(*campos_saldo).first()
+            atualizados = 0 if atual is None else produto.update(
+                quantidade_estoque=quantidade,
+                em_estoque_baixo=quantidade < atual[1],
+                atualizado_em=agora,
+            )
+
+        if not atualizados:
+            disponivel = produto.values_list('quantidade_estoque', flat=True).first()
+            if disponivel is None:
+                raise ValidationError('Produto não encontrado.')
+            raise ValidationError(f'Estoque insuficiente. Disponível: {disponivel}')
+
+        if tipo == TipoMovimentacao.AJUSTE:
+            saldo_anterior, estoque_minimo, marcado, codigo = atual
+            saldo_atual = quantidade
+        else:
+            saldo_atual, estoque_minimo, marcado, codigo = produto.values_list(*campos_saldo).get()
+            delta = quantidade if tipo == TipoMovimentacao.ENTRADA else -quantidade
+            saldo_anterior = saldo_atual - delta
+            # Só grava a marca de estoque baixo quando o saldo cruza o mínimo
+            if (saldo_atual < estoque_minimo) != marcado:
+                produto.update(em_estoque_baixo=not marcado)
+
+        movimentacao.saldo_anterior = saldo_anterior
+        salvar()
+
+        abaixo = saldo_atual < estoque_minimo
+        if abaixo != marcado:
+            estoque_minimo_cruzado.send(
+                sender=Produto,
+                abaixo=[(movimentacao.produto_id, saldo_atual, estoque_minimo)] if abaixo else [],
+                acima=[] if abaixo else [movimentacao.produto_id],
+            )
+
+    # Mantém a instância em memória coerente com o banco
+    if MovimentacaoEstoque.produto.is_cached(movimentacao):
+        movimentacao.produto.quantidade_estoque = saldo_atual
+        movimentacao.produto.em_estoque_baixo = saldo_atual < estoque_minimo
+        movimentacao.produto._estoque_baixo_original = movimentacao.produto.em_estoque_baixo
+        movimentacao.produto.atualizado_em = agora
+
+    estoque_alterado.send(
+        sender=Produto, produto_ids=[movimentacao.produto_id], codigos_barras=[codigo]
+    )
+    return movimentacao
+
+
+def movimentar(produto, tipo, quantidade, **campos):
+    """Cria uma movimentação para o produto pelo caminho único do serviço"""
+    return MovimentacaoEstoque.objects.create(
+        produto=produto, tipo=tipo, quantidade=quantidade, **campos
+    )
+
+
+def aplicar_lote(itens, usuario=None):
+    """
+    Aplica um lote de movimentações em uma única transação.
+
+    `itens` é uma lista de dicts com produto (id), tipo, quantidade e,
+    opcionalmente, motivo, numero_documento e observacao. As linhas são
+    aplicadas na ordem recebida; se qualquer uma falhar, levanta LoteInvalido
+    com os erros por linha e nada é gravado.
+
+    O custo é fixo: um SELECT ... FOR UPDATE dos produtos (em ordem de id,
+    para evitar deadlock entre lotes concorrentes), um INSERT em massa das
+    movimentações e um único UPDATE com CASE para os novos saldos.
+    """
+    ids = sorted({item['produto'] for item in itens})
+
+    with transaction.atomic():
+        produtos = Produto.objects.select_for_update().filter(pk__in=ids).order_by('pk').in_bulk()
+        saldos = {pk: produto.quantidade_estoque for pk, produto in produtos.items()}
+
+        movimentacoes, resultados, erros = [], [], []
+        for indice, item in enumerate(itens):
+            produto = produtos.get(item['produto'])
+            if produto is None:
+                erros.append({'indice': indice, 'erro': 'Produto não encontrado.'})
+                continue
+
+            saldo_anterior = saldos[produto.pk]
+            try:
+                saldo_atual = calcular_saldo(saldo_anterior, item['tipo'], item['quantidade'])
+            except ValueError as ve:
+                erros.append({'indice': indice, 'erro': str(ve)})
+                continue
+            saldos[produto.pk] = saldo_atual
+
+            movimentacoes.append(MovimentacaoEstoque(
+                produto=produto,
+                tipo=item['tipo'],
+                quantidade=item['quantidade'],
+                usuario=usuario,
+                motivo=item.get('motivo') or None,
+                numero_documento=item.get('numero_documento') or None,
+                observacao=item.get('observacao') or None,
+                saldo_anterior=saldo_anterior,
+            ))
+            resultados.append({
+                'indice': indice,
+                'produto': produto.pk,
+                'tipo': item['tipo'],
+                'quantidade': item['quantidade'],
+                'saldo_anterior': saldo_anterior,
+                'saldo_atual': saldo_atual,
+            })
+
+        if erros:
+            raise LoteInvalido(erros)
+
+        MovimentacaoEstoque.objects.bulk_create(movimentacoes)
+
+        alterados = [pk for pk in saldos if saldos[pk] != produtos[pk].quantidade_estoque]
+        cruzados = [
+            pk for pk in alterados
+            if (saldos[pk] < produtos[pk].estoque_minimo) != produtos[pk].em_estoque_baixo
+        ]
+        if alterados:
+            Produto.objects.filter(pk__in=alterados).update(
+                quantidade_estoque=Case(
+                    *[When(pk=pk, then=Value(saldos[pk])) for pk in alterados]
+                ),
+                em_estoque_baixo=Case(
+                    *[When(pk=pk, then=Value(saldos[pk] < produtos[pk].estoque_minimo))
+                      for pk in alterados],
+                    output_field=BooleanField(),
+                ),
+                atualizado_em=timezone.now(),
+            )
+        if cruzados:
+            estoque_minimo_cruzado.send(
+                sender=Produto,
+                abaixo=[
+                    (pk, saldos[pk], produtos[pk].estoque_minimo)
+                    for pk in cruzados if saldos[pk] < produtos[pk].estoque_minimo
+                ],
+                acima=[pk for pk in cruzados if saldos[pk] >= produtos[pk].estoque_minimo],
+            )
+
+    estoque_alterado.send(
+        sender=Produto,
+        produto_ids=ids,
+        codigos_barras=[produto.codigo_barras for produto in produtos.values()],
+    )
+    return resultados
+
+
+def reconstruir_estoque_baixo():
+    """
+    Recalcula a marca em_estoque_baixo de todos os produtos.
+
+    Só toca as linhas divergentes, abrindo ou resolvendo os alertas delas;
+    retorna quantas foram corrigidas.
+    """
+    abaixo = Q(quantidade_estoque__lt=F('estoque_minimo'))
+    with transaction.atomic():
+        divergentes = Produto.objects.select_for_update().filter(
+            Q(abaixo, em_estoque_baixo=False) | Q(~abaixo, em_estoque_baixo=True)
+        )
+        marcar = []
+        desmarcar = []
+        for pk, saldo, minimo in divergentes.values_list('pk', 'quantidade_estoque', 'estoque_minimo'):
+            if saldo < minimo:
+                marcar.append((pk, saldo, minimo))
+            else:
+                desmarcar.append(pk)
+        if marcar:
+            Produto.objects.filter(pk__in=[pk for pk, _, _ in marcar]).update(em_estoque_baixo=True)
+        if desmarcar:
+            Produto.objects.filter(pk__in=desmarcar).update(em_estoque_baixo=False)
+        if marcar or desmarcar:
+            estoque_minimo_cruzado.send(sender=Produto, abaixo=marcar, acima=desmarcar)
+    if marcar or desmarcar:
+        estoque_alterado.send(sender=Produto, produto_ids=None, codigos_barras=None)
+    return len(marcar) + len(desmarcar)
@@ -0,0 +1,177 @@
+"""
+Exportação de produtos e movimentações em CSV ou NDJSON.
+
+As linhas são lidas em lotes por chave (id > último id lido), em vez de um
+único cursor: o driver do MySQL carrega o resultado inteiro de uma consulta
+em memória, então a paginação por chave é o que mantém o consumo constante
+mesmo com milhões de movimentações. Cada lote vira texto e é enviado pelo
+StreamingHttpResponse assim que fica pronto.
+
+A exportação de movimentações inclui as arquivadas (arquivo.py) quando o
+período pedido alcança o arquivo; nesse caso a consulta é uma lista de
+querysets, percorridos em sequência (o arquivo primeiro).
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import QuerySet
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import arquivo, filtros
+from .models import MovimentacaoArquivada, Produto, MovimentacaoEstoque
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+COLUNAS_PRODUTOS = {
+    'id': 'id',
+    'nome': 'nome',
+    'codigo_barras': 'codigo_barras',
+    'categoria': 'categoria__nome',
+    'fornecedor': 'fornecedor__nome',
+    'preco_custo': 'preco_custo',
+    'preco_venda': 'preco_venda',
+    'quantidade_estoque': 'quantidade_estoque',
+    'estoque_minimo': 'estoque_minimo',
+    'ativo': 'ativo',
+    'atualizado_em': 'atualizado_em',
+}
+
+COLUNAS_MOVIMENTACOES = {
+    'id': 'id',
+    'data_hora': 'data_hora',
+    'produto_id': 'produto_id',
+    'produto': 'produto__nome',
+    'tipo': 'tipo',
+    'quantidade': 'quantidade',
+    'saldo_anterior': 'saldo_anterior',
+    'usuario': 'usuario__username',
+    'motivo': 'motivo',
+    'numero_documento': 'numero_documento',
+    'observacao': 'observacao',
+}
+
+
+def _inicio_do_dia(params, nome):
+    valor = params.get(nome)
+    if not valor:
+        return None
+    data = parse_date(valor)
+    if data is None:
+        raise ValueError(f'Parâmetro "{nome}" deve estar no formato AAAA-MM-DD.')
+    return timezone.make_aware(datetime.combine(data, time.min))
+
+
+def filtrar_produtos(params):
+    """Mesmos filtros da listagem de produtos, mais `ativo` (sem padrão)"""
+    queryset = filtros.filtrar_produtos(Produto.objects.all(), params)
+    ativo = params.get('ativo')
+    if ativo:
+        queryset = queryset.filter(ativo=ativo.lower() == 'true')
+    return queryset
+
+
+def _incluir_arquivo(params, inicio):
+    """incluir_arquivo=true/false decide; sem ele, o arquivo entra se o período o alcança"""
+    valor = params.get('incluir_arquivo')
+    if valor:
+        return valor.lower() == 'true'
+    if inicio is None:
+        return MovimentacaoArquivada.objects.exists()
+    ultima = arquivo.ultima_arquivada()
+    return ultima is not None and inicio <= ultima
+
+
+def filtrar_movimentacoes(params):
+    """
+    Aplica os filtros de exportação de movimentações (levanta ValueError se inválidos).
+
+    Retorna um queryset ou, se o arquivo entra, a lista [arquivadas, quentes].
+    """
+    produto = filtros.inteiro(params, 'produto')
+    tipo = params.get('tipo')
+    if tipo and tipo not in MovimentacaoEstoque.TipoMovimentacao.values:
+        raise ValueError('Parâmetro "tipo" deve ser E, S ou A.')
+    # Intervalo [data_inicio, data_fim] em dias locais, como faixa de data_hora
+    inicio = _inicio_do_dia(params, 'data_inicio')
+    fim = _inicio_do_dia(params, 'data_fim')
+
+    def filtrar(queryset):
+        if produto:
+            queryset = queryset.filter(produto_id=produto)
+        if tipo:
+            queryset = queryset.filter(tipo=tipo)
+        if inicio:
+            queryset = queryset.filter(data_hora__gte=inicio)
+        if fim:
+            queryset = queryset.filter(data_hora__lt=fim + timedelta(days=1))
+        return queryset
+
+    quentes = filtrar(MovimentacaoEstoque.objects.all())
+    if not _incluir_arquivo(params, inicio):
+        return quentes
+    return [filtrar(MovimentacaoArquivada.objects.all()), quentes]
+
+
+def _querysets(consulta):
+    return [consulta] if isinstance(consulta, QuerySet) else list(consulta)
+
+
+def usando(consulta, alias):
+    """Fixa o banco de um queryset ou de uma lista deles (ver filtrar_movimentacoes)"""
+    return [queryset.using(alias) for queryset in _querysets(consulta)]
+
+
+def iterar_em_lotes(consulta, colunas, tamanho=None):
+    """
+    Percorre o queryset (ou cada queryset da lista, em sequência) em ordem
+    de id, um lote de `tamanho` linhas por consulta
+    """
+    tamanho = tamanho or getattr(settings, 'ESTOQUE_EXPORTACAO_LOTE', 2000)
+    campos = list(colunas.values())
+    posicao_id = campos.index('id')
+    for queryset in _querysets(consulta):
+        queryset = queryset.order_by('pk').values_list(*campos)
+        ultimo_id = 0
+        while True:
+            lote = list(queryset.filter(pk__gt=ultimo_id)[:tamanho])
+            if not lote:
+                break
+            yield lote
+            ultimo_id = lote[-1][posicao_id]
+
+
+class _Eco:
+    """Pseudo-arquivo do csv.writer que só devolve o que foi escrito"""
+
+    def write(self, valor):
+        return valor
+
+
+def gerar_csv(queryset, colunas):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(list(colunas))
+    for lote in iterar_em_lotes(queryset, colunas):
+        yield ''.join(escritor.writerow(linha) for linha in lote)
+
+
+def gerar_ndjson(queryset, colunas):
+    nomes = list(colunas)
+    for lote in iterar_em_lotes(queryset, colunas):
+        yield ''.join(
+            json.dumps(dict(zip(nomes, linha)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+            for linha in lote
+        )
+
+
+def gerar(formato, queryset, colunas):
+    """Gerador de texto no formato pedido ('csv' ou 'ndjson')"""
+    if formato == 'csv':
+        return gerar_csv(queryset, colunas)
+    return gerar_ndjson(queryset, colunas)
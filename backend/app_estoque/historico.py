@@ -0,0 +1,156 @@
+"""
+Histórico consolidado do estoque (tabela EstoqueDiario).
+
+Responder "qual era o estoque do produto X no dia D" a partir das
+movimentações exige percorrer o histórico inteiro. Aqui cada dia com
+movimentação vira uma linha por produto, com saldo inicial e final e os
+totais de entradas, saídas e ajustes; os relatórios leem só essa tabela.
+
+A consolidação é incremental: reprocessa a partir do último dia já
+consolidado (que pode ter sido gravado pela metade) até hoje.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Max, Min, OuterRef, Q, Subquery, Sum, When
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+from .estatisticas import intervalo_do_dia
+from .models import EstoqueDiario, MovimentacaoArquivada, MovimentacaoEstoque, Produto
+
+TipoMovimentacao = MovimentacaoEstoque.TipoMovimentacao
+
+
+def _saldo_apos(movimentacao):
+    """Saldo do produto logo depois da movimentação (a partir do saldo_anterior gravado)"""
+    if movimentacao.tipo == TipoMovimentacao.ENTRADA:
+        return movimentacao.saldo_anterior + movimentacao.quantidade
+    if movimentacao.tipo == TipoMovimentacao.SAIDA:
+        return max(movimentacao.saldo_anterior - movimentacao.quantidade, 0)
+    return movimentacao.quantidade
+
+
+def _totais_do_dia(modelo, inicio, fim):
+    do_dia = modelo.objects.filter(data_hora__gte=inicio, data_hora__lt=fim).order_by()
+    # Ajuste define o saldo absoluto: a variação é quantidade - saldo_anterior.
+    # Cast para inteiro com sinal porque as colunas são UNSIGNED no MySQL.
+    variacao_ajuste = Cast('quantidade', IntegerField()) - Cast('saldo_anterior', IntegerField())
+    return do_dia.values('produto_id').annotate(
+        entradas=Coalesce(Sum('quantidade', filter=Q(tipo=TipoMovimentacao.ENTRADA)), 0),
+        saidas=Coalesce(Sum('quantidade', filter=Q(tipo=TipoMovimentacao.SAIDA)), 0),
+        ajustes=Coalesce(Sum(variacao_ajuste, filter=Q(tipo=TipoMovimentacao.AJUSTE)), 0),
+        movimentacoes=Count('id'),
+        primeira=Min('id'),
+        ultima=Max('id'),
+    )
+
+
+def consolidar_dia(data):
+    """Regrava as linhas de EstoqueDiario do dia; retorna quantas foram gravadas"""
+    inicio, fim = intervalo_do_dia(data)
+
+    # O dia pode estar na tabela quente, no arquivo ou (arquivamento
+    # interrompido) dividido entre os dois; os ids não se repetem entre eles
+    por_produto = {}
+    for modelo in (MovimentacaoArquivada, MovimentacaoEstoque):
+        for linha in _totais_do_dia(modelo, inicio, fim):
+            atual = por_produto.setdefault(linha['produto_id'], linha)
+            if atual is not linha:
+                for campo in ('entradas', 'saidas', 'ajustes', 'movimentacoes'):
+                    atual[campo] += linha[campo]
+                atual['primeira'] = min(atual['primeira'], linha['primeira'])
+                atual['ultima'] = max(atual['ultima'], linha['ultima'])
+    totais = list(por_produto.values())
+
+    # Primeira e última movimentação de cada produto, lidas em uma consulta por tabela
+    ids = [linha['primeira'] for linha in totais] + [linha['ultima'] for linha in totais]
+    extremos = MovimentacaoArquivada.objects.in_bulk(ids)
+    extremos.update(MovimentacaoEstoque.objects.in_bulk(ids))
+    linhas = []
+    for linha in totais:
+        linhas.append(EstoqueDiario(
+            produto_id=linha['produto_id'],
+            data=data,
+            saldo_inicial=extremos[linha['primeira']].saldo_anterior,
+            saldo_final=_saldo_apos(extremos[linha['ultima']]),
+            entradas=linha['entradas'],
+            saidas=linha['saidas'],
+            ajustes=linha['ajustes'],
+            movimentacoes=linha['movimentacoes'],
+        ))
+
+    with transaction.atomic():
+        EstoqueDiario.objects.filter(data=data).delete()
+        EstoqueDiario.objects.bulk_create(linhas, batch_size=2000)
+    return len(linhas)
+
+
+def consolidar(desde=None, ate=None):
+    """
+    Consolida os dias de `desde` até `ate` (inclusive).
+
+    Sem `desde`, continua do último dia consolidado ou, na primeira
+    execução, da primeira movimentação. Retorna (dias, linhas).
+    """
+    ate = ate or timezone.localdate()
+    if desde is None:
+        desde = EstoqueDiario.objects.aggregate(ultimo=Max('data'))['ultimo']
+    if desde is None:
+        primeiras = [
+            modelo.objects.order_by('data_hora', 'id').values_list('data_hora', flat=True).first()
+            for modelo in (MovimentacaoArquivada, MovimentacaoEstoque)
+        ]
+        primeiras = [data_hora for data_hora in primeiras if data_hora is not None]
+        if not primeiras:
+            return 0, 0
+        primeira = min(primeiras)
+        desde = timezone.localtime(primeira).date()
+
+    dias = linhas = 0
+    data = desde
+    while data <= ate:
+        linhas += consolidar_dia(data)
+        dias += 1
+        data += timedelta(days=1)
+    return dias, linhas
+
+
+def saldos_em(data, produtos=None):
+    """
+    Produtos anotados com o `saldo` que tinham ao fim de `data`.
+
+    Usa o último dia consolidado até a data; sem nenhum, o saldo anterior à
+    primeira movimentação depois dela (arquivo e tabela quente) ou o saldo
+    inicial do primeiro dia consolidado depois dela. Sem nada depois da data
+    vale o saldo atual, se o produto já existia; senão o saldo é None. Cada
+    subconsulta é uma busca em um índice que começa pelo produto.
+    """
+    fim = intervalo_do_dia(data)[1]
+    ate_a_data = EstoqueDiario.objects.filter(produto=OuterRef('pk'), data__lte=data).order_by('-data')
+    depois = EstoqueDiario.objects.filter(produto=OuterRef('pk'), data__gt=data).order_by('data')
+    # O arquivo guarda as movimentações mais antigas, então vem antes
+    movimentacoes_depois = [
+        modelo.objects.filter(produto=OuterRef('pk'), data_hora__gte=fim).order_by('data_hora', 'id')
+        for modelo in (MovimentacaoArquivada, MovimentacaoEstoque)
+    ]
+    queryset = Produto.objects.all() if produtos is None else Produto.objects.filter(pk__in=produtos)
+    return queryset.annotate(saldo=Coalesce(
+        Subquery(ate_a_data.values('saldo_final')[:1]),
+        *[Subquery(movimentacoes.values('saldo_anterior')[:1]) for movimentacoes in movimentacoes_depois],
+        Subquery(depois.values('saldo_inicial')[:1]),
+        Case(When(criado_em__lt=fim, then='quantidade_estoque'), default=None),
+    )).order_by('nome', 'id')
+
+
+def totais_diarios(data_inicio, data_fim, produto=None):
+    """Entradas, saídas e ajustes somados por dia no período (inclusive)"""
+    queryset = EstoqueDiario.objects.filter(data__gte=data_inicio, data__lte=data_fim)
+    if produto:
+        queryset = queryset.filter(produto_id=produto)
+    return queryset.values('data').annotate(
+        entradas=Sum('entradas'),
+        saidas=Sum('saidas'),
+        ajustes=Sum('ajustes'),
+        movimentacoes=Sum('movimentacoes'),
+    ).order_by('data')
@@ -0,0 +1,369 @@
+"""
+Importação de produtos em massa a partir de CSV ou XLSX.
+
+O arquivo é lido linha a linha (o upload fica em disco quando passa de
+FILE_UPLOAD_MAX_MEMORY_SIZE) e as linhas válidas são gravadas em lotes de
+ESTOQUE_IMPORTACAO_LOTE com um único INSERT ... ON CONFLICT (ON DUPLICATE
+KEY UPDATE no MySQL) por lote, usando o código de barras como chave:
+produtos novos são criados e os existentes atualizados.
+
+As regras são as mesmas do ProdutoSerializer e de Produto.clean(); como o
+bulk_create não passa pelo save() nem pelos sinais, os campos derivados,
+os contadores e os caches são tratados aqui. O saldo só é lido da planilha
+para produtos novos (vira um ajuste inicial no histórico); o de produtos
+existentes muda apenas por movimentações.
+
+O formato aceito é o mesmo da exportação de produtos (exportacao.py):
+categoria e fornecedor pelo nome, colunas desconhecidas são ignoradas.
+"""
+import csv
+import io
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import BooleanField, Case, F, Q, Value, When
+
+from . import condicional, contadores
+from .filtros import normalizar
+from .models import Categoria, Fornecedor, MovimentacaoEstoque, Produto
+from .signals import estoque_alterado, estoque_minimo_cruzado
+
+try:
+    import openpyxl
+except ImportError:  # pragma: no cover - dependência opcional
+    openpyxl = None
+
+OBRIGATORIAS = ('codigo_barras', 'nome', 'categoria', 'preco_custo', 'preco_venda')
+
+# Colunas da planilha -> campos atualizados quando o produto já existe
+CAMPOS_ATUALIZADOS = {
+    'nome': ('nome', 'nome_normalizado'),
+    'descricao': ('descricao',),
+    'categoria': ('categoria',),
+    'fornecedor': ('fornecedor',),
+    'preco_custo': ('preco_custo',),
+    'preco_venda': ('preco_venda',),
+    'estoque_minimo': ('estoque_minimo',),
+    'ativo': ('ativo',),
+}
+
+VERDADEIROS = {'true', '1', 'sim', 's', 'yes', 'verdadeiro'}
+FALSOS = {'false', '0', 'nao', 'n', 'no', 'falso'}
+
+MOTIVO_SALDO_INICIAL = 'Saldo inicial (importação)'
+
+
+def _coluna(nome):
+    """'Preço Custo' -> 'preco_custo'"""
+    return normalizar(str(nome or '')).replace(' ', '_')
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def _ler_csv(arquivo):
+    texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline='')
+    try:
+        cabecalho = texto.readline()
+    except UnicodeDecodeError:
+        raise ValueError('O arquivo CSV deve estar em UTF-8.')
+    # Planilhas exportadas pelo Excel em português usam ';'
+    delimitador = ';' if cabecalho.count(';') > cabecalho.count(',') else ','
+    colunas = next(csv.reader([cabecalho], delimiter=delimitador), [])
+    leitor = csv.reader(texto, delimiter=delimitador)
+
+    def linhas():
+        try:
+            for valores in leitor:
+                # +1 pelo cabeçalho lido fora do leitor
+                yield leitor.line_num + 1, [valor.strip() for valor in valores]
+        except UnicodeDecodeError:
+            # Os lotes anteriores já foram gravados
+            raise ValueError(f'O arquivo CSV deve estar em UTF-8 (erro após a linha {leitor.line_num + 1}).')
+    return colunas, linhas()
+
+
+def _ler_xlsx(arquivo):
+    if openpyxl is None:
+        raise ValueError('Importação de XLSX indisponível: instale o pacote openpyxl.')
+    try:
+        planilha = openpyxl.load_workbook(arquivo, read_only=True, data_only=True)
+    except Exception:
+        raise ValueError('Arquivo XLSX inválido.')
+    aba = planilha.active.iter_rows(values_only=True)
+    colunas = [_texto(valor) for valor in next(aba, ())]
+
+    def linhas():
+        try:
+            for numero, valores in enumerate(aba, start=2):
+                yield numero, [_texto(valor) for valor in valores]
+        finally:
+            planilha.close()
+    return colunas, linhas()
+
+
+def ler_arquivo(arquivo, nome_arquivo):
+    """
+    Retorna (colunas, linhas) sem carregar o arquivo inteiro.
+
+    `linhas` é um gerador de (número da linha no arquivo, dicionário coluna -> texto).
+    """
+    extensao = nome_arquivo.rsplit('.', 1)[-1].lower()
+    if extensao == 'csv':
+        colunas, valores = _ler_csv(arquivo)
+    elif extensao == 'xlsx':
+        colunas, valores = _ler_xlsx(arquivo)
+    else:
+        raise ValueError('Formato não suportado: envie um arquivo .csv ou .xlsx.')
+
+    colunas = [_coluna(nome) for nome in colunas]
+    faltando = [nome for nome in OBRIGATORIAS if nome not in colunas]
+    if faltando:
+        raise ValueError(f'Colunas obrigatórias ausentes: {", ".join(faltando)}.')
+
+    def linhas():
+        for numero, linha in valores:
+            if any(linha):
+                yield numero, dict(zip(colunas, linha))
+    return colunas, linhas()
+
+
+def _mapa_por_nome(modelo):
+    """nome normalizado -> id; None quando o nome se repete (ambíguo)"""
+    mapa = {}
+    for pk, nome in modelo.objects.order_by('pk').values_list('pk', 'nome'):
+        chave = normalizar(nome)
+        mapa[chave] = None if chave in mapa else pk
+    return mapa
+
+
+def _decimal(valor):
+    try:
+        numero = Decimal(valor.replace(',', '.'))
+    except InvalidOperation:
+        raise ValueError('Informe um número válido.')
+    if not numero.is_finite():
+        raise ValueError('Informe um número válido.')
+    if numero.as_tuple().exponent < -2:
+        raise ValueError('Certifique-se de que não haja mais de 2 casas decimais.')
+    if abs(numero) >= Decimal('100000000'):
+        raise ValueError('Certifique-se de que não haja mais de 10 dígitos no total.')
+    return numero
+
+
+def _inteiro(valor):
+    try:
+        numero = Decimal(valor.replace(',', '.'))
+    except InvalidOperation:
+        numero = None
+    if numero is None or not numero.is_finite() or numero != numero.to_integral_value() or numero < 0:
+        raise ValueError('Informe um número inteiro maior ou igual a zero.')
+    return int(numero)
+
+
+def _booleano(valor):
+    chave = normalizar(valor)
+    if chave in VERDADEIROS:
+        return True
+    if chave in FALSOS:
+        return False
+    raise ValueError('Informe sim/não ou true/false.')
+
+
+def validar_linha(linha, categorias, fornecedores):
+    """Converte uma linha da planilha nos campos de Produto; retorna (dados, erros)"""
+    dados, erros = {}, {}
+
+    for campo, tamanho in (('codigo_barras', 50), ('nome', 255)):
+        valor = linha.get(campo, '')
+        if not valor:
+            erros[campo] = 'Este campo é obrigatório.'
+        elif len(valor) > tamanho:
+            erros[campo] = f'Certifique-se de que este campo não tenha mais de {tamanho} caracteres.'
+        else:
+            dados[campo] = valor
+
+    if 'descricao' in linha:
+        dados['descricao'] = linha['descricao'] or None
+
+    categoria = linha.get('categoria', '')
+    chave = normalizar(categoria)
+    if not categoria:
+        erros['categoria'] = 'Este campo é obrigatório.'
+    elif chave not in categorias:
+        erros['categoria'] = f'Categoria "{categoria}" não encontrada.'
+    elif categorias[chave] is None:
+        erros['categoria'] = f'Há mais de uma categoria chamada "{categoria}".'
+    else:
+        dados['categoria_id'] = categorias[chave]
+
+    fornecedor = linha.get('fornecedor', '')
+    if fornecedor:
+        chave = normalizar(fornecedor)
+        if chave not in fornecedores:
+            erros['fornecedor'] = f'Fornecedor "{fornecedor}" não encontrado.'
+        elif fornecedores[chave] is None:
+            erros['fornecedor'] = f'Há mais de um fornecedor chamado "{fornecedor}".'
+        else:
+            dados['fornecedor_id'] = fornecedores[chave]
+    elif 'fornecedor' in linha:
+        dados['fornecedor_id'] = None
+
+    conversores = (
+        ('preco_custo', _decimal),
+        ('preco_venda', _decimal),
+        ('quantidade_estoque', _inteiro),
+        ('estoque_minimo', _inteiro),
+        ('ativo', _booleano),
+    )
+    for campo, conversor in conversores:
+        valor = linha.get(campo, '')
+        if not valor:
+            if campo in OBRIGATORIAS:
+                erros[campo] = 'Este campo é obrigatório.'
+            continue
+        try:
+            dados[campo] = conversor(valor)
+        except ValueError as ve:
+            erros[campo] = str(ve)
+
+    if 'preco_custo' in dados and 'preco_venda' in dados and dados['preco_venda'] < dados['preco_custo']:
+        erros['preco_venda'] = 'O preço de venda não pode ser menor que o preço de custo.'
+    return dados, erros
+
+
+def _gravar(linhas, campos_atualizados, usuario):
+    """Upsert de um lote já validado; retorna (criados, atualizados)"""
+    codigos = [dados['codigo_barras'] for dados in linhas]
+    # Código de barras -> marca de estoque baixo dos produtos que já existem
+    existentes = dict(
+        Produto.objects.filter(codigo_barras__in=codigos).values_list('codigo_barras', 'em_estoque_baixo')
+    )
+    produtos = []
+    for dados in linhas:
+        produto = Produto(**dados)
+        # Campos derivados que o save() preencheria
+        produto.nome_normalizado = normalizar(produto.nome)
+        produto.em_estoque_baixo = produto.estoque_baixo
+        produtos.append(produto)
+
+    with transaction.atomic():
+        Produto.objects.bulk_create(
+            produtos,
+            update_conflicts=True,
+            update_fields=campos_atualizados,
+            # O MySQL não aceita alvo no ON DUPLICATE KEY UPDATE: vale qualquer chave única
+            unique_fields=(
+                ['codigo_barras'] if connection.features.supports_update_conflicts_with_target else None
+            ),
+        )
+
+        # Produtos existentes mantêm o saldo do banco: a marca de estoque baixo
+        # é recalculada com ele
+        if existentes and 'estoque_minimo' in campos_atualizados:
+            Produto.objects.filter(codigo_barras__in=existentes).update(
+                em_estoque_baixo=Case(
+                    When(Q(quantidade_estoque__lt=F('estoque_minimo')), then=Value(True)),
+                    default=Value(False),
+                    output_field=BooleanField(),
+                )
+            )
+
+        # Alertas dos produtos novos já abaixo do mínimo e dos que cruzaram
+        # o limite com o novo estoque_minimo
+        if len(existentes) < len(codigos) or 'estoque_minimo' in campos_atualizados:
+            abaixo = []
+            acima = []
+            marcas = Produto.objects.filter(codigo_barras__in=codigos).values_list(
+                'pk', 'codigo_barras', 'quantidade_estoque', 'estoque_minimo', 'em_estoque_baixo'
+            )
+            for pk, codigo, saldo, minimo, marcado in marcas:
+                if marcado and not existentes.get(codigo, False):
+                    abaixo.append((pk, saldo, minimo))
+                elif not marcado and existentes.get(codigo, False):
+                    acima.append(pk)
+            if abaixo or acima:
+                estoque_minimo_cruzado.send(sender=Produto, abaixo=abaixo, acima=acima)
+
+        # Saldo dos produtos novos entra no histórico como ajuste inicial
+        saldos = {
+            produto.codigo_barras: produto.quantidade_estoque
+            for produto in produtos
+            if produto.codigo_barras not in existentes and produto.quantidade_estoque
+        }
+        if saldos:
+            ids = Produto.objects.filter(codigo_barras__in=saldos).values_list('codigo_barras', 'pk')
+            MovimentacaoEstoque.objects.bulk_create(
+                MovimentacaoEstoque(
+                    produto_id=pk,
+                    tipo=MovimentacaoEstoque.TipoMovimentacao.AJUSTE,
+                    quantidade=saldos[codigo],
+                    saldo_anterior=0,
+                    usuario=usuario,
+                    motivo=MOTIVO_SALDO_INICIAL,
+                )
+                for codigo, pk in ids
+            )
+    return len(produtos) - len(existentes), len(existentes)
+
+
+def importar(arquivo, nome_arquivo, usuario=None, lote=None):
+    """
+    Importa o arquivo e retorna o resumo com os erros por linha.
+
+    Linhas inválidas são ignoradas e relatadas; as válidas são gravadas
+    mesmo que outras falhem. Um código de barras repetido no arquivo vale
+    só na primeira ocorrência válida.
+    """
+    lote = lote or getattr(settings, 'ESTOQUE_IMPORTACAO_LOTE', 1000)
+    maximo_erros = getattr(settings, 'ESTOQUE_IMPORTACAO_ERROS_MAXIMO', 1000)
+    colunas, linhas = ler_arquivo(arquivo, nome_arquivo)
+
+    campos_atualizados = ['atualizado_em']
+    for coluna, campos in CAMPOS_ATUALIZADOS.items():
+        if coluna in colunas:
+            campos_atualizados.extend(campos)
+
+    categorias = _mapa_por_nome(Categoria)
+    fornecedores = _mapa_por_nome(Fornecedor)
+    resultado = {'total': 0, 'criados': 0, 'atualizados': 0, 'rejeitados': 0, 'erros': []}
+    vistos = {}
+    pendentes = []
+
+    def gravar_pendentes():
+        criados, atualizados = _gravar(pendentes, campos_atualizados, usuario)
+        resultado['criados'] += criados
+        resultado['atualizados'] += atualizados
+        pendentes.clear()
+
+    for numero, linha in linhas:
+        resultado['total'] += 1
+        dados, erros = validar_linha(linha, categorias, fornecedores)
+        codigo = dados.get('codigo_barras')
+        if codigo in vistos:
+            erros['codigo_barras'] = f'Código de barras repetido (já informado na linha {vistos[codigo]}).'
+
+        if erros:
+            resultado['rejeitados'] += 1
+            if len(resultado['erros']) < maximo_erros:
+                resultado['erros'].append({'linha': numero, 'codigo_barras': codigo, 'erros': erros})
+            continue
+
+        vistos[codigo] = numero
+        pendentes.append(dados)
+        if len(pendentes) >= lote:
+            gravar_pendentes()
+    if pendentes:
+        gravar_pendentes()
+
+    if resultado['criados'] or resultado['atualizados']:
+        contadores.recalcular()
+        transaction.on_commit(lambda: condicional.invalidar('produto'))
+        estoque_alterado.send(sender=Produto, produto_ids=None, codigos_barras=None)
+    return resultado
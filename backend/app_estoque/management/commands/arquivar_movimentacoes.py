@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from app_estoque.arquivo import arquivar, horizonte
+from app_estoque.estatisticas import intervalo_do_dia
+
+
+class Command(BaseCommand):
+    help = (
+        'Move as movimentações antigas para a tabela de arquivo '
+        '(padrão: anteriores aos últimos ESTOQUE_ARQUIVO_MESES meses; agende mensalmente)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, help='Meses fechados que ficam na tabela quente')
+        parser.add_argument('--antes', help='Arquiva o que for anterior a este dia, AAAA-MM-DD')
+        parser.add_argument('--lote', type=int, help='Movimentações por transação (padrão: ESTOQUE_ARQUIVO_LOTE)')
+
+    def handle(self, *args, **options):
+        if options['antes']:
+            data = parse_date(options['antes'])
+            if data is None:
+                raise CommandError('--antes deve estar no formato AAAA-MM-DD.')
+            antes, _ = intervalo_do_dia(data)
+        else:
+            antes = horizonte(options['meses'])
+        total = arquivar(antes, lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} movimentação(ões) anterior(es) a {antes:%Y-%m-%d} arquivada(s).'
+        ))
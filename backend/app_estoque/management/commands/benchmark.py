@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from app_estoque.benchmarks import CENARIOS
+
+
+class Command(BaseCommand):
+    help = 'Executa um cenário de benchmark (os dados criados são descartados ao final)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('cenario', choices=sorted(CENARIOS))
+        parser.add_argument(
+            '--tamanhos', type=int, nargs='+', default=[1000, 10000, 50000],
+            help='Quantidades de registros a testar',
+        )
+        parser.add_argument('--repeticoes', type=int, default=5)
+        # Usados pelo cenário "carga", que dispara requisições contra um servidor já rodando
+        parser.add_argument('--url', default='http://127.0.0.1:8000/api/v1/produtos/')
+        parser.add_argument('--token', default='', help='Access token JWT enviado como Bearer')
+        parser.add_argument('--concorrencia', type=int, nargs='+', default=[1, 8, 32])
+        parser.add_argument('--requisicoes', type=int, default=500)
+
+    def handle(self, *args, **options):
+        funcao = CENARIOS[options['cenario']]
+        self.stdout.write(self.style.MIGRATE_HEADING(funcao.__doc__ or options['cenario']))
+        funcao(
+            self.stdout.write, options['tamanhos'], options['repeticoes'],
+            url=options['url'], token=options['token'],
+            concorrencia=options['concorrencia'], requisicoes=options['requisicoes'],
+        )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from app_estoque.historico import consolidar
+
+
+class Command(BaseCommand):
+    help = (
+        'Consolida as movimentações na tabela de estoque diário '
+        '(incremental: continua do último dia consolidado; agende a cada hora ou diariamente)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Primeiro dia a (re)consolidar, AAAA-MM-DD')
+        parser.add_argument('--ate', help='Último dia a consolidar, AAAA-MM-DD (padrão: hoje)')
+
+    def handle(self, *args, **options):
+        datas = {}
+        for nome in ('desde', 'ate'):
+            valor = options[nome]
+            if valor:
+                datas[nome] = parse_date(valor)
+                if datas[nome] is None:
+                    raise CommandError(f'--{nome} deve estar no formato AAAA-MM-DD.')
+        dias, linhas = consolidar(**datas)
+        self.stdout.write(self.style.SUCCESS(f'{dias} dia(s) consolidado(s), {linhas} linha(s) gravada(s).'))
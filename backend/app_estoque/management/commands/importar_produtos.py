@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app_estoque.importacao import importar
+
+
+class Command(BaseCommand):
+    help = 'Cria ou atualiza produtos a partir de um arquivo CSV ou XLSX (chave: codigo_barras)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do .csv ou .xlsx')
+        parser.add_argument('--lote', type=int, help='Linhas gravadas por upsert (padrão: ESTOQUE_IMPORTACAO_LOTE)')
+
+    def handle(self, *args, **options):
+        caminho = options['arquivo']
+        try:
+            with open(caminho, 'rb') as arquivo:
+                resultado = importar(arquivo, caminho, lote=options['lote'])
+        except (OSError, ValueError) as erro:
+            raise CommandError(str(erro))
+
+        for erro in resultado['erros']:
+            detalhes = '; '.join(f'{campo}: {mensagem}' for campo, mensagem in erro['erros'].items())
+            self.stderr.write(f"Linha {erro['linha']}: {detalhes}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['total']} linha(s) lida(s): {resultado['criados']} produto(s) criado(s), "
+            f"{resultado['atualizados']} atualizado(s), {resultado['rejeitados']} rejeitada(s)."
+        ))
@@ -0,0 +1,76 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from app_estoque import tarefas
+from app_estoque.cache import compartilhado
+
+# Manutenção da fila (tarefas órfãs e antigas) no máximo uma vez por intervalo
+INTERVALO_MANUTENCAO = 600
+
+
+class Command(BaseCommand):
+    help = (
+        'Worker da fila de tarefas: executa as tarefas pendentes enfileiradas pela API '
+        '(rode um ou mais processos; SIGTERM termina a tarefa atual e sai)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--uma-vez', action='store_true',
+            help='Processa as pendentes e sai (para agendar via cron em vez de manter o processo)',
+        )
+        parser.add_argument(
+            '--intervalo', type=float,
+            help='Segundos de espera com a fila vazia (padrão: ESTOQUE_TAREFAS_INTERVALO)',
+        )
+
+    def handle(self, *args, **options):
+        if not compartilhado():
+            # As invalidações das tarefas (dashboard, ETag, códigos de barras)
+            # ficariam no cache deste processo, sem chegar à API
+            self.stderr.write(self.style.WARNING(
+                'Cache do Django local (LocMemCache): configure CACHE_URL para a API ver as alterações das tarefas.'
+            ))
+        if options['uma_vez']:
+            self._manutencao()
+            total = tarefas.processar_pendentes()
+            self.stdout.write(self.style.SUCCESS(f'{total} tarefa(s) executada(s).'))
+            return
+
+        intervalo = options['intervalo'] or getattr(settings, 'ESTOQUE_TAREFAS_INTERVALO', 2)
+        self._parar = False
+        signal.signal(signal.SIGTERM, self._sinal_parada)
+        signal.signal(signal.SIGINT, self._sinal_parada)
+        self.stdout.write(f'Aguardando tarefas (tipos: {", ".join(sorted(tarefas.REGISTRO))})')
+
+        ultima_manutencao = 0
+        while not self._parar:
+            # Processo longo: descarta conexões vencidas (CONN_MAX_AGE) ou quebradas
+            close_old_connections()
+            if time.monotonic() - ultima_manutencao > INTERVALO_MANUTENCAO:
+                self._manutencao()
+                ultima_manutencao = time.monotonic()
+
+            tarefa = tarefas.reservar()
+            if tarefa is None:
+                time.sleep(intervalo)
+                continue
+            inicio = time.perf_counter()
+            tarefas.executar(tarefa)
+            self.stdout.write(
+                f'Tarefa {tarefa.pk} ({tarefa.tipo}): {tarefa.get_status_display()} '
+                f'em {time.perf_counter() - inicio:.1f} s'
+            )
+
+    def _sinal_parada(self, signum, frame):
+        self._parar = True
+
+    def _manutencao(self):
+        interrompidas = tarefas.marcar_interrompidas()
+        removidas = tarefas.limpar_antigas()
+        if interrompidas or removidas:
+            self.stdout.write(f'{interrompidas} tarefa(s) interrompida(s), {removidas} antiga(s) removida(s).')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from app_estoque import contadores
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o contador de produtos de todas as categorias e fornecedores'
+
+    def handle(self, *args, **options):
+        contadores.recalcular()
+        self.stdout.write(self.style.SUCCESS('Contadores de produtos recalculados.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from app_estoque.estoque import reconstruir_estoque_baixo
+
+
+class Command(BaseCommand):
+    help = 'Recalcula a marca de estoque baixo de todos os produtos'
+
+    def handle(self, *args, **options):
+        corrigidos = reconstruir_estoque_baixo()
+        self.stdout.write(self.style.SUCCESS(f'{corrigidos} produto(s) corrigido(s).'))
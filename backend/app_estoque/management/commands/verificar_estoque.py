@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from app_estoque.consistencia import reparar, verificar
+
+
+class Command(BaseCommand):
+    help = 'Compara o saldo de cada produto com o histórico de movimentações e, opcionalmente, corrige'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reparar', action='store_true', help='Corrige as divergências encontradas')
+        parser.add_argument('--lote', type=int, help='Produtos por transação no reparo (padrão: ESTOQUE_CONSISTENCIA_LOTE)')
+
+    def handle(self, *args, **options):
+        discrepancias = verificar()
+        for d in discrepancias:
+            origem = f"{d['movimentacoes']} movimentação(ões)" if d['movimentacoes'] else 'sem histórico'
+            self.stdout.write(
+                f"Produto {d['produto']} ({d['nome']}): saldo {d['saldo_atual']}, "
+                f"histórico {d['saldo_esperado']} [{origem}]"
+            )
+
+        if not discrepancias:
+            self.stdout.write(self.style.SUCCESS('Todos os saldos conferem com o histórico.'))
+        elif options['reparar']:
+            reparados = reparar(discrepancias, lote=options['lote'])
+            self.stdout.write(self.style.SUCCESS(f'{reparados} produto(s) corrigido(s).'))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f'{len(discrepancias)} produto(s) divergente(s). Rode com --reparar para corrigir.'
+            ))
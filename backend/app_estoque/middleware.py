@@ -0,0 +1,69 @@
+"""
+Compressão das respostas da API.
+
+Estende o GZipMiddleware do Django com um tamanho mínimo configurável
+(respostas pequenas não compensam o custo) e, se o pacote `brotli`
+estiver instalado, usa Brotli para os clientes que aceitam `br`.
+Respostas em streaming (exportações) seguem sempre em gzip.
+
+O gzip do Django se protege do BREACH com um preenchimento de tamanho
+aleatório em cada resposta; o Brotli não tem onde pôr esse preenchimento.
+Por isso ele só é usado quando não há credenciais em jogo (sem
+Authorization nem cookies na requisição e sem cookies na resposta): o
+resto segue pelo gzip, com a proteção.
+"""
+import re
+
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependência opcional
+    brotli = None
+
+_aceita_brotli = re.compile(r'\bbr\b')
+
+
+def _tem_credenciais(request, response):
+    """True se a resposta pode refletir um segredo (token, sessão, CSRF)"""
+    return bool(
+        request.META.get('HTTP_AUTHORIZATION')
+        or request.META.get('HTTP_COOKIE')
+        or response.cookies
+    )
+
+
+class CompressaoMiddleware(GZipMiddleware):
+
+    def process_response(self, request, response):
+        minimo = getattr(settings, 'ESTOQUE_COMPRESSAO_MINIMO', 1024)
+        if not response.streaming and len(response.content) < minimo:
+            return response
+
+        if (
+            brotli is not None
+            and not response.streaming
+            and not response.has_header('Content-Encoding')
+            and _aceita_brotli.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+            and not _tem_credenciais(request, response)
+        ):
+            return self._comprimir_brotli(response)
+        return super().process_response(request, response)
+
+    def _comprimir_brotli(self, response):
+        patch_vary_headers(response, ('Accept-Encoding',))
+        comprimido = brotli.compress(
+            response.content, quality=getattr(settings, 'ESTOQUE_BROTLI_QUALIDADE', 5)
+        )
+        if len(comprimido) >= len(response.content):
+            return response
+
+        response.content = comprimido
+        response.headers['Content-Length'] = str(len(comprimido))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
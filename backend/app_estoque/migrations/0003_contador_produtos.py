@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:49
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def preencher_contadores(apps, schema_editor):
+    Produto = apps.get_model('app_estoque', 'Produto')
+    for nome_modelo, campo in (('Categoria', 'categoria'), ('Fornecedor', 'fornecedor')):
+        modelo = apps.get_model('app_estoque', nome_modelo)
+        contagem = (
+            Produto.objects.filter(**{campo: OuterRef('pk')})
+            .order_by()
+            .values(campo)
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        modelo.objects.update(contador_produtos=Coalesce(Subquery(contagem), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_estoque', '0002_alter_categoria_options_alter_fornecedor_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='movimentacaoestoque',
+            options={'ordering': ['-data_hora'], 'verbose_name': 'Movimentação', 'verbose_name_plural': 'Movimentações'},
+        ),
+        migrations.AddField(
+            model_name='categoria',
+            name='contador_produtos',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='fornecedor',
+            name='contador_produtos',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(preencher_contadores, migrations.RunPython.noop),
+    ]
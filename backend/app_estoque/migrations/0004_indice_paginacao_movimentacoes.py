@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_estoque', '0003_contador_produtos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimentacaoestoque',
+            index=models.Index(fields=['data_hora', 'id'], name='movimentacao_data_hora_id_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_estoque', '0004_indice_paginacao_movimentacoes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimentacaoestoque',
+            index=models.Index(fields=['produto', 'data_hora', 'id'], name='movimentacao_produto_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['ativo', 'nome'], name='produto_ativo_nome_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['ativo', 'quantidade_estoque', 'estoque_minimo'], name='produto_ativo_estoque_idx'),
+        ),
+    ]
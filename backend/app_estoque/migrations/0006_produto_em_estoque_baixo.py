@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:54
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def marcar_estoque_baixo(apps, schema_editor):
+    Produto = apps.get_model('app_estoque', 'Produto')
+    Produto.objects.filter(quantidade_estoque__lt=F('estoque_minimo')).update(em_estoque_baixo=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_estoque', '0005_indices_consultas_frequentes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='produto',
+            name='produto_ativo_estoque_idx',
+        ),
+        migrations.AddField(
+            model_name='produto',
+            name='em_estoque_baixo',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(marcar_estoque_baixo, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['em_estoque_baixo', 'ativo', 'nome'], name='produto_estoque_baixo_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:55
+
+from django.db import migrations, models
+
+from app_estoque.filtros import normalizar
+
+
+def preencher_nome_normalizado(apps, schema_editor):
+    Produto = apps.get_model('app_estoque', 'Produto')
+    lote = []
+    for produto in Produto.objects.only('id', 'nome').iterator(chunk_size=2000):
+        produto.nome_normalizado = normalizar(produto.nome)
+        lote.append(produto)
+        if len(lote) == 2000:
+            Produto.objects.bulk_update(lote, ['nome_normalizado'])
+            lote = []
+    if lote:
+        Produto.objects.bulk_update(lote, ['nome_normalizado'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_estoque', '0006_produto_em_estoque_baixo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produto',
+            name='nome_normalizado',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(preencher_nome_normalizado, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['ativo', 'nome_normalizado'], name='produto_ativo_busca_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_estoque', '0007_produto_nome_normalizado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstoqueDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('saldo_inicial', models.PositiveIntegerField()),
+                ('saldo_final', models.PositiveIntegerField()),
+                ('entradas', models.PositiveIntegerField(default=0)),
+                ('saidas', models.PositiveIntegerField(default=0)),
+                ('ajustes', models.IntegerField(default=0)),
+                ('movimentacoes', models.PositiveIntegerField(default=0)),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historico_diario', to='app_estoque.produto')),
+            ],
+            options={
+                'verbose_name': 'Estoque Diário',
+                'verbose_name_plural': 'Estoques Diários',
+                'ordering': ['-data'],
+                'indexes': [models.Index(fields=['data'], name='estoque_diario_data_idx')],
+                'constraints': [models.UniqueConstraint(fields=('produto', 'data'), name='estoque_diario_produto_data_uniq')],
+            },
+        ),
+    ]
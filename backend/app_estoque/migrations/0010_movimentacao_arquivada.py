@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_estoque', '0009_tarefa'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimentacaoArquivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('tipo', models.CharField(choices=[('E', 'Entrada'), ('S', 'Saída'), ('A', 'Ajuste')], max_length=1)),
+                ('quantidade', models.PositiveIntegerField()),
+                ('data_hora', models.DateTimeField()),
+                ('motivo', models.CharField(blank=True, max_length=255, null=True)),
+                ('numero_documento', models.CharField(blank=True, max_length=50, null=True)),
+                ('observacao', models.TextField(blank=True, null=True)),
+                ('saldo_anterior', models.PositiveIntegerField(default=0)),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimentacoes_arquivadas', to='app_estoque.produto')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Movimentação Arquivada',
+                'verbose_name_plural': 'Movimentações Arquivadas',
+                'ordering': ['-data_hora'],
+                'indexes': [models.Index(fields=['data_hora', 'id'], name='mov_arquivada_data_hora_idx'), models.Index(fields=['produto', 'data_hora', 'id'], name='mov_arquivada_produto_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_estoque', '0010_movimentacao_arquivada'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertaEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('saldo', models.PositiveIntegerField()),
+                ('estoque_minimo', models.PositiveIntegerField()),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('resolvido_em', models.DateTimeField(blank=True, null=True)),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alertas', to='app_estoque.produto')),
+            ],
+            options={
+                'verbose_name': 'Alerta de Estoque',
+                'verbose_name_plural': 'Alertas de Estoque',
+                'ordering': ['-criado_em', '-id'],
+                'indexes': [models.Index(fields=['criado_em', 'id'], name='alerta_criado_em_idx'), models.Index(fields=['produto', 'resolvido_em'], name='alerta_produto_aberto_idx')],
+            },
+        ),
+    ]
@@ -1,10 +1,22 @@
 from django.db import models
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .filtros import normalizar
+
+
+def calcular_margem_lucro(preco_custo, preco_venda):
+    """Margem de lucro em porcentagem, com 2 casas (0 quando não há custo)"""
+    if preco_custo > 0:
+        return round(((preco_venda - preco_custo) / preco_custo) * 100, 2)
+    return 0
 
 class Categoria(models.Model):
     nome = models.CharField(max_length=100, unique=True)
     descricao = models.TextField(blank=True, null=True)
+    # Contador desnormalizado mantido pelos sinais de Produto (ver contadores.py)
+    contador_produtos = models.PositiveIntegerField(default=0, editable=False)
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
 
@@ -25,6 +37,8 @@ class Fornecedor(models.Model):
     cnpj = models.CharField(max_length=18, blank=True, null=True, unique=True)
     contato = models.CharField(max_length=100, blank=True, null=True)
     ativo = models.BooleanField(default=True)
+    # Contador desnormalizado mantido pelos sinais de Produto (ver contadores.py)
+    contador_produtos = models.PositiveIntegerField(default=0, editable=False)
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
 
@@ -38,6 +52,8 @@ class Fornecedor(models.Model):
 
 class Produto(models.Model):
     nome = models.CharField(max_length=255)
+    # Nome em minúsculas e sem acentos, para busca por prefixo indexada
+    nome_normalizado = models.CharField(max_length=255, default='', editable=False)
     descricao = models.TextField(blank=True, null=True)
     
     preco_custo = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
@@ -59,6 +75,9 @@ class Produto(models.Model):
     codigo_barras = models.CharField(max_length=50, blank=True, null=True, unique=True)
     quantidade_estoque = models.PositiveIntegerField(default=0)
     estoque_minimo = models.PositiveIntegerField(default=0)
+    # Marca desnormalizada de quantidade_estoque < estoque_minimo, mantida pelo
+    # save() e pelo serviço de estoque para que a listagem use índice
+    em_estoque_baixo = models.BooleanField(default=False, editable=False)
     ativo = models.BooleanField(default=True)
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
@@ -67,9 +86,51 @@ class Produto(models.Model):
         verbose_name = "Produto"
         verbose_name_plural = "Produtos"
         ordering = ['nome']
+        indexes = [
+            # Listagem padrão: produtos ativos ordenados por nome
+            models.Index(fields=['ativo', 'nome'], name='produto_ativo_nome_idx'),
+            # Busca por prefixo do nome (ver filtros.py)
+            models.Index(fields=['ativo', 'nome_normalizado'], name='produto_ativo_busca_idx'),
+            # Conjunto de estoque baixo, já na ordem da listagem
+            models.Index(fields=['em_estoque_baixo', 'ativo', 'nome'], name='produto_estoque_baixo_idx'),
+        ]
 
     def __str__(self):
         return f"{self.nome} ({self.quantidade_estoque} em estoque)"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Guarda as relações carregadas para detectar troca de categoria/fornecedor...
+        # Campos adiados (.only/.defer) ficam como DEFERRED até o save (ver _ler_originais_adiados)
+        instancia._relacoes_originais = (
+            instancia.__dict__.get('categoria_id', models.DEFERRED),
+            instancia.__dict__.get('fornecedor_id', models.DEFERRED),
+        )
+        # E o código de barras, para invalidar o cache do código antigo
+        instancia._codigo_barras_original = instancia.__dict__.get('codigo_barras', models.DEFERRED)
+        # E a marca de estoque baixo, para abrir ou resolver alertas quando o save() a muda
+        instancia._estoque_baixo_original = instancia.__dict__.get('em_estoque_baixo', models.DEFERRED)
+        return instancia
+
+    def _ler_originais_adiados(self):
+        """
+        Lê do banco o valor original dos campos que vieram adiados e foram
+        carregados ou alterados depois; os que seguem adiados não são gravados.
+        """
+        originais = {
+            'categoria_id': self._relacoes_originais[0],
+            'fornecedor_id': self._relacoes_originais[1],
+            'codigo_barras': self._codigo_barras_original,
+            'em_estoque_baixo': self._estoque_baixo_original,
+        }
+        faltando = [campo for campo, valor in originais.items() if valor is models.DEFERRED and campo in self.__dict__]
+        if not faltando:
+            return
+        originais.update(Produto.objects.filter(pk=self.pk).values(*faltando).first() or {})
+        self._relacoes_originais = (originais['categoria_id'], originais['fornecedor_id'])
+        self._codigo_barras_original = originais['codigo_barras']
+        self._estoque_baixo_original = originais['em_estoque_baixo']
     
     def clean(self):
         """Validação personalizada"""
@@ -78,6 +139,18 @@ class Produto(models.Model):
     
     def save(self, *args, **kwargs):
         self.clean()
+        self.em_estoque_baixo = self.estoque_baixo
+        self.nome_normalizado = normalizar(self.nome)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            derivados = set()
+            if {'quantidade_estoque', 'estoque_minimo'} & set(update_fields):
+                derivados.add('em_estoque_baixo')
+            if 'nome' in update_fields:
+                derivados.add('nome_normalizado')
+            kwargs['update_fields'] = {*update_fields, *derivados}
+        if hasattr(self, '_relacoes_originais'):
+            self._ler_originais_adiados()
         super().save(*args, **kwargs)
     
     @property
@@ -86,9 +159,7 @@ class Produto(models.Model):
     
     @property
     def margem_lucro(self):
-        if self.preco_custo > 0:
-            return round(((self.preco_venda - self.preco_custo) / self.preco_custo) * 100, 2)
-        return 0
+        return calcular_margem_lucro(self.preco_custo, self.preco_venda)
     
     @property
     def estoque_baixo(self):
@@ -106,6 +177,8 @@ class MovimentacaoEstoque(models.Model):
     data_hora = models.DateTimeField(auto_now_add=True)
     usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
     motivo = models.CharField(max_length=255, blank=True, null=True)
+    numero_documento = models.CharField(max_length=50, blank=True, null=True)
+    observacao = models.TextField(blank=True, null=True)
     
     saldo_anterior = models.PositiveIntegerField(default=0)
     
@@ -113,6 +186,12 @@ class MovimentacaoEstoque(models.Model):
         verbose_name = "Movimentação"
         verbose_name_plural = "Movimentações"
         ordering = ['-data_hora']
+        indexes = [
+            # Chave da paginação por cursor do histórico e das faixas de data
+            models.Index(fields=['data_hora', 'id'], name='movimentacao_data_hora_id_idx'),
+            # Histórico de um produto em ordem cronológica
+            models.Index(fields=['produto', 'data_hora', 'id'], name='movimentacao_produto_data_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_tipo_display()} - {self.produto.nome} ({self.quantidade})"
@@ -123,20 +202,141 @@ class MovimentacaoEstoque(models.Model):
             raise ValidationError(f'Estoque insuficiente. Disponível: {self.produto.quantidade_estoque}')
 
     def save(self, *args, **kwargs):
-        self.clean() # Chama validação
-        
-        if not self.pk: # Apenas se for criação nova
-            self.saldo_anterior = self.produto.quantidade_estoque
-            
-            if self.tipo == 'E':
-                self.produto.quantidade_estoque += self.quantidade
-            elif self.tipo == 'S':
-                # A validação já ocorreu no clean(), mas por segurança:
-                if self.produto.quantidade_estoque >= self.quantidade:
-                    self.produto.quantidade_estoque -= self.quantidade
-            elif self.tipo == 'A':
-                self.produto.quantidade_estoque = self.quantidade
-            
-            self.produto.save()
-        
-        super().save(*args, **kwargs)
\ No newline at end of file
+        if self.pk: # Edição não mexe no saldo do produto
+            self.clean()
+            return super().save(*args, **kwargs)
+
+        # Criação: o serviço de estoque valida e atualiza o saldo de forma atômica
+        from .estoque import registrar_movimentacao
+        registrar_movimentacao(self, lambda: super(MovimentacaoEstoque, self).save(*args, **kwargs))
+
+
+class MovimentacaoArquivada(models.Model):
+    """
+    Movimentação antiga retirada da tabela quente pelo comando
+    arquivar_movimentacoes (ver arquivo.py). Mantém o id original e não é
+    editada; só relatórios históricos, exportações e a verificação de saldos
+    a leem.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='movimentacoes_arquivadas')
+    tipo = models.CharField(max_length=1, choices=MovimentacaoEstoque.TipoMovimentacao.choices)
+    quantidade = models.PositiveIntegerField()
+    data_hora = models.DateTimeField()
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    motivo = models.CharField(max_length=255, blank=True, null=True)
+    numero_documento = models.CharField(max_length=50, blank=True, null=True)
+    observacao = models.TextField(blank=True, null=True)
+    saldo_anterior = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Movimentação Arquivada"
+        verbose_name_plural = "Movimentações Arquivadas"
+        ordering = ['-data_hora']
+        indexes = [
+            models.Index(fields=['data_hora', 'id'], name='mov_arquivada_data_hora_idx'),
+            models.Index(fields=['produto', 'data_hora', 'id'], name='mov_arquivada_produto_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} - {self.produto.nome} ({self.quantidade}) [arquivada]"
+
+
+class EstoqueDiario(models.Model):
+    """
+    Resumo do estoque de um produto em um dia com movimentações.
+
+    Preenchido pelo comando consolidar_estoque_diario (ver historico.py).
+    Dias sem movimentação não têm linha: o saldo continua o saldo_final do
+    último dia consolidado.
+    """
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='historico_diario')
+    data = models.DateField()
+    saldo_inicial = models.PositiveIntegerField()
+    saldo_final = models.PositiveIntegerField()
+    entradas = models.PositiveIntegerField(default=0)
+    saidas = models.PositiveIntegerField(default=0)
+    # Variação líquida causada pelos ajustes do dia (pode ser negativa)
+    ajustes = models.IntegerField(default=0)
+    movimentacoes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Estoque Diário"
+        verbose_name_plural = "Estoques Diários"
+        ordering = ['-data']
+        constraints = [
+            # Também é o índice do histórico de um produto por data
+            models.UniqueConstraint(fields=['produto', 'data'], name='estoque_diario_produto_data_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['data'], name='estoque_diario_data_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.produto.nome} em {self.data:%d/%m/%Y}: {self.saldo_final}"
+
+
+class Tarefa(models.Model):
+    """
+    Trabalho demorado (exportação, importação, consolidação...) executado
+    fora da requisição pelo comando processar_tarefas (ver tarefas.py).
+    """
+    class Status(models.TextChoices):
+        PENDENTE = 'pendente', 'Pendente'
+        EXECUTANDO = 'executando', 'Executando'
+        CONCLUIDA = 'concluida', 'Concluída'
+        FALHOU = 'falhou', 'Falhou'
+
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDENTE)
+    resultado = models.JSONField(blank=True, null=True, encoder=DjangoJSONEncoder)
+    # Resultados grandes (exportações) ficam em arquivo, baixado pela API
+    arquivo = models.FileField(upload_to='tarefas/', blank=True, null=True)
+    erro = models.TextField(blank=True, null=True)
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    criada_em = models.DateTimeField(auto_now_add=True)
+    iniciada_em = models.DateTimeField(blank=True, null=True)
+    concluida_em = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = "Tarefa"
+        verbose_name_plural = "Tarefas"
+        ordering = ['-criada_em', '-id']
+        indexes = [
+            # Fila do worker: próximas pendentes por ordem de chegada
+            models.Index(fields=['status', 'id'], name='tarefa_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.pk} ({self.get_status_display()})"
+
+
+class AlertaEstoque(models.Model):
+    """
+    Produto que uma movimentação levou para baixo do estoque mínimo (ver alertas.py).
+
+    Fica aberto (resolvido_em nulo) até outra movimentação devolver o saldo
+    ao mínimo.
+    """
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='alertas')
+    # Saldo e mínimo no momento em que o produto cruzou o limite
+    saldo = models.PositiveIntegerField()
+    estoque_minimo = models.PositiveIntegerField()
+    criado_em = models.DateTimeField(auto_now_add=True)
+    resolvido_em = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = "Alerta de Estoque"
+        verbose_name_plural = "Alertas de Estoque"
+        ordering = ['-criado_em', '-id']
+        indexes = [
+            # Chave da paginação por cursor do feed de alertas
+            models.Index(fields=['criado_em', 'id'], name='alerta_criado_em_idx'),
+            # Alerta aberto de um produto, resolvido quando o saldo volta
+            models.Index(fields=['produto', 'resolvido_em'], name='alerta_produto_aberto_idx'),
+        ]
+
+    def __str__(self):
+        situacao = 'resolvido' if self.resolvido_em else 'aberto'
+        return f"{self.produto.nome}: {self.saldo}/{self.estoque_minimo} ({situacao})"
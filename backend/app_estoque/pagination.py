@@ -0,0 +1,140 @@
+"""
+Paginação por chave (keyset) para o histórico de movimentações.
+
+Em vez de LIMIT/OFFSET, cada página continua a partir da última posição
+(data_hora, id) da página anterior, usando o índice composto da tabela. A
+página 1000 custa o mesmo que a primeira. O cursor é opaco para o cliente
+(base64 da posição) e o COUNT(*) total pode ser desligado com
+`?contagem=false`.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    count_query_param = 'contagem'
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    # Ordenação decrescente: campo de tempo + id como desempate
+    campo_ordem = 'data_hora'
+    mensagem_cursor_invalido = 'Cursor inválido.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        tamanho = self.get_page_size(request)
+
+        self.count = None
+        if request.query_params.get(self.count_query_param, 'true').lower() != 'false':
+            self.count = queryset.count()
+
+        posicao, anterior = self.decode_cursor(request)
+        campo = self.campo_ordem
+        if posicao is None:
+            pagina = queryset.order_by(f'-{campo}', '-id')
+        elif anterior:
+            # Voltando: lê em ordem crescente a partir da posição e inverte
+            pagina = queryset.filter(
+                Q(**{f'{campo}__gt': posicao[0]}) | Q(**{campo: posicao[0], 'id__gt': posicao[1]})
+            ).order_by(campo, 'id')
+        else:
+            pagina = queryset.filter(
+                Q(**{f'{campo}__lt': posicao[0]}) | Q(**{campo: posicao[0], 'id__lt': posicao[1]})
+            ).order_by(f'-{campo}', '-id')
+
+        resultados = list(pagina[:tamanho + 1])
+        mais = len(resultados) > tamanho
+        resultados = resultados[:tamanho]
+        if anterior:
+            resultados.reverse()
+
+        if anterior:
+            self.has_next, self.has_previous = True, mais
+        else:
+            self.has_next, self.has_previous = mais, posicao is not None
+
+        self.page = resultados
+        return resultados
+
+    def get_page_size(self, request):
+        try:
+            tamanho = int(request.query_params[self.page_size_query_param])
+            if tamanho > 0:
+                return min(tamanho, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    # ------------------------------------------------------------------
+    # Cursor
+    # ------------------------------------------------------------------
+
+    def encode_cursor(self, registro, anterior):
+        posicao = [getattr(registro, self.campo_ordem).isoformat(), registro.pk, int(anterior)]
+        cursor = base64.urlsafe_b64encode(json.dumps(posicao).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            valor, pk, anterior = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return (datetime.fromisoformat(valor), int(pk)), bool(anterior)
+        except (TypeError, ValueError, binascii.Error):
+            raise NotFound(self.mensagem_cursor_invalido)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], anterior=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], anterior=True)
+
+    # ------------------------------------------------------------------
+    # Resposta
+    # ------------------------------------------------------------------
+
+    def get_paginated_response(self, data):
+        resposta = {}
+        if self.count is not None:
+            resposta['count'] = self.count
+        resposta.update({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+        return Response(resposta)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer', 'example': 123},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class AlertaPagination(KeysetPagination):
+    """Feed de alertas de estoque: mais recentes primeiro, por (criado_em, id)"""
+    campo_ordem = 'criado_em'
@@ -0,0 +1,56 @@
+"""
+Renderer JSON baseado em orjson (opcional).
+
+Bem mais rápido que o JSONRenderer do DRF nas listagens grandes. Para os
+dados que a API gera (strings, inteiros, Decimals, datas) a saída é a mesma,
+byte a byte: Decimals, datetimes e demais tipos especiais passam pelo mesmo
+encoder do DRF (Decimal vira número, datetime em UTC termina em 'Z'). Não é
+um substituto perfeito:
+
+- floats em notação científica saem sem '+' e sem zero à esquerda no
+  expoente (1e16, 1e-7 em vez de 1e+16, 1e-07);
+- NaN e Infinity viram null em vez do erro do modo estrito (STRICT_JSON);
+- inteiros fora de 64 bits voltam para o JSONRenderer padrão.
+
+Sem o pacote orjson instalado, ou quando a resposta pede indentação
+(API navegável, `; indent=4`), cai no JSONRenderer padrão.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependência opcional
+    orjson = None
+
+_encoder = JSONEncoder()
+
+
+class ORJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        if (
+            orjson is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data,
+                default=_encoder.default,
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+            )
+        except orjson.JSONEncodeError:
+            # Inteiros fora de 64 bits, por exemplo
+            return super().render(data, accepted_media_type, renderer_context)
+        # Mesmo escape do DRF para manter o JSON um subconjunto válido de JavaScript
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
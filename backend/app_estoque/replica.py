@@ -0,0 +1,146 @@
+"""
+Leituras na réplica do MySQL (opcional).
+
+Quando DB_REPLICA_HOST está configurado, settings.py cria o alias 'replica'
+e as ações de leitura marcadas aqui (listagens, relatórios e exportações)
+passam a consultá-lo, aliviando o primário que atende as movimentações.
+Sem réplica configurada tudo continua no 'default'.
+
+Leia o que você escreveu: depois de uma escrita bem-sucedida, as leituras
+do mesmo usuário ficam no primário por ESTOQUE_REPLICA_ATRASO_MAXIMO
+segundos, tempo suficiente para a réplica alcançar o primário. A marca fica
+no cache e o próximo GET pode cair em outro worker, então isso só funciona
+com um cache compartilhado; sem ele (LocMemCache), as leituras de usuários
+autenticados ficam sempre no primário.
+"""
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+from .cache import PREFIXO, compartilhado
+
+ALIAS = 'replica'
+
+_leitura_em_replica = ContextVar('leitura_em_replica', default=False)
+
+
+def configurada():
+    return getattr(settings, 'ESTOQUE_LEITURA_EM_REPLICA', False)
+
+
+def em_uso():
+    """True dentro de uma leitura roteada para a réplica"""
+    return _leitura_em_replica.get()
+
+
+def _chave_primario(user_id):
+    return f'{PREFIXO}:primario:{user_id}'
+
+
+def fixar_primario(usuario):
+    """Mantém as leituras do usuário no primário logo após uma escrita"""
+    if configurada() and usuario is not None and usuario.is_authenticated:
+        cache.set(
+            _chave_primario(usuario.pk), True,
+            getattr(settings, 'ESTOQUE_REPLICA_ATRASO_MAXIMO', 5),
+        )
+
+
+def pode_usar_replica(usuario):
+    if not configurada():
+        return False
+    if usuario is not None and usuario.is_authenticated:
+        # Sem cache compartilhado, a marca de fixar_primario não seria vista pelos outros workers
+        return compartilhado() and not cache.get(_chave_primario(usuario.pk))
+    return True
+
+
+async def apode_usar_replica(usuario):
+    """Versão assíncrona de pode_usar_replica(), para as views de views_async.py"""
+    if not configurada():
+        return False
+    if usuario is not None and usuario.is_authenticated:
+        return compartilhado() and not await cache.aget(_chave_primario(usuario.pk))
+    return True
+
+
+def alias_leitura(usuario):
+    """Alias a usar em consultas explícitas (.using), ex.: exportações em streaming"""
+    return ALIAS if pode_usar_replica(usuario) else DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def leitura_em_replica(usuario):
+    token = _leitura_em_replica.set(pode_usar_replica(usuario))
+    try:
+        yield
+    finally:
+        _leitura_em_replica.reset(token)
+
+
+@asynccontextmanager
+async def aleitura_em_replica(usuario):
+    # As consultas do ORM assíncrono rodam em sync_to_async, que copia o contexto
+    token = _leitura_em_replica.set(await apode_usar_replica(usuario))
+    try:
+        yield
+    finally:
+        _leitura_em_replica.reset(token)
+
+
+def ler_da_replica(view):
+    """Decorator para views de função do DRF (usar abaixo do @api_view)"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with leitura_em_replica(request.user):
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class LeituraEmReplicaMixin:
+    """
+    ViewSet cujas ações de leitura consultam a réplica.
+
+    Escritas bem-sucedidas fixam o usuário no primário (ver fixar_primario).
+    """
+    acoes_de_leitura = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action in self.acoes_de_leitura:
+            self._token_replica = _leitura_em_replica.set(pode_usar_replica(request.user))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_token_replica', None)
+        if token is not None:
+            _leitura_em_replica.reset(token)
+            self._token_replica = None
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            fixar_primario(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class RoteadorReplica:
+    """Roteador de banco: leituras marcadas vão para a réplica, o resto para o 'default'"""
+
+    def db_for_read(self, model, **hints):
+        if _leitura_em_replica.get():
+            return ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplica e primário têm os mesmos dados
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == ALIAS:
+            return False
+        return None
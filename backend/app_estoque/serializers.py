@@ -1,5 +1,11 @@
+from functools import cache
+
 from rest_framework import serializers
-from .models import Categoria, Fornecedor, Produto, MovimentacaoEstoque
+from rest_framework.reverse import reverse
+from django.conf import settings
+from django.db.models import BooleanField, DecimalField, ExpressionWrapper, F, Q
+from .models import AlertaEstoque, Categoria, Fornecedor, Produto, MovimentacaoEstoque, Tarefa, calcular_margem_lucro
+from .contadores import total_produtos
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
 
@@ -183,7 +189,8 @@ class CategoriaSerializer(serializers.ModelSerializer):
         read_only_fields = ['criado_em', 'atualizado_em']
     
     def get_total_produtos(self, obj):
-        return obj.produtos.count()
+        # As views já anotam o total; o COUNT só roda para instâncias avulsas
+        return total_produtos(obj)
 
 class FornecedorSerializer(serializers.ModelSerializer):
     total_produtos = serializers.SerializerMethodField()
@@ -206,7 +213,8 @@ class FornecedorSerializer(serializers.ModelSerializer):
         read_only_fields = ['criado_em', 'atualizado_em']
     
     def get_total_produtos(self, obj):
-        return obj.produtos.count()
+        # As views já anotam o total; o COUNT só roda para instâncias avulsas
+        return total_produtos(obj)
 
 class ProdutoSerializer(serializers.ModelSerializer):
     # Campos relacionados (para exibição)
@@ -252,9 +260,7 @@ class ProdutoSerializer(serializers.ModelSerializer):
     
     def get_margem_lucro(self, obj):
         """Calcula a margem de lucro em porcentagem"""
-        if obj.preco_custo > 0:
-            return round(((obj.preco_venda - obj.preco_custo) / obj.preco_custo) * 100, 2)
-        return 0
+        return obj.margem_lucro
     
     def validate(self, data):
         """Validações customizadas"""
@@ -276,6 +282,82 @@ class ProdutoSerializer(serializers.ModelSerializer):
         
         return data
 
+# Leitura enxuta da listagem de produtos: mesmo JSON do ProdutoSerializer,
+# montado a partir de .values() sem instanciar modelos nem passar pelos
+# campos do DRF linha a linha. valor_total_estoque e estoque_baixo vêm
+# calculados do banco; a margem fica em Python porque o arredondamento do
+# Decimal (meio para o par) não é o mesmo do ROUND() do MySQL.
+
+_CAMPOS_LEITURA_PRODUTO = (
+    'id', 'nome', 'descricao', 'preco_custo', 'preco_venda',
+    'categoria_id', 'categoria__nome', 'fornecedor_id', 'fornecedor__nome',
+    'codigo_barras', 'quantidade_estoque', 'estoque_minimo', 'ativo',
+    'criado_em', 'atualizado_em', 'valor_total_estoque', 'estoque_baixo',
+)
+
+
+def produtos_para_leitura(queryset):
+    """Converte um queryset de Produto nas linhas usadas por serializar_produtos"""
+    return queryset.annotate(
+        valor_total_estoque=ExpressionWrapper(
+            F('quantidade_estoque') * F('preco_custo'),
+            output_field=DecimalField(max_digits=20, decimal_places=2),
+        ),
+        estoque_baixo=ExpressionWrapper(
+            Q(quantidade_estoque__lt=F('estoque_minimo')), output_field=BooleanField()
+        ),
+    ).values(*_CAMPOS_LEITURA_PRODUTO)
+
+
+@cache
+def _formatadores_produto():
+    # Os mesmos campos do ProdutoSerializer formatam decimais e datas
+    campos = ProdutoSerializer().fields
+    return (
+        campos['preco_custo'].to_representation,
+        campos['preco_venda'].to_representation,
+        campos['criado_em'].to_representation,
+    )
+
+
+def serializar_produtos(linhas):
+    """Lista de dicts idêntica a ProdutoSerializer(..., many=True).data"""
+    preco_custo, preco_venda, data_hora = _formatadores_produto()
+    return [
+        {
+            'id': linha['id'],
+            'nome': linha['nome'],
+            'descricao': linha['descricao'],
+            'preco_custo': preco_custo(linha['preco_custo']),
+            'preco_venda': preco_venda(linha['preco_venda']),
+            'categoria': linha['categoria_id'],
+            'categoria_nome': linha['categoria__nome'],
+            'fornecedor': linha['fornecedor_id'],
+            'fornecedor_nome': linha['fornecedor__nome'],
+            'codigo_barras': linha['codigo_barras'],
+            'quantidade_estoque': linha['quantidade_estoque'],
+            'estoque_minimo': linha['estoque_minimo'],
+            'ativo': linha['ativo'],
+            'criado_em': data_hora(linha['criado_em']),
+            'atualizado_em': data_hora(linha['atualizado_em']),
+            'valor_total_estoque': linha['valor_total_estoque'],
+            'estoque_baixo': linha['estoque_baixo'],
+            'margem_lucro': calcular_margem_lucro(linha['preco_custo'], linha['preco_venda']),
+        }
+        for linha in linhas
+    ]
+
+
+class ProdutoListaEnxuta:
+    """Faz o papel de ProdutoSerializer(linhas, many=True) na listagem"""
+
+    def __init__(self, linhas):
+        self.linhas = linhas
+
+    @property
+    def data(self):
+        return serializar_produtos(self.linhas)
+
 class MovimentacaoEstoqueSerializer(serializers.ModelSerializer):
     # Campos relacionados (para exibição)
     usuario_nome = serializers.CharField(source='usuario.username', read_only=True)
@@ -346,10 +428,90 @@ class MovimentacaoActionSerializer(serializers.Serializer):
         allow_blank=True
     )
 
+class MovimentacaoLoteItemSerializer(serializers.Serializer):
+    produto = serializers.IntegerField(min_value=1)
+    tipo = serializers.ChoiceField(choices=MovimentacaoEstoque.TipoMovimentacao.choices)
+    quantidade = serializers.IntegerField(min_value=0)
+    motivo = serializers.CharField(required=False, allow_blank=True, max_length=255)
+    numero_documento = serializers.CharField(required=False, allow_blank=True, max_length=50)
+    observacao = serializers.CharField(required=False, allow_blank=True)
+
+    def validate(self, data):
+        # Só o ajuste pode zerar o saldo; entradas e saídas precisam de quantidade
+        if data['tipo'] != MovimentacaoEstoque.TipoMovimentacao.AJUSTE and data['quantidade'] < 1:
+            raise serializers.ValidationError({'quantidade': 'A quantidade deve ser maior que zero.'})
+        return data
+
+class MovimentacaoLoteSerializer(serializers.Serializer):
+    itens = MovimentacaoLoteItemSerializer(many=True, allow_empty=False)
+
+    def validate_itens(self, itens):
+        limite = getattr(settings, 'ESTOQUE_LOTE_MAXIMO', 1000)
+        if len(itens) > limite:
+            raise serializers.ValidationError(f'O lote aceita no máximo {limite} movimentações.')
+        return itens
+
+# ====================================================================
+# SERIALIZERS DE TAREFAS EM SEGUNDO PLANO
+# ====================================================================
+
+class TarefaSerializer(serializers.ModelSerializer):
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    usuario_nome = serializers.CharField(source='usuario.username', read_only=True, default=None)
+    arquivo_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Tarefa
+        fields = [
+            'id',
+            'tipo',
+            'parametros',
+            'status',
+            'status_display',
+            'resultado',
+            'erro',
+            'arquivo_url',
+            'usuario',
+            'usuario_nome',
+            'criada_em',
+            'iniciada_em',
+            'concluida_em',
+        ]
+        read_only_fields = fields
+
+    def get_arquivo_url(self, obj):
+        """Download do resultado em arquivo (exportações), quando houver"""
+        if not obj.arquivo:
+            return None
+        return reverse('tarefa-arquivo', args=[obj.pk], request=self.context.get('request'))
+
 # ====================================================================
 # SERIALIZERS PARA RELATÓRIOS
 # ====================================================================
 
+class AlertaEstoqueSerializer(serializers.ModelSerializer):
+    produto_nome = serializers.CharField(source='produto.nome', read_only=True)
+    codigo_barras = serializers.CharField(source='produto.codigo_barras', read_only=True)
+    fornecedor = serializers.IntegerField(source='produto.fornecedor_id', read_only=True, default=None)
+    fornecedor_nome = serializers.CharField(source='produto.fornecedor.nome', read_only=True, default=None)
+
+    class Meta:
+        model = AlertaEstoque
+        fields = [
+            'id',
+            'produto',
+            'produto_nome',
+            'codigo_barras',
+            'fornecedor',
+            'fornecedor_nome',
+            'saldo',
+            'estoque_minimo',
+            'criado_em',
+            'resolvido_em',
+        ]
+        read_only_fields = fields
+
+
 class EstatisticasSerializer(serializers.Serializer):
     total_produtos = serializers.IntegerField()
     total_categorias = serializers.IntegerField()
@@ -0,0 +1,131 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import DEFERRED
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver, Signal
+
+from . import alertas, condicional, contadores, codigo_barras
+from .autenticacao import invalidar_usuario
+from .models import Categoria, Fornecedor, Produto, MovimentacaoEstoque
+from .estatisticas import invalidar_estatisticas
+
+# Enviado pelo serviço de estoque (estoque.py) depois de alterar saldos.
+# Argumentos: produto_ids e codigos_barras dos produtos afetados, ou None
+# nos dois quando foram vários produtos de uma vez (ex.: reconstrução).
+# Os receptores só invalidam os caches depois do commit (ver _apos_commit).
+estoque_alterado = Signal()
+
+# Enviado, ainda dentro da transação, por todo código que muda a marca
+# em_estoque_baixo: serviço de estoque, Produto.save (ver
+# alertar_marca_do_cadastro), importação, reparo de saldos e
+# reconstruir_estoque_baixo. Argumentos: abaixo, lista de (produto_id, saldo,
+# estoque_minimo) que ficaram abaixo do mínimo, e acima, ids dos que voltaram a ele.
+estoque_minimo_cruzado = Signal()
+
+
+def _apos_commit(funcao, *args):
+    """
+    Agenda a invalidação para depois do commit da transação em curso (ou
+    roda já, fora de uma). Invalidando antes, uma leitura concorrente ainda
+    veria os dados antigos e os guardaria no cache com a versão nova.
+    """
+    transaction.on_commit(partial(funcao, *args))
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_save, sender=Fornecedor)
+@receiver(post_save, sender=Produto)
+@receiver(post_save, sender=MovimentacaoEstoque)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_delete, sender=Fornecedor)
+@receiver(post_delete, sender=Produto)
+@receiver(post_delete, sender=MovimentacaoEstoque)
+@receiver(estoque_alterado)
+def invalidar_cache_estatisticas(sender, **kwargs):
+    """Qualquer alteração de cadastro ou estoque invalida o dashboard"""
+    _apos_commit(invalidar_estatisticas)
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_save, sender=Fornecedor)
+@receiver(post_save, sender=Produto)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_delete, sender=Fornecedor)
+@receiver(post_delete, sender=Produto)
+def invalidar_etag_cadastro(sender, **kwargs):
+    """Nova versão da tabela para o GET condicional (condicional.py)"""
+    _apos_commit(condicional.invalidar, sender._meta.model_name)
+
+
+@receiver(estoque_alterado)
+def invalidar_etag_estoque(sender, **kwargs):
+    _apos_commit(condicional.invalidar, condicional.ESTOQUE)
+
+
+@receiver(estoque_minimo_cruzado)
+def registrar_alertas(sender, abaixo=(), acima=(), **kwargs):
+    """Abre e resolve os alertas de estoque baixo (alertas.py)"""
+    alertas.registrar(abaixo, acima)
+
+
+@receiver(post_save, sender=Produto)
+def alertar_marca_do_cadastro(sender, instance, created, **kwargs):
+    """Cadastro já abaixo do mínimo ou edição que cruza o limite (ex.: estoque_minimo aumentado)"""
+    # Sem o valor original (instância montada à mão), não há como saber se cruzou
+    original = False if created else getattr(instance, '_estoque_baixo_original', DEFERRED)
+    marcado = instance.em_estoque_baixo
+    if original is not DEFERRED and original != marcado:
+        estoque_minimo_cruzado.send(
+            sender=Produto,
+            abaixo=[(instance.pk, instance.quantidade_estoque, instance.estoque_minimo)] if marcado else [],
+            acima=[] if marcado else [instance.pk],
+        )
+    instance._estoque_baixo_original = marcado
+
+
+@receiver(post_save, sender=Produto)
+def atualizar_contadores_ao_salvar(sender, instance, created, **kwargs):
+    """Mantém contador_produtos em criações e trocas de categoria/fornecedor"""
+    # Uma relação ainda adiada (.only/.defer) não foi gravada: não mudou
+    atuais = (
+        instance.__dict__.get('categoria_id', DEFERRED),
+        instance.__dict__.get('fornecedor_id', DEFERRED),
+    )
+    if created:
+        contadores.ajustar(*atuais, 1)
+    else:
+        originais = getattr(instance, '_relacoes_originais', atuais)
+        if DEFERRED not in (originais[0], atuais[0]) and originais[0] != atuais[0]:
+            contadores.ajustar(originais[0], None, -1)
+            contadores.ajustar(atuais[0], None, 1)
+        if DEFERRED not in (originais[1], atuais[1]) and originais[1] != atuais[1]:
+            contadores.ajustar(None, originais[1], -1)
+            contadores.ajustar(None, atuais[1], 1)
+    instance._relacoes_originais = atuais
+
+
+@receiver(post_delete, sender=Produto)
+def atualizar_contadores_ao_remover(sender, instance, **kwargs):
+    contadores.ajustar(instance.categoria_id, instance.fornecedor_id, -1)
+
+
+@receiver(post_save, sender=Produto)
+@receiver(post_delete, sender=Produto)
+def invalidar_codigo_barras_do_produto(sender, instance, **kwargs):
+    codigos = {instance.codigo_barras, getattr(instance, '_codigo_barras_original', None)} - {DEFERRED}
+    _apos_commit(codigo_barras.invalidar, codigos)
+    instance._codigo_barras_original = instance.codigo_barras
+
+
+@receiver(estoque_alterado)
+def invalidar_codigo_barras_do_estoque(sender, codigos_barras=None, **kwargs):
+    _apos_commit(codigo_barras.invalidar, codigos_barras)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidar_cache_usuario(sender, instance, **kwargs):
+    """Permissões alteradas (update_user_role) ou usuário removido (delete_user)"""
+    _apos_commit(invalidar_usuario, instance.pk)
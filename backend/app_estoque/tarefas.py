@@ -0,0 +1,232 @@
+"""
+Fila de tarefas em segundo plano guardada no próprio banco (modelo Tarefa).
+
+Operações demoradas são enfileiradas pela API, que responde 202 com o id
+da tarefa; o comando `processar_tarefas` (um ou mais processos worker)
+reserva as pendentes com SELECT ... FOR UPDATE SKIP LOCKED, executa e grava
+o resultado, que o cliente consulta em /tarefas/<id>/. Assim nenhum worker
+do Gunicorn fica preso por minutos e não é preciso um broker externo.
+
+Para criar um tipo novo basta registrar a função com @tarefa('nome'): ela
+recebe a Tarefa e os parâmetros enfileirados e retorna um valor
+serializável em JSON (ou grava tarefa.arquivo).
+"""
+import inspect
+import logging
+import os
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import arquivo, consistencia, contadores, estoque, exportacao, historico, importacao
+from .models import Tarefa
+from .replica import alias_leitura
+
+logger = logging.getLogger(__name__)
+
+REGISTRO = {}
+
+
+class Definicao:
+    def __init__(self, funcao, apenas_admin):
+        self.funcao = funcao
+        self.apenas_admin = apenas_admin
+
+
+def tarefa(nome, apenas_admin=False):
+    """Registra uma função como tipo de tarefa (apenas_admin: só superusuários enfileiram)"""
+    def decorator(funcao):
+        REGISTRO[nome] = Definicao(funcao, apenas_admin)
+        return funcao
+    return decorator
+
+
+def pode_enfileirar(usuario, tipo):
+    definicao = REGISTRO.get(tipo)
+    return definicao is not None and (not definicao.apenas_admin or usuario.is_superuser)
+
+
+def enfileirar(tipo, parametros=None, usuario=None):
+    """Cria a tarefa pendente; levanta ValueError se o tipo ou os parâmetros não existem"""
+    if tipo not in REGISTRO:
+        raise ValueError(f'Tipo de tarefa desconhecido: "{tipo}".')
+    parametros = parametros or {}
+    try:
+        inspect.signature(REGISTRO[tipo].funcao).bind(None, **parametros)
+    except TypeError:
+        raise ValueError(f'Parâmetros inválidos para a tarefa "{tipo}".')
+    return Tarefa.objects.create(tipo=tipo, parametros=parametros, usuario=usuario)
+
+
+def reservar():
+    """Marca a próxima tarefa pendente como em execução e a retorna (None se a fila está vazia)"""
+    with transaction.atomic():
+        # SKIP LOCKED: workers concorrentes pegam tarefas diferentes sem esperar
+        proxima = (
+            Tarefa.objects.select_for_update(skip_locked=True)
+            .filter(status=Tarefa.Status.PENDENTE)
+            .order_by('id')
+            .first()
+        )
+        if proxima is None:
+            return None
+        proxima.status = Tarefa.Status.EXECUTANDO
+        proxima.iniciada_em = timezone.now()
+        proxima.save(update_fields=['status', 'iniciada_em'])
+    return proxima
+
+
+def executar(tarefa):
+    """Roda a função da tarefa e grava o resultado ou o erro"""
+    try:
+        tarefa.resultado = REGISTRO[tarefa.tipo].funcao(tarefa, **tarefa.parametros)
+    except Exception as erro:
+        logger.exception('Tarefa %s (%s) falhou', tarefa.pk, tarefa.tipo)
+        tarefa.status = Tarefa.Status.FALHOU
+        tarefa.erro = str(erro) or erro.__class__.__name__
+    else:
+        tarefa.status = Tarefa.Status.CONCLUIDA
+    tarefa.concluida_em = timezone.now()
+
+    # Uma execução mais longa que ESTOQUE_TAREFAS_TIMEOUT já pode ter sido
+    # dada como interrompida (marcar_interrompidas): esse status é mantido
+    gravadas = Tarefa.objects.filter(pk=tarefa.pk, status=Tarefa.Status.EXECUTANDO).update(
+        status=tarefa.status,
+        resultado=tarefa.resultado,
+        arquivo=tarefa.arquivo,
+        erro=tarefa.erro,
+        concluida_em=tarefa.concluida_em,
+    )
+    if not gravadas:
+        logger.warning('Tarefa %s (%s) terminou depois de ser dada como interrompida', tarefa.pk, tarefa.tipo)
+        if tarefa.arquivo:
+            tarefa.arquivo.delete(save=False)
+        tarefa.refresh_from_db()
+    return tarefa
+
+
+def processar_pendentes(limite=None):
+    """Executa tarefas até esvaziar a fila (ou até `limite`); retorna quantas rodaram"""
+    executadas = 0
+    while limite is None or executadas < limite:
+        proxima = reservar()
+        if proxima is None:
+            break
+        executar(proxima)
+        executadas += 1
+    return executadas
+
+
+def marcar_interrompidas():
+    """
+    Tarefas em execução há mais de ESTOQUE_TAREFAS_TIMEOUT segundos ficaram
+    órfãs (worker reiniciado no meio): viram falha em vez de rodar de novo,
+    já que uma importação pela metade não deve ser repetida sem revisão. Se
+    a tarefa ainda estava rodando, executar() não sobrescreve a falha.
+    """
+    limite = timezone.now() - timedelta(seconds=getattr(settings, 'ESTOQUE_TAREFAS_TIMEOUT', 3600))
+    return Tarefa.objects.filter(status=Tarefa.Status.EXECUTANDO, iniciada_em__lt=limite).update(
+        status=Tarefa.Status.FALHOU,
+        erro='Interrompida: o worker parou antes de concluir.',
+        concluida_em=timezone.now(),
+    )
+
+
+def limpar_antigas():
+    """Remove tarefas finalizadas há mais de ESTOQUE_TAREFAS_RETENCAO_DIAS dias e seus arquivos"""
+    limite = timezone.now() - timedelta(days=getattr(settings, 'ESTOQUE_TAREFAS_RETENCAO_DIAS', 7))
+    antigas = Tarefa.objects.filter(
+        status__in=[Tarefa.Status.CONCLUIDA, Tarefa.Status.FALHOU], concluida_em__lt=limite
+    )
+    for nome in antigas.exclude(arquivo='').exclude(arquivo=None).values_list('arquivo', flat=True):
+        default_storage.delete(nome)
+    return antigas.delete()[0]
+
+
+def salvar_entrada(arquivo):
+    """Guarda um upload para o worker (que pode estar em outro processo) e retorna o caminho"""
+    return default_storage.save(f'tarefas/entrada/{os.path.basename(arquivo.name)}', arquivo)
+
+
+# ==============================================================================
+# TIPOS DE TAREFA
+# ==============================================================================
+
+def _exportar(tarefa, nome, filtrar, colunas, formato, filtros):
+    if formato not in exportacao.FORMATOS:
+        raise ValueError('Parâmetro "formato" deve ser csv ou ndjson.')
+    queryset = exportacao.usando(filtrar(filtros or {}), alias_leitura(tarefa.usuario))
+    # O arquivo é escrito aos poucos em disco, sem montar a exportação em memória
+    with tempfile.TemporaryFile() as temporario:
+        for trecho in exportacao.gerar(formato, queryset, colunas):
+            temporario.write(trecho.encode())
+        tamanho = temporario.tell()
+        temporario.seek(0)
+        tarefa.arquivo.save(f'{nome}-{tarefa.pk}.{formato}', File(temporario), save=False)
+    return {'bytes': tamanho}
+
+
+@tarefa('exportar_produtos')
+def exportar_produtos(tarefa, formato='csv', filtros=None):
+    return _exportar(
+        tarefa, 'produtos', exportacao.filtrar_produtos, exportacao.COLUNAS_PRODUTOS, formato, filtros
+    )
+
+
+@tarefa('exportar_movimentacoes')
+def exportar_movimentacoes(tarefa, formato='csv', filtros=None):
+    return _exportar(
+        tarefa, 'movimentacoes', exportacao.filtrar_movimentacoes,
+        exportacao.COLUNAS_MOVIMENTACOES, formato, filtros,
+    )
+
+
+@tarefa('importar_produtos')
+def importar_produtos(tarefa, arquivo):
+    """`arquivo` é o caminho gravado por salvar_entrada; é removido ao final"""
+    try:
+        with default_storage.open(arquivo, 'rb') as entrada:
+            return importacao.importar(entrada, arquivo, usuario=tarefa.usuario)
+    finally:
+        default_storage.delete(arquivo)
+
+
+@tarefa('consolidar_estoque_diario', apenas_admin=True)
+def consolidar_estoque_diario(tarefa, desde=None, ate=None):
+    datas = {}
+    for nome, valor in (('desde', desde), ('ate', ate)):
+        if valor:
+            datas[nome] = parse_date(valor)
+            if datas[nome] is None:
+                raise ValueError(f'"{nome}" deve estar no formato AAAA-MM-DD.')
+    dias, linhas = historico.consolidar(**datas)
+    return {'dias': dias, 'linhas': linhas}
+
+
+@tarefa('recalcular_contadores', apenas_admin=True)
+def recalcular_contadores(tarefa):
+    contadores.recalcular()
+    return {}
+
+
+@tarefa('reconstruir_estoque_baixo', apenas_admin=True)
+def reconstruir_estoque_baixo(tarefa):
+    return {'corrigidos': estoque.reconstruir_estoque_baixo()}
+
+
+@tarefa('verificar_estoque', apenas_admin=True)
+def verificar_estoque(tarefa, reparar=False):
+    """Compara os saldos com o histórico (ver consistencia.py) e, se pedido, corrige"""
+    return consistencia.relatorio(reparar, usuario=tarefa.usuario)
+
+
+@tarefa('arquivar_movimentacoes', apenas_admin=True)
+def arquivar_movimentacoes(tarefa, meses=None):
+    """Move para o arquivo as movimentações anteriores ao horizonte (ver arquivo.py)"""
+    return {'arquivadas': arquivo.arquivar(arquivo.horizonte(meses))}
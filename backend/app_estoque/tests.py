@@ -1,3 +1,1356 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import shutil
+import tempfile
+import threading
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import User
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from django.test import (
+    AsyncRequestFactory, Client, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature,
+)
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import AlertaEstoque, Categoria, Fornecedor, Produto, MovimentacaoArquivada, MovimentacaoEstoque, Tarefa
+from . import arquivo, benchmarks, cache as cache_estoque, codigo_barras, consistencia, historico, importacao, middleware, renderers, replica, tarefas, views_async
+from .serializers import ProdutoSerializer, produtos_para_leitura, serializar_produtos
+from .estatisticas import calcular_estatisticas
+from .estoque import aplicar_lote, movimentar, reconstruir_estoque_baixo
+
+
+class EstoqueTestCase(TestCase):
+    """Base com um usuário autenticado e um pequeno catálogo"""
+
+    def setUp(self):
+        cache.clear()
+        codigo_barras.invalidar()
+        self.usuario = User.objects.create_user(username='tester', password='senha123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.usuario)
+
+        self.categoria = Categoria.objects.create(nome='Ferramentas')
+        self.fornecedor = Fornecedor.objects.create(nome='Aço Forte')
+        self.produto = Produto.objects.create(
+            nome='Martelo',
+            preco_custo=Decimal('10.00'),
+            preco_venda=Decimal('15.00'),
+            categoria=self.categoria,
+            fornecedor=self.fornecedor,
+            codigo_barras='7890000000001',
+            quantidade_estoque=5,
+            estoque_minimo=10,
+        )
+
+    def criar_produtos(self, quantidade, **campos):
+        return [
+            Produto.objects.create(
+                nome=f'Produto {i}',
+                preco_custo=Decimal('2.50'),
+                preco_venda=Decimal('4.00'),
+                categoria=self.categoria,
+                fornecedor=self.fornecedor,
+                quantidade_estoque=20,
+                **campos,
+            )
+            for i in range(quantidade)
+        ]
+
+
+class EstatisticasTests(EstoqueTestCase):
+
+    def test_calcula_indicadores_no_banco(self):
+        self.criar_produtos(2)
+        Produto.objects.create(
+            nome='Inativo', categoria=self.categoria, quantidade_estoque=100,
+            preco_custo=Decimal('1.00'), preco_venda=Decimal('1.00'), ativo=False,
+        )
+        MovimentacaoEstoque.objects.create(produto=self.produto, tipo='E', quantidade=1)
+
+        with self.assertNumQueries(2):
+            dados = calcular_estatisticas()
+
+        self.assertEqual(dados['total_produtos'], 3)
+        self.assertEqual(dados['total_categorias'], 1)
+        self.assertEqual(dados['total_fornecedores'], 1)
+        # Martelo: 6 x 10,00 + 2 produtos x 20 x 2,50
+        self.assertEqual(dados['valor_total_estoque'], Decimal('160.00'))
+        self.assertEqual(dados['produtos_estoque_baixo'], 1)
+        self.assertEqual(dados['movimentacoes_hoje'], 1)
+
+    def test_endpoint_usa_cache_e_invalida_em_movimentacao(self):
+        resposta = self.client.get('/api/v1/estatisticas/')
+        self.assertEqual(resposta.data['movimentacoes_hoje'], 0)
+
+        with self.assertNumQueries(0):
+            self.client.get('/api/v1/estatisticas/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            MovimentacaoEstoque.objects.create(produto=self.produto, tipo='E', quantidade=10)
+        resposta = self.client.get('/api/v1/estatisticas/')
+        self.assertEqual(resposta.data['movimentacoes_hoje'], 1)
+        self.assertEqual(resposta.data['produtos_estoque_baixo'], 0)
+
+    def test_invalida_so_depois_do_commit(self):
+        self.client.get('/api/v1/estatisticas/')
+        with self.captureOnCommitCallbacks() as callbacks:
+            movimentar(self.produto, 'E', 10)
+            # Antes do commit, uma leitura concorrente guardaria dados velhos na versão nova
+            with self.assertNumQueries(0):
+                self.client.get('/api/v1/estatisticas/')
+        self.assertTrue(callbacks)
+
+
+class ListagemQueryCountTests(EstoqueTestCase):
+    """Garante um número fixo de consultas por página, independente do tamanho"""
+
+    def test_listagem_de_produtos(self):
+        self.criar_produtos(25)
+
+        # COUNT da paginação + SELECT da página com categoria e fornecedor
+        with self.assertNumQueries(2):
+            resposta = self.client.get('/api/v1/produtos/')
+        self.assertEqual(len(resposta.data['results']), 20)
+        self.assertEqual(resposta.data['results'][0]['fornecedor_nome'], 'Aço Forte')
+
+    def test_listagem_de_movimentacoes(self):
+        for produto in self.criar_produtos(25):
+            MovimentacaoEstoque.objects.create(
+                produto=produto, tipo='E', quantidade=1, usuario=self.usuario
+            )
+
+        with self.assertNumQueries(2):
+            resposta = self.client.get('/api/v1/movimentacoes/')
+        self.assertEqual(len(resposta.data['results']), 20)
+        self.assertEqual(resposta.data['results'][0]['usuario_nome'], 'tester')
+
+
+class TotalProdutosTests(EstoqueTestCase):
+
+    def test_listagens_anotam_total_em_uma_consulta(self):
+        for i in range(5):
+            categoria = Categoria.objects.create(nome=f'Categoria {i}')
+            fornecedor = Fornecedor.objects.create(nome=f'Fornecedor {i}')
+            Produto.objects.create(nome=f'Item {i}', categoria=categoria, fornecedor=fornecedor)
+
+        for url in ('/api/v1/categorias/', '/api/v1/fornecedores/'):
+            with self.assertNumQueries(2):
+                resposta = self.client.get(url)
+            self.assertTrue(all(item['total_produtos'] == 1 for item in resposta.data['results']))
+
+        with self.assertNumQueries(1):
+            self.client.get('/api/v1/fornecedores/ativos/')
+
+    def test_contadores_acompanham_criacao_troca_e_remocao(self):
+        outra = Categoria.objects.create(nome='Elétrica')
+        produto = Produto.objects.get(pk=self.produto.pk)
+        produto.categoria = outra
+        produto.fornecedor = None
+        produto.save()
+
+        self.categoria.refresh_from_db()
+        outra.refresh_from_db()
+        self.fornecedor.refresh_from_db()
+        self.assertEqual(
+            (self.categoria.contador_produtos, outra.contador_produtos, self.fornecedor.contador_produtos),
+            (0, 1, 0),
+        )
+
+        produto.delete()
+        outra.refresh_from_db()
+        self.assertEqual(outra.contador_produtos, 0)
+
+    def test_contadores_com_campos_adiados(self):
+        outra = Categoria.objects.create(nome='Elétrica')
+        # Relações adiadas e não alteradas: nada muda
+        produto = Produto.objects.only('nome', 'preco_custo', 'preco_venda').get(pk=self.produto.pk)
+        produto.nome = 'Martelo de unha'
+        produto.save()
+        # Categoria adiada e trocada depois: o original é lido do banco
+        produto = Produto.objects.defer('categoria').get(pk=self.produto.pk)
+        produto.categoria = outra
+        produto.save()
+
+        self.categoria.refresh_from_db()
+        outra.refresh_from_db()
+        self.fornecedor.refresh_from_db()
+        self.assertEqual(
+            (self.categoria.contador_produtos, outra.contador_produtos, self.fornecedor.contador_produtos),
+            (0, 1, 1),
+        )
+
+    def test_listagem_pode_ler_o_contador(self):
+        with self.settings(ESTOQUE_CONTADORES_PRODUTOS=True):
+            resposta = self.client.get('/api/v1/categorias/')
+        self.assertEqual(resposta.data['results'][0]['total_produtos'], 1)
+
+
+class MovimentacaoLoteTests(EstoqueTestCase):
+
+    def test_aplica_linhas_em_ordem_com_saldos(self):
+        resposta = self.client.post('/api/v1/movimentacoes/lote/', {'itens': [
+            {'produto': self.produto.pk, 'tipo': 'E', 'quantidade': 10},
+            {'produto': self.produto.pk, 'tipo': 'S', 'quantidade': 12},
+            {'produto': self.produto.pk, 'tipo': 'A', 'quantidade': 40},
+        ]}, format='json')
+
+        self.assertEqual(resposta.status_code, 201)
+        saldos = [(r['saldo_anterior'], r['saldo_atual']) for r in resposta.data['resultados']]
+        self.assertEqual(saldos, [(5, 15), (15, 3), (3, 40)])
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.quantidade_estoque, 40)
+        self.assertEqual(self.produto.movimentacoes.count(), 3)
+
+    def test_numero_de_consultas_nao_depende_do_tamanho(self):
+        produtos = self.criar_produtos(30)
+
+        def lote(quantidade):
+            itens = [
+                {'produto': p.pk, 'tipo': 'S', 'quantidade': 1}
+                for p in produtos[:quantidade]
+            ]
+            return self.client.post('/api/v1/movimentacoes/lote/', {'itens': itens}, format='json')
+
+        with self.assertNumQueries(5) as pequeno:
+            lote(3)
+        with self.assertNumQueries(len(pequeno.captured_queries)):
+            lote(30)
+
+    def test_linha_invalida_desfaz_o_lote_inteiro(self):
+        resposta = self.client.post('/api/v1/movimentacoes/lote/', {'itens': [
+            {'produto': self.produto.pk, 'tipo': 'E', 'quantidade': 1},
+            {'produto': self.produto.pk, 'tipo': 'S', 'quantidade': 50},
+            {'produto': 999999, 'tipo': 'E', 'quantidade': 1},
+        ]}, format='json')
+
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual([e['indice'] for e in resposta.data['erros']], [1, 2])
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.quantidade_estoque, 5)
+        self.assertFalse(self.produto.movimentacoes.exists())
+
+
+class RegistroMovimentacaoTests(EstoqueTestCase):
+
+    def test_saida_grava_produto_uma_vez_e_registra_saldo_anterior(self):
+        # get_object + SAVEPOINT, UPDATE condicional, releitura do saldo,
+        # INSERT da movimentação e RELEASE: o produto é escrito uma única vez
+        with self.assertNumQueries(6):
+            resposta = self.client.post(
+                f'/api/v1/produtos/{self.produto.pk}/dar-saida/', {'quantidade': 2}
+            )
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.data['quantidade_estoque'], 3)
+        movimentacao = self.produto.movimentacoes.get()
+        self.assertEqual(movimentacao.saldo_anterior, 5)
+
+    def test_saida_maior_que_o_estoque_e_recusada(self):
+        resposta = self.client.post(
+            f'/api/v1/produtos/{self.produto.pk}/dar-saida/', {'quantidade': 6}
+        )
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual(resposta.data['detalhe'], 'Estoque insuficiente. Disponível: 5')
+
+        resposta = self.client.post('/api/v1/movimentacoes/', {
+            'produto': self.produto.pk, 'tipo': 'S', 'quantidade': 6,
+        })
+        self.assertEqual(resposta.status_code, 400)
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.quantidade_estoque, 5)
+
+    def test_ajuste_define_saldo_absoluto(self):
+        movimentacao = MovimentacaoEstoque.objects.create(produto=self.produto, tipo='A', quantidade=42)
+        self.assertEqual(movimentacao.saldo_anterior, 5)
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.quantidade_estoque, 42)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcorrenciaMovimentacaoTests(TransactionTestCase):
+    """Várias threads disputando o mesmo SKU não podem vender além do estoque"""
+
+    THREADS = 16
+    SAIDAS_POR_THREAD = 5
+    ESTOQUE_INICIAL = 50
+
+    def test_saidas_concorrentes_nao_vendem_alem_do_estoque(self):
+        categoria = Categoria.objects.create(nome='Concorrência')
+        produto = Produto.objects.create(
+            nome='SKU disputado', categoria=categoria, quantidade_estoque=self.ESTOQUE_INICIAL,
+        )
+        barreira = threading.Barrier(self.THREADS)
+        sucessos, recusas = [], []
+
+        def vender():
+            barreira.wait()
+            try:
+                for _ in range(self.SAIDAS_POR_THREAD):
+                    try:
+                        movimentar(Produto(pk=produto.pk), 'S', 1)
+                        sucessos.append(1)
+                    except ValidationError:
+                        recusas.append(1)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=vender) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        produto.refresh_from_db()
+        self.assertEqual(len(sucessos), self.ESTOQUE_INICIAL)
+        self.assertEqual(len(recusas), self.THREADS * self.SAIDAS_POR_THREAD - self.ESTOQUE_INICIAL)
+        self.assertEqual(produto.quantidade_estoque, 0)
+        # Cada saída viu um saldo anterior diferente: nenhuma leitura foi perdida
+        saldos = sorted(produto.movimentacoes.values_list('saldo_anterior', flat=True))
+        self.assertEqual(saldos, list(range(1, self.ESTOQUE_INICIAL + 1)))
+
+
+class ExportacaoTests(EstoqueTestCase):
+
+    def conteudo(self, resposta):
+        return b''.join(resposta.streaming_content).decode('utf-8')
+
+    @override_settings(ESTOQUE_EXPORTACAO_LOTE=2)
+    def test_exporta_movimentacoes_em_csv_por_lotes(self):
+        for quantidade in (1, 2, 3, 4, 5):
+            movimentar(self.produto, 'E', quantidade, usuario=self.usuario)
+        movimentar(self.produto, 'S', 1)
+
+        resposta = self.client.get('/api/v1/exportar/movimentacoes/?tipo=E')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta['Content-Type'], 'text/csv; charset=utf-8')
+
+        linhas = self.conteudo(resposta).splitlines()
+        self.assertTrue(linhas[0].startswith('id,data_hora,produto_id,produto,tipo,quantidade'))
+        self.assertEqual([linha.split(',')[5] for linha in linhas[1:]], ['1', '2', '3', '4', '5'])
+
+    def test_exporta_produtos_em_ndjson(self):
+        self.criar_produtos(3)
+        resposta = self.client.get('/api/v1/exportar/produtos/?formato=ndjson')
+        registros = [json.loads(linha) for linha in self.conteudo(resposta).splitlines()]
+
+        self.assertEqual(len(registros), 4)
+        self.assertEqual(registros[0]['categoria'], 'Ferramentas')
+        self.assertEqual(registros[0]['preco_custo'], '10.00')
+
+    def test_filtro_de_data_invalido(self):
+        resposta = self.client.get('/api/v1/exportar/movimentacoes/?data_inicio=ontem')
+        self.assertEqual(resposta.status_code, 400)
+
+
+class PaginacaoMovimentacoesTests(EstoqueTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for _ in range(25):
+            movimentar(self.produto, 'E', 1)
+        # Empates de data_hora são desfeitos pelo id
+        MovimentacaoEstoque.objects.update(data_hora=timezone.now())
+
+    def test_percorre_historico_por_cursor_sem_repetir(self):
+        resposta = self.client.get('/api/v1/movimentacoes/?page_size=10')
+        self.assertEqual(resposta.data['count'], 25)
+        self.assertIsNone(resposta.data['previous'])
+        vistos = [m['id'] for m in resposta.data['results']]
+
+        while resposta.data['next']:
+            resposta = self.client.get(resposta.data['next'])
+            vistos += [m['id'] for m in resposta.data['results']]
+
+        esperado = list(MovimentacaoEstoque.objects.order_by('-id').values_list('id', flat=True))
+        self.assertEqual(vistos, esperado)
+
+        anterior = self.client.get(resposta.data['previous'])
+        self.assertEqual([m['id'] for m in anterior.data['results']], esperado[10:20])
+
+    def test_contagem_opcional(self):
+        with self.assertNumQueries(1):
+            resposta = self.client.get('/api/v1/movimentacoes/?contagem=false')
+        self.assertNotIn('count', resposta.data)
+        self.assertEqual(len(resposta.data['results']), 20)
+
+    def test_cursor_invalido(self):
+        resposta = self.client.get('/api/v1/movimentacoes/?cursor=nao-e-um-cursor')
+        self.assertEqual(resposta.status_code, 404)
+
+
+class EstoqueBaixoTests(EstoqueTestCase):
+
+    def baixos(self):
+        resposta = self.client.get('/api/v1/produtos/estoque_baixo/')
+        return [p['id'] for p in resposta.data]
+
+    def test_marca_acompanha_movimentacoes_e_edicao_do_minimo(self):
+        self.assertEqual(self.baixos(), [self.produto.pk])
+
+        movimentar(self.produto, 'E', 5)
+        self.assertEqual(self.baixos(), [])
+
+        movimentar(self.produto, 'S', 1)
+        self.assertEqual(self.baixos(), [self.produto.pk])
+
+        produto = Produto.objects.get(pk=self.produto.pk)
+        produto.estoque_minimo = 2
+        produto.save()
+        self.assertEqual(self.baixos(), [])
+
+    def test_lote_atualiza_marca(self):
+        self.client.post('/api/v1/movimentacoes/lote/', {'itens': [
+            {'produto': self.produto.pk, 'tipo': 'A', 'quantidade': 30},
+        ]}, format='json')
+        self.assertEqual(self.baixos(), [])
+
+    def test_reconstrucao_corrige_divergencias(self):
+        Produto.objects.update(em_estoque_baixo=False)
+        self.assertEqual(reconstruir_estoque_baixo(), 1)
+        self.assertEqual(self.baixos(), [self.produto.pk])
+
+
+class FiltrosProdutoTests(EstoqueTestCase):
+
+    def ids(self, query):
+        resposta = self.client.get(f'/api/v1/produtos/?{query}')
+        self.assertEqual(resposta.status_code, 200, resposta.data)
+        return [p['id'] for p in resposta.data['results']]
+
+    def test_busca_por_prefixo_ignora_acentos_e_caixa(self):
+        pao = Produto.objects.create(nome='Pão de Açúcar', categoria=self.categoria)
+        Produto.objects.create(nome='Açúcar', categoria=self.categoria)
+
+        self.assertEqual(self.ids('busca=PAO'), [pao.pk])
+        self.assertEqual(self.ids('busca=7890'), [self.produto.pk])
+        self.assertEqual(len(self.ids('nome=acucar')), 2)
+
+    def test_faixas_categoria_e_ordenacao(self):
+        baratos = self.criar_produtos(2)
+        outra = Categoria.objects.create(nome='Elétrica')
+        cabo = Produto.objects.create(
+            nome='Cabo', categoria=outra, preco_custo=Decimal('30.00'),
+            preco_venda=Decimal('40.00'), quantidade_estoque=7,
+        )
+
+        self.assertEqual(self.ids(f'categoria={outra.pk}'), [cabo.pk])
+        self.assertEqual(self.ids('preco_min=10&preco_max=20'), [self.produto.pk])
+        self.assertEqual(self.ids('estoque_max=7&ordenar=-nome'), [self.produto.pk, cabo.pk])
+        self.assertEqual(self.ids('estoque_baixo=true'), [self.produto.pk])
+        self.assertEqual(self.ids('ordenar=-preco_venda')[-2:], [p.pk for p in baratos])
+        # Quantidade x preço de venda: 280, 80, 80, 75
+        self.assertEqual(self.ids('ordenar=-valor_estoque'), [cabo.pk, *[p.pk for p in baratos], self.produto.pk])
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.client.get('/api/v1/produtos/?ordenar=descricao').status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/produtos/?preco_min=abc').status_code, 400)
+
+
+class CodigoBarrasTests(EstoqueTestCase):
+
+    def test_consulta_enxuta_com_cache(self):
+        url = '/api/v1/produtos/codigo-barras/7890000000001/'
+        resposta = self.client.get(url)
+        self.assertEqual(resposta.data, {
+            'id': self.produto.pk, 'nome': 'Martelo', 'codigo_barras': '7890000000001',
+            'preco_venda': '15.00', 'quantidade_estoque': 5, 'ativo': True,
+        })
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        self.assertEqual(self.client.get('/api/v1/produtos/codigo-barras/000/').status_code, 404)
+
+    def test_movimentacao_e_edicao_invalidam(self):
+        url = '/api/v1/produtos/codigo-barras/7890000000001/'
+        self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            movimentar(self.produto, 'E', 3)
+        self.assertEqual(self.client.get(url).data['quantidade_estoque'], 8)
+
+        produto = Produto.objects.get(pk=self.produto.pk)
+        produto.codigo_barras = '7890000000002'
+        with self.captureOnCommitCallbacks(execute=True):
+            produto.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    @override_settings(ESTOQUE_CODIGO_BARRAS_CACHE_COMPARTILHADO=True)
+    def test_lote_de_codigos(self):
+        resposta = self.client.post(
+            '/api/v1/produtos/codigo-barras/',
+            {'codigos': ['7890000000001', 'inexistente', '7890000000001']},
+            format='json',
+        )
+        self.assertEqual(list(resposta.data['encontrados']), ['7890000000001'])
+        self.assertEqual(resposta.data['nao_encontrados'], ['inexistente'])
+
+        # Outro worker (LRU vazio) encontra o produto no cache compartilhado
+        codigo_barras._lru.clear()
+        with self.assertNumQueries(0):
+            encontrados = codigo_barras.resolver(['7890000000001'])
+        self.assertEqual(encontrados['7890000000001']['nome'], 'Martelo')
+
+    @override_settings(ESTOQUE_CODIGO_BARRAS_CACHE_COMPARTILHADO=True)
+    def test_versao_lida_uma_vez_por_lote(self):
+        codigos = [f'789{i:010d}' for i in range(50)] + ['7890000000001']
+        with mock.patch.object(cache_estoque, 'versao', wraps=cache_estoque.versao) as versao:
+            encontrados = codigo_barras.resolver(codigos)
+            self.assertEqual(versao.call_count, 1)
+            codigo_barras.invalidar(codigos)
+            self.assertEqual(versao.call_count, 2)
+        self.assertEqual(list(encontrados), ['7890000000001'])
+
+
+@override_settings(ESTOQUE_CACHE_COMPARTILHADO=True)
+class AutenticacaoEmCacheTests(EstoqueTestCase):
+
+    def autenticar_por_token(self, usuario):
+        cliente = APIClient()
+        token = RefreshToken.for_user(usuario).access_token
+        cliente.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return cliente
+
+    def test_usuario_vem_do_cache_depois_da_primeira_requisicao(self):
+        cliente = self.autenticar_por_token(self.usuario)
+        with self.assertNumQueries(1):
+            cliente.get('/api/v1/me/')
+        with self.assertNumQueries(0):
+            resposta = cliente.get('/api/v1/me/')
+        self.assertEqual(resposta.data['username'], 'tester')
+
+    def test_alteracao_de_permissoes_e_remocao_invalidam(self):
+        admin = User.objects.create_superuser(username='admin', password='senha123')
+        cliente = self.autenticar_por_token(self.usuario)
+        cliente.get('/api/v1/me/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.autenticar_por_token(admin).put(
+                f'/api/v1/users/{self.usuario.pk}/update-role/', {'is_staff': True}, format='json'
+            )
+        self.assertTrue(cliente.get('/api/v1/me/').data['is_staff'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.autenticar_por_token(admin).delete(f'/api/v1/users/{self.usuario.pk}/delete/')
+        self.assertEqual(cliente.get('/api/v1/me/').status_code, 401)
+
+    @override_settings(ESTOQUE_CACHE_COMPARTILHADO=False)
+    def test_cache_por_processo_nao_guarda_o_usuario(self):
+        # Outro worker não veria a invalidação: o usuário é lido do banco sempre
+        cliente = self.autenticar_por_token(self.usuario)
+        cliente.get('/api/v1/me/')
+        with self.assertNumQueries(1):
+            cliente.get('/api/v1/me/')
+
+
+class ViewsAsyncTests(EstoqueTestCase):
+    """As views assíncronas (modo ASGI) devolvem o mesmo que as views DRF"""
+
+    def chamar(self, view, caminho, autenticar=True, cabecalhos=None, **kwargs):
+        cabecalhos = dict(cabecalhos or {})
+        if autenticar:
+            token = RefreshToken.for_user(self.usuario).access_token
+            cabecalhos['Authorization'] = f'Bearer {token}'
+        request = AsyncRequestFactory().get(caminho, headers=cabecalhos)
+        return async_to_sync(view)(request, **kwargs)
+
+    def chamar_com_sessao(self, view, caminho, **kwargs):
+        cliente = Client()
+        cliente.force_login(self.usuario)
+        request = AsyncRequestFactory().get(caminho)
+        request.COOKIES = {nome: cookie.value for nome, cookie in cliente.cookies.items()}
+        SessionMiddleware(lambda r: None).process_request(request)
+        AuthenticationMiddleware(lambda r: None).process_request(request)
+        return async_to_sync(view)(request, **kwargs)
+
+    def test_respostas_iguais_as_views_sincronas(self):
+        casos = [
+            (views_async.me_view, '/api/v1/me/', {}),
+            (views_async.estatisticas_view, '/api/v1/estatisticas/', {}),
+            (views_async.produto_detalhe, f'/api/v1/produtos/{self.produto.pk}/', {'pk': self.produto.pk}),
+            (views_async.produto_codigo_barras, '/api/v1/produtos/codigo-barras/7890000000001/',
+             {'codigo': '7890000000001'}),
+        ]
+        for view, caminho, kwargs in casos:
+            with self.subTest(caminho=caminho):
+                resposta = self.chamar(view, caminho, **kwargs)
+                self.assertEqual(resposta.status_code, 200)
+                self.assertEqual(json.loads(resposta.content), self.client.get(caminho).json())
+
+    def test_exige_autenticacao(self):
+        resposta = self.chamar(views_async.me_view, '/api/v1/me/', autenticar=False)
+        self.assertEqual(resposta.status_code, 401)
+        self.assertIn('detail', json.loads(resposta.content))
+        self.assertEqual(self.chamar(views_async.health_check, '/api/v1/health/', autenticar=False).status_code, 200)
+
+    def test_produto_inexistente_ou_inativo(self):
+        Produto.objects.filter(pk=self.produto.pk).update(ativo=False)
+        resposta = self.chamar(views_async.produto_detalhe, '/', pk=self.produto.pk)
+        self.assertEqual(resposta.status_code, 404)
+        resposta = self.chamar(views_async.produto_codigo_barras, '/', codigo='nao-existe')
+        self.assertEqual(resposta.status_code, 404)
+
+    def test_mesmo_queryset_do_retrieve(self):
+        inativo = Produto.objects.create(
+            nome='Alicate', categoria=self.categoria, preco_custo=Decimal('1.00'),
+            preco_venda=Decimal('2.00'), ativo=False,
+        )
+        casos = [
+            (inativo.pk, ''), (inativo.pk, '?ativo=false'),
+            (self.produto.pk, '?busca=alicate'), (self.produto.pk, '?busca=mart'),
+            (self.produto.pk, '?ordenar=descricao'),
+        ]
+        for pk, query in casos:
+            with self.subTest(pk=pk, query=query):
+                caminho = f'/api/v1/produtos/{pk}/{query}'
+                sincrona = self.client.get(caminho)
+                resposta = self.chamar(views_async.produto_detalhe, caminho, pk=pk)
+                self.assertEqual(resposta.status_code, sincrona.status_code)
+                self.assertEqual(json.loads(resposta.content), sincrona.json())
+
+    def test_mesmos_bytes_com_o_renderer_configurado(self):
+        rapido = {
+            **settings.REST_FRAMEWORK,
+            'DEFAULT_RENDERER_CLASSES': [
+                'app_estoque.renderers.ORJSONRenderer', 'rest_framework.renderers.BrowsableAPIRenderer',
+            ],
+        }
+        caminho = f'/api/v1/produtos/{self.produto.pk}/'
+        with self.settings(REST_FRAMEWORK=rapido):
+            resposta = self.chamar(views_async.produto_detalhe, caminho, pk=self.produto.pk)
+            sincrona = self.client.get(caminho)
+            self.assertEqual(resposta.content, sincrona.content)
+            self.assertEqual(resposta['Content-Type'], sincrona['Content-Type'])
+
+            # A API navegável é respondida pela view síncrona
+            resposta = self.chamar(
+                views_async.produto_detalhe, caminho, pk=self.produto.pk, cabecalhos={'Accept': 'text/html'}
+            )
+            self.assertTrue(resposta['Content-Type'].startswith('text/html'))
+
+    def test_mesmas_classes_de_autenticacao(self):
+        # me/estatísticas aceitam sessão (padrão do DRF); produtos, só JWT como o ProdutoViewSet
+        self.assertEqual(self.chamar_com_sessao(views_async.me_view, '/api/v1/me/').status_code, 200)
+        resposta = self.chamar_com_sessao(views_async.produto_detalhe, '/', pk=self.produto.pk)
+        self.assertEqual(resposta.status_code, 401)
+
+    @override_settings(ESTOQUE_CACHE_COMPARTILHADO=True)
+    def test_etag_igual_ao_da_view_sincrona(self):
+        caminho = f'/api/v1/produtos/{self.produto.pk}/'
+        resposta = self.chamar(views_async.produto_detalhe, caminho, pk=self.produto.pk)
+        self.assertEqual(resposta['ETag'], self.client.get(caminho)['ETag'])
+
+        resposta = self.chamar(
+            views_async.produto_detalhe, caminho, pk=self.produto.pk,
+            cabecalhos={'If-None-Match': resposta['ETag']},
+        )
+        self.assertEqual(resposta.status_code, 304)
+
+        self.produto.nome = 'Outro nome'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.produto.save()
+        resposta = self.chamar(
+            views_async.produto_detalhe, caminho, pk=self.produto.pk,
+            cabecalhos={'If-None-Match': resposta['ETag']},
+        )
+        self.assertEqual(resposta.status_code, 200)
+
+
+@override_settings(ESTOQUE_LEITURA_EM_REPLICA=True, ESTOQUE_CACHE_COMPARTILHADO=True)
+class ReplicaTests(EstoqueTestCase):
+    """Roteamento das leituras para a réplica e leitura das próprias escritas"""
+
+    def test_leituras_marcadas_vao_para_a_replica(self):
+        roteador = replica.RoteadorReplica()
+        self.assertIsNone(roteador.db_for_read(Produto))
+        with replica.leitura_em_replica(self.usuario):
+            self.assertEqual(roteador.db_for_read(Produto), replica.ALIAS)
+            self.assertIsNone(roteador.db_for_write(Produto))
+        self.assertIsNone(roteador.db_for_read(Produto))
+        self.assertFalse(roteador.allow_migrate(replica.ALIAS, 'app_estoque'))
+
+    def test_versao_assincrona(self):
+        async def marcada(usuario):
+            async with replica.aleitura_em_replica(usuario):
+                return replica.em_uso()
+
+        self.assertTrue(async_to_sync(marcada)(self.usuario))
+        replica.fixar_primario(self.usuario)
+        self.assertFalse(async_to_sync(marcada)(self.usuario))
+        self.assertFalse(replica.em_uso())
+
+    def test_usuario_le_do_primario_logo_apos_movimentar(self):
+        outro = User.objects.create_user(username='outro', password='senha123')
+        self.assertTrue(replica.pode_usar_replica(self.usuario))
+
+        resposta = self.client.post(
+            f'/api/v1/produtos/{self.produto.pk}/dar-entrada/', {'quantidade': 1}, format='json'
+        )
+        self.assertEqual(resposta.status_code, 200)
+        self.assertFalse(replica.pode_usar_replica(self.usuario))
+        self.assertEqual(replica.alias_leitura(self.usuario), 'default')
+        self.assertTrue(replica.pode_usar_replica(outro))
+
+    @override_settings(ESTOQUE_CACHE_COMPARTILHADO=False)
+    def test_cache_por_processo_mantem_usuarios_no_primario(self):
+        # A fixação pós-escrita não alcançaria os outros workers
+        self.assertEqual(replica.alias_leitura(self.usuario), 'default')
+        self.assertTrue(replica.pode_usar_replica(None))
+
+    def test_sem_replica_tudo_fica_no_primario(self):
+        with self.settings(ESTOQUE_LEITURA_EM_REPLICA=False):
+            self.assertEqual(replica.alias_leitura(self.usuario), 'default')
+            with replica.leitura_em_replica(self.usuario):
+                self.assertIsNone(replica.RoteadorReplica().db_for_read(Produto))
+
+
+class HistoricoDiarioTests(EstoqueTestCase):
+    """Consolidação diária e relatórios sobre a tabela EstoqueDiario"""
+
+    def setUp(self):
+        super().setUp()
+        self.hoje = timezone.localdate()
+        self.dia1 = self.hoje - timedelta(days=3)
+        self.dia2 = self.hoje - timedelta(days=1)
+        # Saldo inicial 5: +10 e -3 no dia 1, ajuste para 20 no dia 2, -5 hoje
+        self.movimentar('E', 10, self.dia1)
+        self.movimentar('S', 3, self.dia1)
+        self.movimentar('A', 20, self.dia2)
+        self.movimentar('S', 5, self.hoje)
+
+    def movimentar(self, tipo, quantidade, dia):
+        movimentacao = movimentar(self.produto, tipo, quantidade)
+        MovimentacaoEstoque.objects.filter(pk=movimentacao.pk).update(
+            data_hora=timezone.make_aware(datetime.combine(dia, time(12)))
+        )
+
+    def saldo_em(self, dia):
+        return historico.saldos_em(dia, [self.produto.pk]).get().saldo
+
+    def test_consolida_e_responde_saldo_em_qualquer_data(self):
+        self.assertEqual(historico.consolidar(), (4, 3))
+        self.assertEqual(self.saldo_em(self.dia1 - timedelta(days=1)), 5)
+        self.assertEqual(self.saldo_em(self.dia1), 12)
+        self.assertEqual(self.saldo_em(self.dia1 + timedelta(days=1)), 12)
+        self.assertEqual(self.saldo_em(self.dia2), 20)
+        self.assertEqual(self.saldo_em(self.hoje), 15)
+
+        totais = {linha['data']: linha for linha in historico.totais_diarios(self.dia1, self.hoje)}
+        self.assertEqual((totais[self.dia1]['entradas'], totais[self.dia1]['saidas']), (10, 3))
+        self.assertEqual(totais[self.dia2]['ajustes'], 8)
+        self.assertEqual(totais[self.hoje]['movimentacoes'], 1)
+
+    def test_saldo_antes_de_qualquer_dia_consolidado(self):
+        # Nada consolidado: o saldo vem das movimentações depois da data
+        self.assertEqual(self.saldo_em(self.dia1 - timedelta(days=1)), 5)
+        self.assertEqual(self.saldo_em(self.dia1), 12)
+        self.assertEqual(self.saldo_em(self.dia2), 20)
+
+        # Produto cadastrado hoje, sem movimentações: não existia na data
+        novo = Produto.objects.create(
+            nome='Trena', preco_custo=Decimal('4.00'), preco_venda=Decimal('9.00'),
+            categoria=self.categoria, quantidade_estoque=8,
+        )
+        self.assertIsNone(historico.saldos_em(self.dia2, [novo.pk]).get().saldo)
+        self.assertEqual(historico.saldos_em(self.hoje, [novo.pk]).get().saldo, 8)
+
+        # Consolidado só a partir de depois da data: nem o saldo atual (15)
+        # nem o saldo inicial do primeiro dia consolidado (12)
+        historico.consolidar(desde=self.dia2)
+        self.assertEqual(self.saldo_em(self.dia1 - timedelta(days=1)), 5)
+
+    def test_consolidacao_incremental_reprocessa_so_o_ultimo_dia(self):
+        historico.consolidar()
+        self.movimentar('E', 7, self.hoje)
+        self.assertEqual(historico.consolidar(), (1, 1))
+        self.assertEqual(self.saldo_em(self.hoje), 22)
+
+    def test_endpoints_de_relatorio(self):
+        historico.consolidar()
+        resposta = self.client.get('/api/v1/relatorios/saldos/', {'data': self.dia1.isoformat()})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.data['results'][0]['saldo'], 12)
+
+        resposta = self.client.get('/api/v1/relatorios/movimentacao-diaria/', {
+            'data_inicio': self.dia1.isoformat(), 'data_fim': self.hoje.isoformat(),
+            'produto': self.produto.pk,
+        })
+        self.assertEqual([linha['saidas'] for linha in resposta.data], [3, 0, 5])
+
+        self.assertEqual(self.client.get('/api/v1/relatorios/saldos/').status_code, 400)
+        resposta = self.client.get('/api/v1/relatorios/movimentacao-diaria/', {'data_inicio': 'ontem'})
+        self.assertEqual(resposta.status_code, 400)
+
+
+@override_settings(ESTOQUE_CACHE_COMPARTILHADO=True)
+class ETagTests(EstoqueTestCase):
+    """GET condicional das listagens e detalhes do catálogo"""
+
+    def get(self, caminho, etag=None):
+        cabecalhos = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(caminho, **cabecalhos)
+
+    def test_304_sem_consultar_o_banco(self):
+        for caminho in ('/api/v1/produtos/', f'/api/v1/produtos/{self.produto.pk}/',
+                        '/api/v1/categorias/', '/api/v1/fornecedores/'):
+            with self.subTest(caminho=caminho):
+                etag = self.get(caminho)['ETag']
+                self.assertTrue(etag.startswith('W/"'))
+                with self.assertNumQueries(0):
+                    resposta = self.get(caminho, etag)
+                self.assertEqual(resposta.status_code, 304)
+                self.assertEqual(resposta['ETag'], etag)
+
+    def test_movimentacao_muda_so_o_etag_de_produtos(self):
+        produtos = self.get('/api/v1/produtos/')['ETag']
+        categorias = self.get('/api/v1/categorias/')['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/v1/produtos/{self.produto.pk}/dar-entrada/', {'quantidade': 1}, format='json')
+
+        self.assertEqual(self.get('/api/v1/produtos/', produtos).status_code, 200)
+        self.assertEqual(self.get('/api/v1/categorias/', categorias).status_code, 304)
+
+    def test_alteracao_de_cadastro_invalida_quem_exibe_o_dado(self):
+        produtos = self.get('/api/v1/produtos/')['ETag']
+        fornecedores = self.get('/api/v1/fornecedores/')['ETag']
+
+        self.categoria.nome = 'Ferramentas manuais'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.categoria.save()
+
+        resposta = self.get('/api/v1/produtos/', produtos)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.data['results'][0]['categoria_nome'], 'Ferramentas manuais')
+        self.assertEqual(self.get('/api/v1/fornecedores/', fornecedores).status_code, 304)
+
+    @override_settings(ESTOQUE_CACHE_COMPARTILHADO=False)
+    def test_sem_etag_com_cache_por_processo(self):
+        resposta = self.get('/api/v1/produtos/', '*')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertFalse(resposta.has_header('ETag'))
+
+
+class CompressaoERendererTests(EstoqueTestCase):
+
+    def test_listagem_grande_vem_comprimida(self):
+        self.criar_produtos(30)
+        resposta = self.client.get('/api/v1/produtos/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(resposta['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', resposta['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(resposta.content))['count'], 31)
+
+        resposta = self.client.get('/api/v1/health/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(resposta.has_header('Content-Encoding'))
+
+    @skipUnless(middleware.brotli, 'brotli não instalado')
+    def test_brotli_quando_o_cliente_aceita(self):
+        self.criar_produtos(30)
+        resposta = self.client.get('/api/v1/produtos/', HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(resposta['Content-Encoding'], 'br')
+        self.assertEqual(json.loads(middleware.brotli.decompress(resposta.content))['count'], 31)
+
+    @skipUnless(middleware.brotli, 'brotli não instalado')
+    def test_com_credenciais_usa_o_gzip_com_preenchimento(self):
+        self.criar_produtos(30)
+        token = str(RefreshToken.for_user(self.usuario).access_token)
+        cliente = APIClient()
+        tamanhos = set()
+        for _ in range(5):
+            resposta = cliente.get(
+                '/api/v1/produtos/', HTTP_ACCEPT_ENCODING='gzip, deflate, br',
+                HTTP_AUTHORIZATION=f'Bearer {token}',
+            )
+            self.assertEqual(resposta['Content-Encoding'], 'gzip')
+            self.assertEqual(json.loads(gzip.decompress(resposta.content))['count'], 31)
+            tamanhos.add(len(resposta.content))
+        # Preenchimento aleatório do Django contra o BREACH
+        self.assertGreater(len(tamanhos), 1)
+
+        self.client.cookies['sessionid'] = 'qualquer'
+        resposta = self.client.get('/api/v1/produtos/', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(resposta['Content-Encoding'], 'gzip')
+
+    @skipUnless(renderers.orjson, 'orjson não instalado')
+    def test_renderer_orjson_gera_o_mesmo_json_do_drf(self):
+        self.criar_produtos(5)
+        Produto.objects.filter(pk=self.produto.pk).update(descricao='Linha nova — ação')
+        dados = {
+            'produtos': ProdutoSerializer(Produto.objects.select_related('categoria', 'fornecedor'), many=True).data,
+            'estatisticas': calcular_estatisticas(),
+            'gerado_em': timezone.now(),
+            'hoje': timezone.localdate(),
+            1: None,
+        }
+        self.assertEqual(
+            renderers.ORJSONRenderer().render(dados),
+            JSONRenderer().render(dados),
+        )
+
+    @skipUnless(renderers.orjson, 'orjson não instalado')
+    def test_renderer_orjson_decimal_e_datas_byte_a_byte(self):
+        dados = {
+            'decimais': [Decimal('15.10'), Decimal('0.00'), Decimal('-3.5'), Decimal('123456789.99')],
+            'com_fuso': timezone.now(),
+            'sem_fuso': datetime(2024, 1, 2, 3, 4, 5, 123456),
+            'sem_micro': datetime(2024, 1, 2, 3, 4, 5),
+            'data': timezone.localdate(),
+            'hora': time(1, 2, 3),
+            'duracao': timedelta(hours=1, seconds=5),
+        }
+        self.assertEqual(renderers.ORJSONRenderer().render(dados), JSONRenderer().render(dados))
+
+    @skipUnless(renderers.orjson, 'orjson não instalado')
+    def test_renderer_orjson_diferencas_documentadas(self):
+        self.assertEqual(renderers.ORJSONRenderer().render({'a': 1e16}), b'{"a":1e16}')
+        self.assertEqual(JSONRenderer().render({'a': 1e16}), b'{"a":1e+16}')
+        self.assertEqual(renderers.ORJSONRenderer().render({'a': float('nan')}), b'{"a":null}')
+        with self.assertRaises(ValueError):
+            JSONRenderer().render({'a': float('nan')})
+        self.assertEqual(
+            renderers.ORJSONRenderer().render({'a': 2 ** 70}), JSONRenderer().render({'a': 2 ** 70})
+        )
+
+
+class BenchmarksTests(EstoqueTestCase):
+
+    def test_catalogo_sintetico_tem_os_campos_derivados(self):
+        benchmarks.popular_catalogo(30)
+        produtos = Produto.objects.filter(codigo_barras__startswith='BENCH')
+        self.assertEqual(produtos.filter(em_estoque_baixo=True).count(), 10)
+        self.assertEqual(reconstruir_estoque_baixo(), 0)
+        self.assertEqual(produtos.filter(nome_normalizado='produto bench 0000007').count(), 1)
+
+
+class LeituraEnxutaTests(EstoqueTestCase):
+    """A listagem enxuta gera exatamente o mesmo JSON do ProdutoSerializer"""
+
+    def setUp(self):
+        super().setUp()
+        Produto.objects.create(
+            nome='Brinde sem custo', preco_custo=Decimal('0.00'), preco_venda=Decimal('1.99'),
+            categoria=self.categoria, quantidade_estoque=3, estoque_minimo=3,
+        )
+        Produto.objects.create(
+            nome='Chave de fenda — ½"', descricao='Aço cromo', preco_custo=Decimal('3.00'),
+            preco_venda=Decimal('3.01'), categoria=self.categoria, fornecedor=self.fornecedor,
+            codigo_barras='7890000000002', quantidade_estoque=7, estoque_minimo=2,
+        )
+        Produto.objects.create(
+            nome='Serrote', preco_custo=Decimal('8.00'), preco_venda=Decimal('8.50'),
+            categoria=self.categoria, quantidade_estoque=0, estoque_minimo=0,
+        )
+
+    def test_mesmos_bytes_que_o_serializer_padrao(self):
+        for params in ({}, {'ordenar': '-preco_venda'}, {'ativo': 'false', 'page_size': 2}):
+            with self.subTest(params=params):
+                with self.settings(ESTOQUE_LEITURA_ENXUTA=False):
+                    padrao = self.client.get('/api/v1/produtos/', params)
+                enxuta = self.client.get('/api/v1/produtos/', params)
+                self.assertEqual(enxuta.status_code, 200)
+                self.assertEqual(enxuta.content, padrao.content)
+
+    def test_margem_compartilhada_com_o_modelo(self):
+        dados = serializar_produtos(produtos_para_leitura(Produto.objects.order_by('pk')))
+        for produto, linha in zip(Produto.objects.order_by('pk'), dados):
+            self.assertEqual(linha['margem_lucro'], produto.margem_lucro)
+            self.assertEqual(linha['estoque_baixo'], produto.estoque_baixo)
+
+
+class ImportacaoProdutosTests(EstoqueTestCase):
+
+    def importar(self, conteudo, lote=None):
+        return importacao.importar(io.BytesIO(conteudo.encode()), 'produtos.csv', usuario=self.usuario, lote=lote)
+
+    def test_cria_e_atualiza_pelo_codigo_de_barras(self):
+        resultado = self.importar(
+            'codigo_barras,nome,categoria,fornecedor,preco_custo,preco_venda,quantidade_estoque,estoque_minimo\n'
+            '7890000000001,Martelo Reforçado,ferramentas,Aço Forte,11.00,16.50,999,3\n'
+            '7890000000002,Alicate,Ferramentas,,4.00,6.00,8,10\n'
+            '7890000000003,Trena,FERRAMENTAS,aco forte,5.00,9.00,0,0\n',
+            lote=2,
+        )
+        self.assertEqual(
+            {chave: resultado[chave] for chave in ('total', 'criados', 'atualizados', 'rejeitados')},
+            {'total': 3, 'criados': 2, 'atualizados': 1, 'rejeitados': 0},
+        )
+
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.nome, 'Martelo Reforçado')
+        self.assertEqual(self.produto.nome_normalizado, 'martelo reforcado')
+        self.assertEqual(self.produto.preco_venda, Decimal('16.50'))
+        # O saldo de um produto existente só muda por movimentações
+        self.assertEqual(self.produto.quantidade_estoque, 5)
+        self.assertFalse(self.produto.em_estoque_baixo)
+
+        alicate = Produto.objects.get(codigo_barras='7890000000002')
+        self.assertIsNone(alicate.fornecedor)
+        self.assertTrue(alicate.em_estoque_baixo)
+        ajuste = alicate.movimentacoes.get()
+        self.assertEqual((ajuste.tipo, ajuste.quantidade, ajuste.saldo_anterior), ('A', 8, 0))
+        self.assertFalse(Produto.objects.get(codigo_barras='7890000000003').movimentacoes.exists())
+
+        self.categoria.refresh_from_db()
+        self.assertEqual(self.categoria.contador_produtos, 3)
+
+    def test_relata_erros_por_linha_e_grava_as_validas(self):
+        resultado = self.importar(
+            'codigo_barras;nome;categoria;fornecedor;preco_custo;preco_venda;estoque_minimo;ativo\n'
+            '111;Parafuso;Ferramentas;;0,10;0,25;-1;sim\n'
+            '222;Porca;Inexistente;Ninguém;1,00;0,50;2;talvez\n'
+            ';Arruela;Ferramentas;;0,05;0,10;0;não\n'
+            '333;Prego;Ferramentas;;0,01;0,02;0;não\n'
+            '333;Prego repetido;Ferramentas;;0,01;0,02;0;sim\n'
+        )
+        self.assertEqual((resultado['criados'], resultado['rejeitados']), (1, 4))
+        erros = {erro['linha']: erro['erros'] for erro in resultado['erros']}
+        self.assertEqual(set(erros[2]), {'estoque_minimo'})
+        self.assertEqual(set(erros[3]), {'categoria', 'fornecedor', 'preco_venda', 'ativo'})
+        self.assertEqual(set(erros[4]), {'codigo_barras'})
+        self.assertIn('linha 5', erros[6]['codigo_barras'])
+
+        prego = Produto.objects.get(codigo_barras='333')
+        self.assertEqual((prego.nome, prego.preco_custo, prego.ativo), ('Prego', Decimal('0.01'), False))
+
+    def test_nome_ambiguo_de_categoria_ou_fornecedor(self):
+        Categoria.objects.create(nome='Elétrica')
+        Categoria.objects.create(nome='Eletrica')
+        Fornecedor.objects.create(nome='aço forte')
+        resultado = self.importar(
+            'codigo_barras,nome,categoria,fornecedor,preco_custo,preco_venda\n'
+            '111,Fio,eletrica,Aço Forte,1.00,2.00\n'
+        )
+        self.assertEqual(resultado['rejeitados'], 1)
+        self.assertEqual(resultado['erros'][0]['erros'], {
+            'categoria': 'Há mais de uma categoria chamada "eletrica".',
+            'fornecedor': 'Há mais de um fornecedor chamado "Aço Forte".',
+        })
+
+    def test_colunas_obrigatorias(self):
+        with self.assertRaisesMessage(ValueError, 'preco_custo, preco_venda'):
+            self.importar('codigo_barras,nome,categoria\n1,A,Ferramentas\n')
+
+    def test_endpoint_invalida_caches(self):
+        self.assertEqual(self.client.get('/api/v1/produtos/codigo-barras/7890000000001/').data['nome'], 'Martelo')
+        arquivo = SimpleUploadedFile(
+            'catalogo.csv',
+            'codigo_barras,nome,categoria,preco_custo,preco_venda\n7890000000001,Marreta,Ferramentas,10,20\n'.encode(),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            resposta = self.client.post('/api/v1/produtos/importar/', {'arquivo': arquivo}, format='multipart')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.data['atualizados'], 1)
+        self.assertEqual(self.client.get('/api/v1/produtos/codigo-barras/7890000000001/').data['nome'], 'Marreta')
+
+        invalido = SimpleUploadedFile('catalogo.txt', b'x')
+        resposta = self.client.post('/api/v1/produtos/importar/', {'arquivo': invalido}, format='multipart')
+        self.assertEqual(resposta.status_code, 400)
+
+
+class TarefasTests(EstoqueTestCase):
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        configuracao = self.settings(MEDIA_ROOT=media)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def test_exportacao_assincrona(self):
+        resposta = self.client.get('/api/v1/exportar/produtos/', {'assincrono': 'true', 'busca': 'mart'})
+        self.assertEqual(resposta.status_code, 202)
+        self.assertEqual(resposta.data['status'], 'pendente')
+        self.assertEqual(resposta.data['parametros'], {'formato': 'csv', 'filtros': {'busca': 'mart'}})
+
+        self.assertEqual(tarefas.processar_pendentes(), 1)
+        tarefa = self.client.get(f"/api/v1/tarefas/{resposta.data['id']}/").data
+        self.assertEqual(tarefa['status'], 'concluida')
+
+        arquivo = self.client.get(tarefa['arquivo_url'])
+        conteudo = b''.join(arquivo.streaming_content).decode()
+        self.assertEqual(conteudo.splitlines()[1].split(',')[1], 'Martelo')
+        self.assertEqual(tarefa['resultado'], {'bytes': len(conteudo.encode())})
+
+    def test_importacao_assincrona(self):
+        arquivo = SimpleUploadedFile(
+            'catalogo.csv',
+            'codigo_barras,nome,categoria,preco_custo,preco_venda\n123,Serrote,Ferramentas,10,20\n'.encode(),
+        )
+        resposta = self.client.post(
+            '/api/v1/produtos/importar/?assincrono=true', {'arquivo': arquivo}, format='multipart'
+        )
+        self.assertEqual(resposta.status_code, 202)
+        self.assertFalse(Produto.objects.filter(codigo_barras='123').exists())
+
+        tarefas.processar_pendentes()
+        tarefa = Tarefa.objects.get(pk=resposta.data['id'])
+        self.assertEqual(tarefa.resultado['criados'], 1)
+        self.assertTrue(Produto.objects.filter(codigo_barras='123').exists())
+
+    def test_falha_fica_registrada(self):
+        tarefa = tarefas.enfileirar('exportar_produtos', {'formato': 'xml'}, usuario=self.usuario)
+        with self.assertLogs('app_estoque.tarefas', 'ERROR'):
+            tarefas.processar_pendentes()
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, Tarefa.Status.FALHOU)
+        self.assertIn('formato', tarefa.erro)
+        self.assertIsNotNone(tarefa.concluida_em)
+
+    def test_validacao_e_permissoes(self):
+        resposta = self.client.post('/api/v1/tarefas/', {'tipo': 'inexistente'}, format='json')
+        self.assertEqual(resposta.status_code, 400)
+        resposta = self.client.post(
+            '/api/v1/tarefas/', {'tipo': 'exportar_produtos', 'parametros': {'x': 1}}, format='json'
+        )
+        self.assertEqual(resposta.status_code, 400)
+        resposta = self.client.post('/api/v1/tarefas/', {'tipo': 'recalcular_contadores'}, format='json')
+        self.assertEqual(resposta.status_code, 403)
+
+        # Tarefas de outro usuário não aparecem
+        outro = User.objects.create_user(username='outro', password='senha123')
+        alheia = tarefas.enfileirar('exportar_produtos', usuario=outro)
+        self.assertEqual(self.client.get(f'/api/v1/tarefas/{alheia.pk}/').status_code, 404)
+        self.assertEqual(self.client.get('/api/v1/tarefas/').data['count'], 0)
+
+    def test_reserva_e_interrompidas(self):
+        primeira = tarefas.enfileirar('recalcular_contadores')
+        tarefas.enfileirar('recalcular_contadores')
+        reservada = tarefas.reservar()
+        self.assertEqual(reservada.pk, primeira.pk)
+        self.assertEqual(reservada.status, Tarefa.Status.EXECUTANDO)
+        self.assertNotEqual(tarefas.reservar().pk, primeira.pk)
+        self.assertIsNone(tarefas.reservar())
+
+        Tarefa.objects.filter(pk=primeira.pk).update(iniciada_em=timezone.now() - timedelta(hours=2))
+        self.assertEqual(tarefas.marcar_interrompidas(), 1)
+        self.assertEqual(Tarefa.objects.get(pk=primeira.pk).status, Tarefa.Status.FALHOU)
+
+        # A execução que termina depois não desfaz a marcação
+        with self.assertLogs('app_estoque.tarefas', 'WARNING'):
+            tarefas.executar(reservada)
+        self.assertEqual(reservada.status, Tarefa.Status.FALHOU)
+        self.assertEqual(Tarefa.objects.get(pk=primeira.pk).status, Tarefa.Status.FALHOU)
+
+
+class ConsistenciaEstoqueTests(EstoqueTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Histórico do martelo: ajuste para 5 depois de entradas antigas, depois +3 e -2
+        Produto.objects.filter(pk=self.produto.pk).update(quantidade_estoque=0)
+        for tipo, quantidade in (('E', 10), ('A', 5), ('E', 3), ('S', 2)):
+            movimentar(self.produto, tipo, quantidade)
+        self.produto.refresh_from_db()
+
+    def test_saldo_coerente_nao_diverge(self):
+        self.assertEqual(self.produto.quantidade_estoque, 6)
+        self.assertEqual(consistencia.verificar(), [])
+
+    def test_detecta_e_repara_divergencias(self):
+        # Movimentação apagada direto na tabela e produto cadastrado com saldo
+        MovimentacaoEstoque.objects.filter(produto=self.produto, tipo='S').delete()
+        sem_historico, = self.criar_produtos(1)
+
+        divergencias = {d['produto']: d for d in consistencia.verificar()}
+        self.assertEqual(
+            (divergencias[self.produto.pk]['saldo_atual'], divergencias[self.produto.pk]['saldo_esperado']),
+            (6, 8),
+        )
+        self.assertEqual(divergencias[sem_historico.pk]['movimentacoes'], 0)
+
+        self.assertEqual(consistencia.reparar(list(divergencias.values()), lote=1), 2)
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.quantidade_estoque, 8)
+        self.assertTrue(self.produto.em_estoque_baixo)  # mínimo 10
+        # O produto sem histórico mantém o saldo e ganha o ajuste inicial
+        ajuste = sem_historico.movimentacoes.get()
+        self.assertEqual((ajuste.tipo, ajuste.quantidade), ('A', 20))
+        self.assertEqual(consistencia.verificar(), [])
+
+    def test_historico_negativo_e_zerado_com_ajuste(self):
+        # Só a saída de 2 sobra no histórico: o saldo esperado fica negativo
+        MovimentacaoEstoque.objects.filter(produto=self.produto).exclude(tipo='S').delete()
+        divergencia, = consistencia.verificar()
+        self.assertEqual(divergencia['saldo_esperado'], -2)
+
+        self.assertEqual(consistencia.reparar([divergencia]), 1)
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.quantidade_estoque, 0)
+        ajuste = self.produto.movimentacoes.latest('id')
+        self.assertEqual((ajuste.tipo, ajuste.quantidade, ajuste.saldo_anterior), ('A', 0, 6))
+        self.assertEqual(consistencia.verificar(), [])
+
+    def test_reparo_ignora_produto_que_ja_foi_corrigido(self):
+        Produto.objects.filter(pk=self.produto.pk).update(quantidade_estoque=50)
+        divergencias = consistencia.verificar()
+        Produto.objects.filter(pk=self.produto.pk).update(quantidade_estoque=6)
+        self.assertEqual(consistencia.reparar(divergencias), 0)
+
+    def test_api_apenas_administradores(self):
+        Produto.objects.filter(pk=self.produto.pk).update(quantidade_estoque=50)
+        self.assertEqual(self.client.get('/api/v1/estoque/consistencia/').status_code, 403)
+
+        self.usuario.is_superuser = True
+        self.usuario.save()
+        resposta = self.client.get('/api/v1/estoque/consistencia/')
+        self.assertEqual((resposta.data['total'], resposta.data['reparados']), (1, 0))
+
+        resposta = self.client.post('/api/v1/estoque/consistencia/?assincrono=true')
+        self.assertEqual(resposta.status_code, 202)
+        tarefas.processar_pendentes()
+        self.assertEqual(Tarefa.objects.get(pk=resposta.data['id']).resultado['reparados'], 1)
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.quantidade_estoque, 6)
+
+
+class ArquivoMovimentacoesTests(EstoqueTestCase):
+    """Movimentações antigas movidas para MovimentacaoArquivada (arquivo.py)"""
+
+    def setUp(self):
+        super().setUp()
+        # Duas movimentações de dois anos atrás (a última é um ajuste) e duas de hoje
+        Produto.objects.filter(pk=self.produto.pk).update(quantidade_estoque=0)
+        self.antigas = [movimentar(self.produto, tipo, quantidade).pk for tipo, quantidade in (('E', 10), ('A', 5))]
+        self.dia_antigo = timezone.localdate() - timedelta(days=730)
+        MovimentacaoEstoque.objects.filter(pk__in=self.antigas).update(
+            data_hora=timezone.make_aware(datetime.combine(self.dia_antigo, time(12)))
+        )
+        movimentar(self.produto, 'E', 3)
+        movimentar(self.produto, 'S', 2)
+
+    def conteudo(self, resposta):
+        return b''.join(resposta.streaming_content).decode('utf-8').splitlines()
+
+    def test_arquiva_so_o_que_passou_do_horizonte(self):
+        self.assertEqual(arquivo.arquivar(lote=1), 2)
+        self.assertEqual(sorted(MovimentacaoArquivada.objects.values_list('id', flat=True)), self.antigas)
+        self.assertEqual(MovimentacaoEstoque.objects.count(), 2)
+        self.assertEqual(arquivo.arquivar(), 0)
+        # A API de movimentações lê só a tabela quente
+        self.assertEqual(len(self.client.get('/api/v1/movimentacoes/').data['results']), 2)
+
+    def test_historico_e_consistencia_leem_o_arquivo(self):
+        arquivo.arquivar()
+        # O último ajuste (arquivado) continua valendo: 5 + 3 - 2
+        self.assertEqual(consistencia.verificar(), [])
+        Produto.objects.filter(pk=self.produto.pk).update(quantidade_estoque=1)
+        self.assertEqual(consistencia.verificar()[0]['saldo_esperado'], 6)
+
+        historico.consolidar()
+        self.assertEqual(historico.saldos_em(self.dia_antigo, [self.produto.pk]).get().saldo, 5)
+        self.assertEqual(historico.saldos_em(timezone.localdate(), [self.produto.pk]).get().saldo, 6)
+
+    def test_exportacao_inclui_o_arquivo_quando_o_periodo_alcanca(self):
+        arquivo.arquivar()
+        url = '/api/v1/exportar/movimentacoes/'
+        self.assertEqual(len(self.conteudo(self.client.get(url))), 5)
+        self.assertEqual(len(self.conteudo(self.client.get(url, {'incluir_arquivo': 'false'}))), 3)
+        recentes = self.client.get(url, {'data_inicio': timezone.localdate().isoformat()})
+        self.assertEqual(len(self.conteudo(recentes)), 3)
+        antigas = self.client.get(url, {'data_inicio': self.dia_antigo.isoformat(), 'tipo': 'A'})
+        self.assertEqual([linha.split(',')[0] for linha in self.conteudo(antigas)[1:]], [str(self.antigas[1])])
+
+
+class AlertasEstoqueTests(EstoqueTestCase):
+    """Alertas abertos e resolvidos por tudo que faz um produto cruzar o mínimo (alertas.py)"""
+
+    def setUp(self):
+        super().setUp()
+        self.parafuso, = self.criar_produtos(1, estoque_minimo=10)
+
+    def test_saida_que_cruza_o_minimo_abre_e_entrada_resolve(self):
+        # Movimentação que não cruza o limite não toca a tabela de alertas
+        with CaptureQueriesContext(connection) as consultas:
+            movimentar(self.parafuso, 'S', 5)
+        self.assertFalse([c for c in consultas if AlertaEstoque._meta.db_table in c['sql']])
+        self.assertFalse(AlertaEstoque.objects.filter(produto=self.parafuso).exists())
+
+        movimentar(self.parafuso, 'S', 8)
+        movimentar(self.parafuso, 'S', 1)
+        alerta = AlertaEstoque.objects.get(produto=self.parafuso)
+        self.assertEqual((alerta.saldo, alerta.estoque_minimo, alerta.resolvido_em), (7, 10, None))
+
+        movimentar(self.parafuso, 'E', 10)
+        alerta.refresh_from_db()
+        self.assertIsNotNone(alerta.resolvido_em)
+
+    def test_lote_e_ajuste_tambem_geram_alertas(self):
+        aplicar_lote([
+            {'produto': self.parafuso.pk, 'tipo': 'S', 'quantidade': 15},
+            {'produto': self.produto.pk, 'tipo': 'E', 'quantidade': 1},
+        ])
+        # Martelo já tinha alerta desde o cadastro e a entrada não o tirou do mínimo
+        self.assertEqual(
+            list(AlertaEstoque.objects.order_by('produto_id').values_list('produto_id', 'saldo')),
+            [(self.produto.pk, 5), (self.parafuso.pk, 5)],
+        )
+
+        abertos = AlertaEstoque.objects.filter(produto=self.parafuso, resolvido_em__isnull=True)
+        movimentar(self.parafuso, 'A', 30)
+        self.assertFalse(abertos.exists())
+        movimentar(self.parafuso, 'A', 2)
+        self.assertEqual(abertos.get().saldo, 2)
+
+    def test_cadastro_importacao_reparo_e_reconstrucao_tambem_geram_alertas(self):
+        abertos = AlertaEstoque.objects.filter(resolvido_em__isnull=True)
+        # Martelo foi cadastrado com 5 e mínimo 10
+        self.assertEqual(list(abertos.values_list('produto_id', 'saldo')), [(self.produto.pk, 5)])
+
+        produto = Produto.objects.get(pk=self.produto.pk)
+        produto.estoque_minimo = 3
+        produto.save()
+        self.assertFalse(abertos.exists())
+
+        importacao.importar(
+            io.BytesIO('codigo_barras,nome,categoria,preco_custo,preco_venda,estoque_minimo\n'
+                       '7890000000001,Martelo,Ferramentas,10,15,8\n'.encode()),
+            'produtos.csv', usuario=self.usuario,
+        )
+        self.assertEqual(list(abertos.values_list('produto_id', flat=True)), [self.produto.pk])
+
+        # Saldo do parafuso (20, sem histórico) corrigido para o histórico: 4
+        movimentar(self.parafuso, 'A', 4)
+        Produto.objects.filter(pk=self.parafuso.pk).update(quantidade_estoque=20, em_estoque_baixo=False)
+        consistencia.reparar(consistencia.verificar([self.parafuso.pk]))
+        self.assertEqual(abertos.get(produto=self.parafuso).saldo, 4)
+
+        Produto.objects.filter(pk=self.produto.pk).update(quantidade_estoque=50)
+        reconstruir_estoque_baixo()
+        self.assertEqual(list(abertos.values_list('produto_id', flat=True)), [self.parafuso.pk])
+
+    def test_feed_e_sugestao_de_reposicao(self):
+        movimentar(self.parafuso, 'S', 15)
+
+        resposta = self.client.get('/api/v1/alertas/', {'abertos': 'true', 'fornecedor': self.fornecedor.pk})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(
+            [(a['produto'], a['fornecedor_nome'], a['saldo']) for a in resposta.data['results']],
+            [(self.parafuso.pk, 'Aço Forte', 5), (self.produto.pk, 'Aço Forte', 5)],
+        )
+        self.assertEqual(self.client.get('/api/v1/alertas/', {'abertos': 'false'}).data['results'], [])
+
+        # Martelo: 5 de mínimo 10, sem saídas -> 5; parafuso: 15 saídas em 30 dias,
+        # cobertura de 30 dias -> mínimo 10 + 15 - saldo 5 = 20
+        grupo, = self.client.get('/api/v1/alertas/reposicao/').data
+        self.assertEqual(
+            {item['produto']: item['quantidade_sugerida'] for item in grupo['itens']},
+            {self.produto.pk: 5, self.parafuso.pk: 20},
+        )
+        self.assertEqual((grupo['fornecedor'], grupo['quantidade_total']), (self.fornecedor.pk, 25))
+        self.assertEqual(grupo['custo_estimado'], Decimal('100.00'))
+
+        resposta = self.client.get('/api/v1/alertas/reposicao/', {'dias': 'trinta'})
+        self.assertEqual(resposta.status_code, 400)
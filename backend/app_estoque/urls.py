@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework import routers
 from rest_framework_simplejwt.views import TokenRefreshView
@@ -10,6 +11,8 @@ from .views import (
     MovimentacaoEstoqueViewSet,
     UserViewSet,
     CategoriaViewSet,
+    TarefaViewSet,
+    AlertaEstoqueViewSet,
     
     # Views de Autenticação e Usuários (Personalizadas)
     CustomTokenObtainPairView, # A classe que corrigimos
@@ -23,9 +26,19 @@ from .views import (
     # Utilitários e Relatórios
     health_check,
     test_cors,
-    estatisticas_view
+    estatisticas_view,
+    exportar_produtos,
+    exportar_movimentacoes,
+    relatorio_saldos,
+    relatorio_movimentacao_diaria,
+    consistencia_estoque
 )
 
+# Em ASGI, os endpoints de leitura mais acessados usam as versões assíncronas
+if getattr(settings, 'ESTOQUE_VIEWS_ASYNC', False):
+    from . import views_async
+    from .views_async import health_check, me_view, estatisticas_view
+
 # 1. Definir o Roteador (Gera as rotas padrões automaticamente)
 router = routers.DefaultRouter()
 router.register(r'users', UserViewSet, basename='user')
@@ -33,6 +46,8 @@ router.register(r'produtos', ProdutoViewSet, basename='produto')
 router.register(r'fornecedores', FornecedorViewSet, basename='fornecedor')
 router.register(r'movimentacoes', MovimentacaoEstoqueViewSet, basename='movimentacao')
 router.register(r'categorias', CategoriaViewSet, basename='categoria')
+router.register(r'tarefas', TarefaViewSet, basename='tarefa')
+router.register(r'alertas', AlertaEstoqueViewSet, basename='alerta')
 
 # 2. Definir as Rotas
 urlpatterns = [
@@ -63,6 +78,11 @@ urlpatterns = [
     # ROTAS PADRÃO DO ROUTER (ViewSets)
     # ==========================================================================
     # Isso cuida de /users/, /users/1/, /produtos/, etc.
+    *([
+        # Leituras assíncronas de produto (ASGI) antes das rotas do router
+        path('produtos/<int:pk>/', views_async.produto_detalhe),
+        path('produtos/codigo-barras/<str:codigo>/', views_async.produto_codigo_barras),
+    ] if getattr(settings, 'ESTOQUE_VIEWS_ASYNC', False) else []),
     path('', include(router.urls)),
 
     # ==========================================================================
@@ -71,6 +91,11 @@ urlpatterns = [
     path('health/', health_check, name='health_check'),
     path('test-cors/', test_cors, name='test_cors'),
     path('estatisticas/', estatisticas_view, name='estatisticas'),
+    path('exportar/produtos/', exportar_produtos, name='exportar_produtos'),
+    path('exportar/movimentacoes/', exportar_movimentacoes, name='exportar_movimentacoes'),
+    path('relatorios/saldos/', relatorio_saldos, name='relatorio_saldos'),
+    path('relatorios/movimentacao-diaria/', relatorio_movimentacao_diaria, name='relatorio_movimentacao_diaria'),
+    path('estoque/consistencia/', consistencia_estoque, name='consistencia_estoque'),
 
     # ==========================================================================
     # AÇÕES PERSONALIZADAS DE PRODUTOS
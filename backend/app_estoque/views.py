@@ -1,26 +1,44 @@
-from rest_framework import viewsets, status
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework import mixins, viewsets, status, serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.parsers import MultiPartParser
 
-from django.db.models import F, Count, Sum
-from django.db import transaction
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.contrib.auth.models import User
-from django.contrib.auth.hashers import make_password
+from django.conf import settings
 from django.utils import timezone
+from django.http import FileResponse, StreamingHttpResponse
 
-from .models import Categoria, Fornecedor, Produto, MovimentacaoEstoque
+from .models import AlertaEstoque, Categoria, Fornecedor, Produto, MovimentacaoEstoque, Tarefa
+from .autenticacao import CachedJWTAuthentication
+from .estatisticas import obter_estatisticas
+from .contadores import anotar_total_produtos
+from .estoque import aplicar_lote, movimentar, LoteInvalido
+from . import exportacao
+from .pagination import AlertaPagination, KeysetPagination
+from .filtros import filtrar_produtos
+from . import codigo_barras
+from . import alertas, consistencia, filtros, historico, importacao, tarefas
+from .replica import LeituraEmReplicaMixin, alias_leitura, ler_da_replica
+from .condicional import ESTOQUE, ETagMixin
 from .serializers import (
+    AlertaEstoqueSerializer,
     CategoriaSerializer,
     FornecedorSerializer,
     ProdutoSerializer,
     MovimentacaoEstoqueSerializer,
     MovimentacaoActionSerializer,
+    MovimentacaoLoteSerializer,
     UserSerializer,
-    RegisterSerializer
+    RegisterSerializer,
+    ProdutoListaEnxuta,
+    TarefaSerializer,
+    produtos_para_leitura,
 )
 
 # ==============================================================================
@@ -58,7 +76,7 @@ class CustomTokenObtainPairView(TokenObtainPairView):
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all().order_by('id') 
     serializer_class = UserSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
@@ -275,49 +293,137 @@ def test_cors(request):
 # 3. VIEWSETS DO APLICATIVO (ESTOQUE)
 # ==============================================================================
 
-class CategoriaViewSet(viewsets.ModelViewSet):
+class CategoriaViewSet(ETagMixin, LeituraEmReplicaMixin, viewsets.ModelViewSet):
     queryset = Categoria.objects.all()
     serializer_class = CategoriaSerializer
-    authentication_classes = [JWTAuthentication]
+    tabelas_etag = ('categoria', 'produto')
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
-class FornecedorViewSet(viewsets.ModelViewSet):
+    def get_queryset(self):
+        """Traz o total de produtos de cada categoria na mesma consulta"""
+        return anotar_total_produtos(super().get_queryset())
+
+class FornecedorViewSet(ETagMixin, LeituraEmReplicaMixin, viewsets.ModelViewSet):
     queryset = Fornecedor.objects.all()
     serializer_class = FornecedorSerializer
-    authentication_classes = [JWTAuthentication]
+    tabelas_etag = ('fornecedor', 'produto')
+    acoes_de_leitura = ('list', 'retrieve', 'ativos')
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        """Traz o total de produtos de cada fornecedor na mesma consulta"""
+        return anotar_total_produtos(super().get_queryset())
     
     @action(detail=False, methods=['get'])
     def ativos(self, request):
         """Lista apenas fornecedores ativos"""
-        fornecedores = Fornecedor.objects.filter(ativo=True)
+        fornecedores = self.get_queryset().filter(ativo=True)
         serializer = self.get_serializer(fornecedores, many=True)
         return Response(serializer.data)
 
-class ProdutoViewSet(viewsets.ModelViewSet):
-    queryset = Produto.objects.all()
+class ProdutoViewSet(ETagMixin, LeituraEmReplicaMixin, viewsets.ModelViewSet):
+    # categoria_nome e fornecedor_nome são serializados em toda linha
+    queryset = Produto.objects.select_related('categoria', 'fornecedor')
     serializer_class = ProdutoSerializer
-    authentication_classes = [JWTAuthentication]
+    tabelas_etag = ('produto', 'categoria', 'fornecedor', ESTOQUE)
+    acoes_de_leitura = ('list', 'retrieve', 'estoque_baixo')
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
-    def get_queryset(self):
-        """Filtra produtos ativos por padrão"""
-        queryset = super().get_queryset()
-        ativo = self.request.query_params.get('ativo', 'true')
+    @classmethod
+    def consultar(cls, params):
+        """Filtra produtos ativos por padrão e aplica os filtros de busca (ver filtros.py)"""
+        queryset = cls.queryset.all()
+        ativo = params.get('ativo', 'true')
         if ativo.lower() == 'true':
             queryset = queryset.filter(ativo=True)
-        return queryset
+        try:
+            return filtrar_produtos(queryset, params)
+        except ValueError as ve:
+            raise ValidationError({"detalhe": str(ve)})
+
+    def get_queryset(self):
+        # Compartilhado com a leitura assíncrona de views_async.py
+        return self.consultar(self.request.query_params)
     
+    def _leitura_enxuta(self):
+        """Listagem montada de .values() (ver serializers.serializar_produtos)"""
+        return self.action == 'list' and getattr(settings, 'ESTOQUE_LEITURA_ENXUTA', True)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self._leitura_enxuta():
+            return produtos_para_leitura(queryset)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        if self._leitura_enxuta() and kwargs.get('many'):
+            return ProdutoListaEnxuta(*args)
+        return super().get_serializer(*args, **kwargs)
+
     @action(detail=False, methods=['get'])
     def estoque_baixo(self, request):
         """Lista produtos com estoque abaixo do mínimo"""
-        produtos = Produto.objects.filter(
-            quantidade_estoque__lt=F('estoque_minimo'),
+        # Lê a marca mantida pelo serviço de estoque (indexada), sem comparar colunas
+        produtos = Produto.objects.select_related('categoria', 'fornecedor').filter(
+            em_estoque_baixo=True,
             ativo=True
         )
         serializer = self.get_serializer(produtos, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'], url_path=r'codigo-barras/(?P<codigo>[^/]+)')
+    def codigo_barras(self, request, codigo=None):
+        """Consulta rápida por código de barras (leitores do caixa)"""
+        dados = codigo_barras.resolver([codigo]).get(codigo)
+        if dados is None:
+            return Response({"detalhe": "Produto não encontrado."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(dados)
+
+    @action(detail=False, methods=['post'], url_path='codigo-barras')
+    def codigos_barras(self, request):
+        """Resolve vários códigos de barras em uma única requisição"""
+        codigos = request.data.get('codigos')
+        limite = getattr(settings, 'ESTOQUE_LOTE_MAXIMO', 1000)
+        if not isinstance(codigos, list) or not all(isinstance(c, str) for c in codigos):
+            return Response(
+                {"codigos": ["Informe uma lista de códigos de barras."]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(codigos) > limite:
+            return Response(
+                {"codigos": [f"Envie no máximo {limite} códigos por requisição."]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        encontrados = codigo_barras.resolver(codigos)
+        return Response({
+            "encontrados": encontrados,
+            "nao_encontrados": [c for c in dict.fromkeys(codigos) if c not in encontrados],
+        })
+
+    @action(detail=False, methods=['post'], url_path='importar', parser_classes=[MultiPartParser])
+    def importar(self, request):
+        """Cria ou atualiza produtos a partir de um CSV/XLSX (campo 'arquivo'; ?assincrono=true enfileira)"""
+        arquivo = request.FILES.get('arquivo')
+        if arquivo is None:
+            return Response(
+                {"arquivo": ["Envie o arquivo CSV ou XLSX no campo 'arquivo'."]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if _assincrono(request):
+            caminho = tarefas.salvar_entrada(arquivo)
+            return _tarefa_aceita(request, tarefas.enfileirar(
+                'importar_produtos', {'arquivo': caminho}, usuario=request.user
+            ))
+        try:
+            resultado = importacao.importar(arquivo, arquivo.name, usuario=request.user)
+        except ValueError as ve:
+            return Response({"detalhe": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(resultado)
+
     def _realizar_movimentacao(self, request, pk, tipo_movimentacao_const):
         """Função auxiliar para realizar movimentações de estoque"""
         produto = self.get_object()
@@ -326,38 +432,30 @@ class ProdutoViewSet(viewsets.ModelViewSet):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        quantidade = serializer.validated_data['quantidade']
+        dados = serializer.validated_data
 
         try:
-            with transaction.atomic():
-                MovimentacaoEstoque.objects.create(
-                    produto=produto,
-                    tipo=tipo_movimentacao_const,
-                    quantidade=quantidade,
-                    usuario=request.user
-                )
-                
-                if tipo_movimentacao_const == MovimentacaoEstoque.TipoMovimentacao.ENTRADA:
-                    produto.quantidade_estoque = F('quantidade_estoque') + quantidade
-                else: # SAIDA
-                    if produto.quantidade_estoque < quantidade:
-                        raise ValueError("Estoque insuficiente para a saída solicitada.")
-                    produto.quantidade_estoque = F('quantidade_estoque') - quantidade
-                
-                produto.save()
-                produto.refresh_from_db()
-                
-                produto_serializer = self.get_serializer(produto)
-                return Response(produto_serializer.data, status=status.HTTP_200_OK)
-        
-        except ValueError as ve:
-            return Response({"detalhe": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+            movimentar(
+                produto,
+                tipo_movimentacao_const,
+                dados['quantidade'],
+                usuario=request.user,
+                motivo=dados.get('motivo') or None,
+                numero_documento=dados.get('numero_documento') or None,
+                observacao=dados.get('observacao') or None,
+            )
+        except DjangoValidationError as ve:
+            return Response({"detalhe": ve.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {"detalhe": f"Erro interno ao processar a movimentação: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+        # O serviço já atualizou o saldo da instância, sem precisar reler o produto
+        produto_serializer = self.get_serializer(produto)
+        return Response(produto_serializer.data, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=['post'], url_path='dar-entrada')
     def dar_entrada(self, request, pk=None):
         return self._realizar_movimentacao(request, pk, MovimentacaoEstoque.TipoMovimentacao.ENTRADA)
@@ -366,10 +464,13 @@ class ProdutoViewSet(viewsets.ModelViewSet):
     def dar_saida(self, request, pk=None):
         return self._realizar_movimentacao(request, pk, MovimentacaoEstoque.TipoMovimentacao.SAIDA)
 
-class MovimentacaoEstoqueViewSet(viewsets.ModelViewSet):
-    queryset = MovimentacaoEstoque.objects.all().order_by('-data_hora')
+class MovimentacaoEstoqueViewSet(LeituraEmReplicaMixin, viewsets.ModelViewSet):
+    # produto_nome, usuario_nome e valor_total dependem das relações
+    queryset = MovimentacaoEstoque.objects.select_related('produto', 'usuario').order_by('-data_hora', '-id')
     serializer_class = MovimentacaoEstoqueSerializer
-    authentication_classes = [JWTAuthentication]
+    # A tabela só cresce: paginação por (data_hora, id) em vez de OFFSET
+    pagination_class = KeysetPagination
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
@@ -382,7 +483,142 @@ class MovimentacaoEstoqueViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         """Associa o usuário atual à movimentação"""
-        serializer.save(usuario=self.request.user)
+        try:
+            serializer.save(usuario=self.request.user)
+        except DjangoValidationError as ve:
+            raise serializers.ValidationError({'quantidade': ve.messages})
+
+    @action(detail=False, methods=['post'], url_path='lote')
+    def lote(self, request):
+        """Aplica várias entradas/saídas/ajustes em uma única transação"""
+        serializer = MovimentacaoLoteSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            resultados = aplicar_lote(serializer.validated_data['itens'], usuario=request.user)
+        except LoteInvalido as erro:
+            return Response(
+                {"detalhe": "Nenhuma movimentação foi aplicada.", "erros": erro.erros},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(
+            {"total": len(resultados), "resultados": resultados},
+            status=status.HTTP_201_CREATED
+        )
+
+# ==============================================================================
+# ALERTAS DE ESTOQUE BAIXO (ver alertas.py)
+# ==============================================================================
+
+class AlertaEstoqueViewSet(LeituraEmReplicaMixin, viewsets.ReadOnlyModelViewSet):
+    # produto_nome e fornecedor_nome são serializados em toda linha
+    queryset = AlertaEstoque.objects.select_related('produto', 'produto__fornecedor').order_by('-criado_em', '-id')
+    serializer_class = AlertaEstoqueSerializer
+    # Feed que só cresce: paginação por (criado_em, id), como o histórico
+    pagination_class = AlertaPagination
+    acoes_de_leitura = ('list', 'retrieve', 'reposicao')
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        """Filtros: abertos (true/false), produto e fornecedor"""
+        queryset = super().get_queryset()
+        abertos = self.request.query_params.get('abertos')
+        if abertos:
+            queryset = queryset.filter(resolvido_em__isnull=abertos.lower() == 'true')
+        try:
+            produto = filtros.inteiro(self.request.query_params, 'produto')
+            fornecedor = filtros.inteiro(self.request.query_params, 'fornecedor')
+        except ValueError as ve:
+            raise ValidationError({"detalhe": str(ve)})
+        if produto:
+            queryset = queryset.filter(produto_id=produto)
+        if fornecedor:
+            queryset = queryset.filter(produto__fornecedor_id=fornecedor)
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    def reposicao(self, request):
+        """Sugestão de compra por fornecedor (filtros: fornecedor, dias, cobertura)"""
+        try:
+            parametros = {
+                nome: filtros.inteiro(request.query_params, nome)
+                for nome in ('fornecedor', 'dias', 'cobertura')
+            }
+        except ValueError as ve:
+            return Response({"detalhe": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+        if any(valor is not None and valor <= 0 for valor in parametros.values()):
+            return Response(
+                {"detalhe": "Os parâmetros devem ser números positivos."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(alertas.sugestoes_reposicao(**parametros))
+
+# ==============================================================================
+# TAREFAS EM SEGUNDO PLANO (ver tarefas.py)
+# ==============================================================================
+
+def _assincrono(request):
+    return request.query_params.get('assincrono', '').lower() == 'true'
+
+def _tarefa_aceita(request, tarefa):
+    """202 com a tarefa enfileirada; o cliente acompanha em /tarefas/<id>/"""
+    return Response(
+        TarefaSerializer(tarefa, context={'request': request}).data,
+        status=status.HTTP_202_ACCEPTED
+    )
+
+class TarefaViewSet(mixins.CreateModelMixin,
+                    mixins.ListModelMixin,
+                    mixins.RetrieveModelMixin,
+                    viewsets.GenericViewSet):
+    queryset = Tarefa.objects.select_related('usuario')
+    serializer_class = TarefaSerializer
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        """Cada usuário vê as próprias tarefas; superusers veem todas (filtros: status, tipo)"""
+        queryset = super().get_queryset()
+        if not self.request.user.is_superuser:
+            queryset = queryset.filter(usuario=self.request.user)
+        for campo in ('status', 'tipo'):
+            valor = self.request.query_params.get(campo)
+            if valor:
+                queryset = queryset.filter(**{campo: valor})
+        return queryset
+
+    def create(self, request, *args, **kwargs):
+        """Enfileira uma tarefa: {"tipo": "...", "parametros": {...}}"""
+        tipo = request.data.get('tipo')
+        parametros = request.data.get('parametros') or {}
+        if not isinstance(parametros, dict):
+            return Response(
+                {"parametros": ["Informe um objeto com os parâmetros da tarefa."]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if tipo in tarefas.REGISTRO and not tarefas.pode_enfileirar(request.user, tipo):
+            return Response(
+                {"detalhe": "Apenas administradores podem executar esta tarefa."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        try:
+            tarefa = tarefas.enfileirar(tipo, parametros, usuario=request.user)
+        except ValueError as ve:
+            return Response({"detalhe": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+        return _tarefa_aceita(request, tarefa)
+
+    @action(detail=True, methods=['get'])
+    def arquivo(self, request, pk=None):
+        """Baixa o arquivo gerado pela tarefa (exportações)"""
+        tarefa = self.get_object()
+        if not tarefa.arquivo:
+            return Response({"detalhe": "Esta tarefa não gerou arquivo."}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(
+            tarefa.arquivo.open('rb'), as_attachment=True, filename=tarefa.arquivo.name.rsplit('/', 1)[-1]
+        )
 
 # ==============================================================================
 # 4. VIEWS DE RELATÓRIOS
@@ -390,34 +626,117 @@ class MovimentacaoEstoqueViewSet(viewsets.ModelViewSet):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@ler_da_replica
 def estatisticas_view(request):
     """Retorna estatísticas gerais do sistema"""
-    hoje = timezone.now().date()
-    
-    total_produtos = Produto.objects.filter(ativo=True).count()
-    total_categorias = Categoria.objects.count()
-    total_fornecedores = Fornecedor.objects.filter(ativo=True).count()
-    
-    # Calcula valor total do estoque
-    produtos = Produto.objects.filter(ativo=True)
-    valor_total_estoque = sum(p.quantidade_estoque * p.preco_custo for p in produtos)
-    
-    # Produtos com estoque baixo
-    produtos_estoque_baixo = Produto.objects.filter(
-        quantidade_estoque__lt=F('estoque_minimo'),
-        ativo=True
-    ).count()
-    
-    # Movimentações hoje
-    movimentacoes_hoje = MovimentacaoEstoque.objects.filter(
-        data_hora__date=hoje
-    ).count()
-    
-    return Response({
-        'total_produtos': total_produtos,
-        'total_categorias': total_categorias,
-        'total_fornecedores': total_fornecedores,
-        'valor_total_estoque': valor_total_estoque,
-        'produtos_estoque_baixo': produtos_estoque_baixo,
-        'movimentacoes_hoje': movimentacoes_hoje,
-    })
\ No newline at end of file
+    return Response(obter_estatisticas())
+
+
+def _resposta_exportacao(request, nome, filtrar, colunas):
+    """Monta o StreamingHttpResponse de uma exportação (ou a enfileira com ?assincrono=true)"""
+    formato = request.query_params.get('formato', 'csv')
+    if formato not in exportacao.FORMATOS:
+        return Response(
+            {"detalhe": "Parâmetro \"formato\" deve ser csv ou ndjson."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        queryset = filtrar(request.query_params)
+    except ValueError as ve:
+        return Response({"detalhe": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+    if _assincrono(request):
+        filtros_exportacao = {
+            chave: valor for chave, valor in request.query_params.items()
+            if chave not in ('formato', 'assincrono')
+        }
+        return _tarefa_aceita(request, tarefas.enfileirar(
+            f'exportar_{nome}', {'formato': formato, 'filtros': filtros_exportacao}, usuario=request.user
+        ))
+    # O streaming acontece depois que a view retorna, fora do roteamento da
+    # requisição: o banco de leitura é fixado aqui
+    queryset = exportacao.usando(queryset, alias_leitura(request.user))
+
+    resposta = StreamingHttpResponse(
+        exportacao.gerar(formato, queryset, colunas),
+        content_type=exportacao.FORMATOS[formato],
+    )
+    resposta['Content-Disposition'] = f'attachment; filename="{nome}.{formato}"'
+    return resposta
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def exportar_produtos(request):
+    """Exporta o catálogo completo (filtros: categoria, fornecedor, ativo)"""
+    return _resposta_exportacao(
+        request, 'produtos', exportacao.filtrar_produtos, exportacao.COLUNAS_PRODUTOS
+    )
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def exportar_movimentacoes(request):
+    """
+    Exporta o histórico de movimentações (filtros: data_inicio, data_fim, produto,
+    tipo, incluir_arquivo)
+    """
+    return _resposta_exportacao(
+        request, 'movimentacoes', exportacao.filtrar_movimentacoes, exportacao.COLUNAS_MOVIMENTACOES
+    )
+
+
+# ==============================================================================
+# RELATÓRIOS HISTÓRICOS (tabela EstoqueDiario, ver historico.py)
+# ==============================================================================
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@ler_da_replica
+def relatorio_saldos(request):
+    """Saldo de cada produto ao fim de uma data (filtros: data, produto=1,2,3); null se ainda não existia"""
+    try:
+        data = filtros.data(request.query_params, 'data')
+        produtos = filtros.lista_de_ids(request.query_params, 'produto')
+    except ValueError as ve:
+        return Response({"detalhe": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+    if data is None:
+        return Response({"detalhe": "Informe o parâmetro \"data\"."}, status=status.HTTP_400_BAD_REQUEST)
+
+    queryset = historico.saldos_em(data, produtos).values('id', 'nome', 'codigo_barras', 'saldo')
+    paginator = PageNumberPagination()
+    pagina = paginator.paginate_queryset(queryset, request)
+    return paginator.get_paginated_response(pagina)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@ler_da_replica
+def relatorio_movimentacao_diaria(request):
+    """Entradas, saídas e ajustes por dia (filtros: data_inicio, data_fim, produto)"""
+    try:
+        data_inicio = filtros.data(request.query_params, 'data_inicio')
+        data_fim = filtros.data(request.query_params, 'data_fim')
+        produto = filtros.inteiro(request.query_params, 'produto')
+    except ValueError as ve:
+        return Response({"detalhe": str(ve)}, status=status.HTTP_400_BAD_REQUEST)
+    if data_inicio is None or data_fim is None:
+        return Response(
+            {"detalhe": "Informe os parâmetros \"data_inicio\" e \"data_fim\"."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    return Response(list(historico.totais_diarios(data_inicio, data_fim, produto)))
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def consistencia_estoque(request):
+    """Saldos que divergem do histórico (GET) ou correção deles (POST); ?assincrono=true enfileira"""
+    if not request.user.is_superuser:
+        return Response(
+            {'error': 'Acesso negado. Apenas administradores podem verificar o estoque.'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    reparar = request.method == 'POST'
+    if _assincrono(request):
+        return _tarefa_aceita(request, tarefas.enfileirar(
+            'verificar_estoque', {'reparar': reparar}, usuario=request.user
+        ))
+    return Response(consistencia.relatorio(reparar, usuario=request.user))
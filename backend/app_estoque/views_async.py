@@ -0,0 +1,211 @@
+"""
+Versões assíncronas dos endpoints de leitura mais acessados.
+
+Só entram nas rotas quando a API roda em ASGI (ESTOQUE_VIEWS_ASYNC, ver
+urls.py). Enquanto uma requisição espera o banco, o cache ou um cliente
+lento, o mesmo worker continua atendendo as outras. As respostas têm o
+mesmo formato e os mesmos bytes das views DRF equivalentes em views.py:
+passam pelo renderer negociado pelo DRF, aceitam as mesmas classes de
+autenticação e, como elas, usam o ETag (condicional.py) e a réplica de
+leitura (replica.py). Pedidos que não pedem JSON (API navegável, Accept
+sem renderer) seguem para a view síncrona.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET
+from rest_framework import exceptions
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from . import cache as cache_estoque
+from . import codigo_barras, condicional, replica, views
+from .autenticacao import CachedJWTAuthentication
+from .estatisticas import aobter_estatisticas
+from .models import Produto
+from .serializers import ProdutoSerializer, UserSerializer
+from .views import ProdutoViewSet
+
+_autenticacao = CachedJWTAuthentication()
+
+# PUT/PATCH/DELETE em /produtos/<pk>/ continuam na view síncrona do DRF
+_produto_escrita = sync_to_async(ProdutoViewSet.as_view({
+    'put': 'update',
+    'patch': 'partial_update',
+    'delete': 'destroy',
+}))
+
+
+def _negociar(request):
+    """(renderer, media type) que o DRF escolheria; None se não for um renderer JSON"""
+    renderers = [classe() for classe in api_settings.DEFAULT_RENDERER_CLASSES]
+    negociacao = api_settings.DEFAULT_CONTENT_NEGOTIATION_CLASS()
+    try:
+        renderer, media_type = negociacao.select_renderer(Request(request), renderers)
+    except exceptions.NotAcceptable:
+        return None
+    if not isinstance(renderer, JSONRenderer):
+        return None
+    return renderer, media_type
+
+
+def com_renderer(view_sincrona):
+    """
+    Negocia o renderer como o DRF (JSONRenderer, ORJSONRenderer...). O que
+    não for JSON é respondido pela `view_sincrona` equivalente.
+    """
+    sincrona = sync_to_async(view_sincrona)
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            negociado = _negociar(request)
+            if negociado is None:
+                return await sincrona(request, *args, **kwargs)
+            request.accepted_renderer, request.accepted_media_type = negociado
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _json(request, dados, status=200):
+    """Resposta com os mesmos bytes e cabeçalhos que o Response do DRF geraria"""
+    renderer = request.accepted_renderer
+    resposta = HttpResponse(
+        renderer.render(dados, request.accepted_media_type, {}),
+        status=status,
+        content_type=renderer.media_type,
+    )
+    if len(api_settings.DEFAULT_RENDERER_CLASSES) > 1:
+        patch_vary_headers(resposta, ['Accept'])
+    return resposta
+
+
+def _erro(request, exc):
+    """Mesmo corpo e status que o exception handler do DRF geraria"""
+    if isinstance(exc.detail, (dict, list)):
+        resposta = _json(request, exc.detail, status=exc.status_code)
+    else:
+        resposta = _json(request, {'detail': exc.detail}, status=exc.status_code)
+    if exc.status_code == 401:
+        resposta['WWW-Authenticate'] = _autenticacao.authenticate_header(None)
+    return resposta
+
+
+async def _autenticar(request, autenticadores):
+    """Tenta cada autenticador na ordem, como o DRF; None se nenhum reconhece a requisição"""
+    for autenticador in autenticadores:
+        if isinstance(autenticador, SessionAuthentication):
+            # Só há GET aqui, então a sessão dispensa a verificação de CSRF
+            auser = getattr(request, 'auser', None)
+            user = await auser() if auser else None
+            if user is not None and user.is_active:
+                return user, None
+        else:
+            resultado = await autenticador.aauthenticate(request)
+            if resultado is not None:
+                return resultado
+    return None
+
+
+def autenticado(classes=None):
+    """
+    Equivalente assíncrono de authentication_classes + IsAuthenticated.
+
+    `classes` são as mesmas da view síncrona (padrão: DEFAULT_AUTHENTICATION_CLASSES).
+    """
+    autenticadores = [classe() for classe in (classes or api_settings.DEFAULT_AUTHENTICATION_CLASSES)]
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                resultado = await _autenticar(request, autenticadores)
+                if resultado is None:
+                    raise exceptions.NotAuthenticated()
+            except exceptions.APIException as exc:
+                return _erro(request, exc)
+            request.user, request.auth = resultado
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@require_GET
+@com_renderer(views.health_check)
+async def health_check(request):
+    """Endpoint para verificar se a API está funcionando"""
+    return _json(request, {
+        'status': 'online',
+        'message': 'API Controle de Estoque está funcionando!',
+        'timestamp': timezone.now().isoformat(),
+    })
+
+
+@require_GET
+@com_renderer(views.me_view)
+@autenticado()
+async def me_view(request):
+    """Retorna informações do usuário atual"""
+    return _json(request, UserSerializer(request.user).data)
+
+
+@require_GET
+@com_renderer(views.estatisticas_view)
+@autenticado()
+async def estatisticas_view(request):
+    """Retorna estatísticas gerais do sistema"""
+    async with replica.aleitura_em_replica(request.user):
+        return _json(request, await aobter_estatisticas())
+
+
+@com_renderer(ProdutoViewSet.as_view({'get': 'retrieve'}))
+@autenticado(ProdutoViewSet.authentication_classes)
+async def _produto_leitura(request, pk):
+    # Mesmo ETag do ETagMixin do ProdutoViewSet (só com cache compartilhado)
+    atual = None
+    if cache_estoque.compartilhado():
+        atual = await condicional.aetag(ProdutoViewSet.tabelas_etag, request.accepted_renderer.format)
+        if condicional.cliente_atualizado(request, atual):
+            resposta = HttpResponseNotModified()
+            resposta['ETag'] = atual
+            return resposta
+
+    try:
+        # Mesmo queryset do retrieve: ?ativo= e os filtros da listagem (filtros.py)
+        queryset = ProdutoViewSet.consultar(request.GET)
+    except exceptions.APIException as exc:
+        return _erro(request, exc)
+    async with replica.aleitura_em_replica(request.user):
+        try:
+            produto = await queryset.aget(pk=pk)
+        except Produto.DoesNotExist:
+            # Mesma mensagem do get_object_or_404 usado pelo retrieve
+            return _erro(request, exceptions.NotFound(f'No {Produto._meta.object_name} matches the given query.'))
+        resposta = _json(request, ProdutoSerializer(produto).data)
+        return condicional.marcar(resposta, atual) if atual else resposta
+
+
+@csrf_exempt
+async def produto_detalhe(request, pk):
+    """GET assíncrono de /produtos/<pk>/; as escritas seguem para o ProdutoViewSet"""
+    if request.method in ('GET', 'HEAD'):
+        return await _produto_leitura(request, pk=pk)
+    return await _produto_escrita(request, pk=pk)
+
+
+@require_GET
+@com_renderer(ProdutoViewSet.as_view({'get': 'codigo_barras'}))
+@autenticado(ProdutoViewSet.authentication_classes)
+async def produto_codigo_barras(request, codigo):
+    """Consulta rápida por código de barras (leitores do caixa)"""
+    dados = (await codigo_barras.aresolver([codigo])).get(codigo)
+    if dados is None:
+        return _json(request, {"detalhe": "Produto não encontrado."}, status=404)
+    return _json(request, dados)
@@ -20,6 +20,10 @@ SECRET_KEY = 'django-insecure-r#4sg#ygc(&g7em3seei-lo79*3pfeo6f1w(t4hjs1cloc=88*
 # Se não tiver variável (no seu PC), ele assume True.
 DEBUG = os.getenv('DEBUG', 'True') == 'True'
 
+# Servindo por config.asgi (uvicorn): liga as views assíncronas de leitura
+# (app_estoque/views_async.py) no lugar das versões síncronas
+ESTOQUE_VIEWS_ASYNC = os.getenv('ASGI', 'False') == 'True'
+
 ALLOWED_HOSTS = [
     'api.morenadoaco.com.br',  # Domínio de Produção
     'mysql-db',                # Nome do host do banco no Docker
@@ -62,6 +66,12 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Compressão gzip/brotli das respostas (desligue com COMPRESSAO=False se o
+# proxy do Easypanel já comprimir). Fica logo abaixo do CORS para comprimir
+# o corpo final gerado pelas demais camadas.
+if os.getenv('COMPRESSAO', 'True') == 'True':
+    MIDDLEWARE.insert(1, 'app_estoque.middleware.CompressaoMiddleware')
+
 # ✅ Mantido como 'config' conforme sua estrutura
 ROOT_URLCONF = 'config.urls'
 
@@ -95,13 +105,38 @@ DATABASES = {
         'USER': os.getenv('DB_USER', 'root'),
         'PASSWORD': os.getenv('DB_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', '127.0.0.1'),
-        'PORT': '3306',
+        'PORT': os.getenv('DB_PORT', '3306'),
+        # Conexões persistentes: cada thread do worker reaproveita a conexão
+        # por até DB_CONN_MAX_AGE segundos (0 = nova conexão por requisição).
+        # Deve ser menor que o wait_timeout do MySQL. Em ASGI o padrão é 0:
+        # as consultas rodam em threads do executor e a conexão persistente
+        # não é fechada pelo ciclo da requisição.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '0' if ESTOQUE_VIEWS_ASYNC else '60')),
+        # Testa a conexão reaproveitada no início da requisição e reconecta se caiu
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
         'OPTIONS': {
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '10')),
         }
     }
 }
 
+# Réplica de leitura opcional: listagens, relatórios e exportações leem dela
+# (ver app_estoque/replica.py). Sem DB_REPLICA_HOST tudo fica no 'default'.
+# Usuários autenticados só leem da réplica com cache compartilhado (CACHE_URL).
+if os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.getenv('DB_REPLICA_HOST'),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'USER': os.getenv('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.getenv('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['app_estoque.replica.RoteadorReplica']
+ESTOQUE_LEITURA_EM_REPLICA = 'replica' in DATABASES
+
 # Validação de senhas
 AUTH_PASSWORD_VALIDATORS = [
     { 'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator', },
@@ -132,7 +167,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'app_estoque.autenticacao.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -142,6 +177,15 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20,
 }
 
+# JSON_RAPIDO=True troca o JSONRenderer pelo renderer baseado em orjson
+# (mesma saída para os dados da API, bem mais rápido nas listagens; requer o
+# pacote orjson; ver as diferenças em app_estoque/renderers.py)
+if os.getenv('JSON_RAPIDO', 'False') == 'True':
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = [
+        'app_estoque.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ]
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=120),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
@@ -190,4 +234,104 @@ else:
 
 # Proxy para Docker/Easypanel (Necessário para HTTPS funcionar)
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
-USE_X_FORWARDED_HOST = True
\ No newline at end of file
+USE_X_FORWARDED_HOST = True
+
+# ==============================================================================
+# 7. CACHE E DESEMPENHO
+# ==============================================================================
+
+# Cache do Django, compartilhado pelos workers do Gunicorn e pelo worker de
+# tarefas: dashboard, versões de ETag, usuários autenticados e a fixação no
+# primário só ficam corretos entre processos com um cache comum.
+#   CACHE_URL=redis://host:6379/0     -> Redis (pacote redis)
+#   CACHE_URL=memcached://host:11211  -> Memcached (pacote pymemcache)
+#   CACHE_URL=db://estoque_cache      -> tabela no MySQL (manage.py createcachetable)
+# Sem CACHE_URL fica o LocMemCache, que é de cada processo: só para desenvolvimento.
+CACHE_URL = os.getenv('CACHE_URL', '')
+if CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL,
+    }}
+elif CACHE_URL.startswith('memcached://'):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': CACHE_URL.removeprefix('memcached://'),
+    }}
+elif CACHE_URL.startswith('db://'):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': CACHE_URL.removeprefix('db://') or 'estoque_cache',
+    }}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Com o LocMemCache, o que depende de invalidação entre processos (usuário
+# em cache, ETag, fixação no primário) fica desligado. Num processo único
+# (runserver, 1 worker e sem worker de tarefas) CACHE_COMPARTILHADO=True liga.
+ESTOQUE_CACHE_COMPARTILHADO = os.getenv('CACHE_COMPARTILHADO', 'False') == 'True'
+
+# Tempo máximo (segundos) que o payload do dashboard fica em cache.
+# As alterações de estoque e cadastro já invalidam o cache antes disso.
+ESTOQUE_ESTATISTICAS_CACHE_TIMEOUT = int(os.getenv('ESTATISTICAS_CACHE_TIMEOUT', '300'))
+
+# Lê o total de produtos de categorias/fornecedores do contador desnormalizado
+# em vez de um COUNT por página. Útil para catálogos muito grandes.
+ESTOQUE_CONTADORES_PRODUTOS = os.getenv('CONTADORES_PRODUTOS', 'False') == 'True'
+
+# Número máximo de linhas aceitas por POST em /movimentacoes/lote/
+ESTOQUE_LOTE_MAXIMO = int(os.getenv('LOTE_MAXIMO', '1000'))
+
+# Linhas lidas por consulta nas exportações em streaming
+ESTOQUE_EXPORTACAO_LOTE = int(os.getenv('EXPORTACAO_LOTE', '2000'))
+
+# Consulta por código de barras: LRU em memória de cada worker (tamanho e
+# TTL em segundos) e, opcionalmente, o cache compartilhado do Django
+ESTOQUE_CODIGO_BARRAS_LRU_TAMANHO = int(os.getenv('CODIGO_BARRAS_LRU_TAMANHO', '4096'))
+ESTOQUE_CODIGO_BARRAS_LRU_TTL = int(os.getenv('CODIGO_BARRAS_LRU_TTL', '5'))
+ESTOQUE_CODIGO_BARRAS_CACHE_COMPARTILHADO = os.getenv('CODIGO_BARRAS_CACHE_COMPARTILHADO', 'False') == 'True'
+ESTOQUE_CODIGO_BARRAS_CACHE_TIMEOUT = int(os.getenv('CODIGO_BARRAS_CACHE_TIMEOUT', '300'))
+
+# Segundos que o usuário autenticado por JWT fica em cache (evita um SELECT
+# na tabela de usuários por requisição). Alterações no usuário invalidam.
+# Só vale com cache compartilhado (ver CACHES).
+ESTOQUE_USUARIO_CACHE_TIMEOUT = int(os.getenv('USUARIO_CACHE_TIMEOUT', '60'))
+
+# Segundos que as leituras de um usuário ficam no primário após uma escrita
+# (deve cobrir o atraso de replicação); também limita o cache das
+# estatísticas calculadas na réplica
+ESTOQUE_REPLICA_ATRASO_MAXIMO = int(os.getenv('REPLICA_ATRASO_MAXIMO', '5'))
+
+# Respostas menores que isso (bytes) não são comprimidas
+ESTOQUE_COMPRESSAO_MINIMO = int(os.getenv('COMPRESSAO_MINIMO', '1024'))
+# Nível do Brotli (0-11); 4-5 comprime quase como o 11 gastando bem menos CPU
+ESTOQUE_BROTLI_QUALIDADE = int(os.getenv('BROTLI_QUALIDADE', '5'))
+
+# Listagem de produtos montada direto de .values(), sem instanciar modelos
+# nem passar pelos campos do DRF (mesmo JSON, bem menos CPU por página)
+ESTOQUE_LEITURA_ENXUTA = os.getenv('LEITURA_ENXUTA', 'True') == 'True'
+
+# Importação de produtos: linhas gravadas por INSERT/upsert e número máximo
+# de erros detalhados no relatório (os demais só entram na contagem)
+ESTOQUE_IMPORTACAO_LOTE = int(os.getenv('IMPORTACAO_LOTE', '1000'))
+ESTOQUE_IMPORTACAO_ERROS_MAXIMO = int(os.getenv('IMPORTACAO_ERROS_MAXIMO', '1000'))
+
+# Fila de tarefas (comando processar_tarefas): espera entre consultas à fila
+# vazia, segundos até uma tarefa em execução ser dada como interrompida e
+# dias que tarefas finalizadas e seus arquivos ficam guardados
+ESTOQUE_TAREFAS_INTERVALO = float(os.getenv('TAREFAS_INTERVALO', '2'))
+ESTOQUE_TAREFAS_TIMEOUT = int(os.getenv('TAREFAS_TIMEOUT', '3600'))
+ESTOQUE_TAREFAS_RETENCAO_DIAS = int(os.getenv('TAREFAS_RETENCAO_DIAS', '7'))
+
+# Produtos corrigidos por transação no reparo de saldos (verificar_estoque)
+ESTOQUE_CONSISTENCIA_LOTE = int(os.getenv('CONSISTENCIA_LOTE', '1000'))
+
+# Arquivamento (comando arquivar_movimentacoes): meses fechados que ficam na
+# tabela quente de movimentações e linhas movidas por transação
+ESTOQUE_ARQUIVO_MESES = int(os.getenv('ARQUIVO_MESES', '12'))
+ESTOQUE_ARQUIVO_LOTE = int(os.getenv('ARQUIVO_LOTE', '5000'))
+
+# Sugestão de reposição (/alertas/reposicao/): dias de saídas usados para a
+# média diária e dias de consumo que o pedido deve cobrir além do mínimo
+ESTOQUE_REPOSICAO_DIAS = int(os.getenv('REPOSICAO_DIAS', '30'))
+ESTOQUE_REPOSICAO_COBERTURA_DIAS = int(os.getenv('REPOSICAO_COBERTURA_DIAS', '30'))
@@ -0,0 +1,154 @@
+"""
+Configuração do Gunicorn (usada por `gunicorn -c gunicorn.conf.py`).
+
+Tudo pode ser ajustado por variáveis de ambiente no Easypanel/docker-compose.
+As requisições passam boa parte do tempo esperando o MySQL pela rede, então
+o padrão é o worker gthread: um worker por CPU disponível para o container
+(no mínimo 2, para um worker reciclado ou travado não parar a API) e algumas
+threads em cada, com um teto de workers para não estourar o max_connections
+do MySQL em máquinas grandes.
+"""
+import math
+import os
+import threading
+import time
+
+ASGI = os.getenv('ASGI', 'False') == 'True'
+
+
+def _cpus_disponiveis():
+    """CPUs que o processo pode usar: afinidade e cota do cgroup (container), não as do host"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    cota = None
+    try:
+        # cgroup v2: "<cota> <período>" ou "max <período>"
+        with open('/sys/fs/cgroup/cpu.max') as arquivo:
+            valor, periodo = arquivo.read().split()
+        if valor != 'max':
+            cota = int(valor) / int(periodo)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1: cota -1 significa sem limite
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as arquivo:
+                valor = int(arquivo.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as arquivo:
+                periodo = int(arquivo.read())
+            if valor > 0:
+                cota = valor / periodo
+        except (OSError, ValueError):
+            pass
+    if cota:
+        cpus = min(cpus, max(1, math.ceil(cota)))
+    return cpus
+
+
+CPUS = _cpus_disponiveis()
+
+# ==============================================================================
+# APLICAÇÃO E ENDEREÇO
+# ==============================================================================
+
+wsgi_app = 'config.asgi:application' if ASGI else 'config.wsgi:application'
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', '8000')}")
+
+# ==============================================================================
+# WORKERS E THREADS
+# ==============================================================================
+
+# Um worker por CPU (no mínimo 2), limitado por GUNICORN_WORKERS_MAXIMO quando não informado
+workers = int(os.getenv(
+    'GUNICORN_WORKERS', min(max(CPUS, 2), int(os.getenv('GUNICORN_WORKERS_MAXIMO', '8')))
+))
+
+# Threads por worker (só no modo WSGI; em ASGI o event loop faz a concorrência).
+# Enquanto uma thread espera o MySQL as outras atendem. Com CONN_MAX_AGE > 0
+# cada thread mantém sua conexão, então workers x threads é o total de
+# conexões abertas pela API (padrão: até 8 x 4 = 32).
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+
+if ASGI:
+    worker_class = 'uvicorn.workers.UvicornWorker'
+elif threads > 1:
+    worker_class = 'gthread'
+else:
+    worker_class = 'sync'
+
+# ==============================================================================
+# TEMPOS E RECICLAGEM
+# ==============================================================================
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+# Reinicia cada worker depois de N requisições (0 desliga) para limitar o
+# crescimento de memória; o jitter evita que todos reiniciem juntos.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '100'))
+
+# Carrega o Django uma vez no master antes do fork: workers sobem mais rápido
+# e compartilham a memória do código importado.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+
+# ==============================================================================
+# LOGS E MÉTRICAS
+# ==============================================================================
+
+accesslog = os.getenv('GUNICORN_ACCESSLOG') or None
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOGLEVEL', 'info')
+
+# Envia métricas nativas do Gunicorn (requisições, duração, workers) via StatsD
+statsd_host = os.getenv('GUNICORN_STATSD_HOST') or None
+statsd_prefix = 'controle_estoque'
+
+# ==============================================================================
+# HOOKS: ESTATÍSTICAS POR WORKER
+# ==============================================================================
+# pre_request/post_request só são chamados pelos workers sync e gthread;
+# no modo ASGI use as métricas do StatsD.
+
+_estatisticas = {'requisicoes': 0, 'tempo_total': 0.0, 'mais_lenta': 0.0}
+_lock = threading.Lock()
+_inicio_local = threading.local()
+
+
+def when_ready(server):
+    server.log.info(
+        'Servindo %s com %s workers %s (%s threads), max_requests=%s, preload=%s',
+        wsgi_app, workers, worker_class, threads, max_requests, preload_app,
+    )
+
+
+def post_fork(server, worker):
+    # Com preload_app o master importou o Django; nenhuma conexão com o banco
+    # pode ser herdada pelo processo filho.
+    if preload_app:
+        from django.db import connections
+        connections.close_all()
+
+
+def pre_request(worker, req):
+    _inicio_local.valor = time.perf_counter()
+
+
+def post_request(worker, req, environ, resp):
+    duracao = time.perf_counter() - getattr(_inicio_local, 'valor', time.perf_counter())
+    with _lock:
+        _estatisticas['requisicoes'] += 1
+        _estatisticas['tempo_total'] += duracao
+        _estatisticas['mais_lenta'] = max(_estatisticas['mais_lenta'], duracao)
+
+
+def worker_exit(server, worker):
+    total = _estatisticas['requisicoes']
+    if total:
+        server.log.info(
+            'Worker %s encerrado: %s requisições, média %.1f ms, mais lenta %.1f ms',
+            worker.pid, total,
+            _estatisticas['tempo_total'] / total * 1000,
+            _estatisticas['mais_lenta'] * 1000,
+        )